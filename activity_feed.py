@@ -0,0 +1,153 @@
+"""Recent activity feed for the admin dashboard
+
+Write paths append an entry to the small recent_activity table inside their
+own transaction, and a trigger keeps the table capped. Each process holds the
+newest entries in a ring buffer and tops it up with only the rows it has not
+seen yet, an id range scan, so reads cost the same however much game data
+there is and still include writes made by other workers. Deleting entries
+bumps a generation counter, which tells every process to reload its buffer.
+"""
+import json
+import threading
+from collections import deque
+
+# Rows kept in the table, enough to refill the ring buffer after a restart
+TABLE_CAP = 1000
+
+# Event types shown to admins, anything else (including frequent events like
+# position_update) is never stored
+FEED_EVENTS = frozenset({
+    'registered', 'progress_saved', 'room_completed', 'room_progress',
+    'puzzle_solved', 'challenge_completed', 'secret_found', 'item_collected',
+    'checkpoint_reached', 'death', 'hint_used', 'objective_completed'
+})
+
+# data_versions row counting deletions from the table, trims by the cap don't count
+GENERATION_KEY = 'recent_activity'
+
+
+def ensure_activity_feed(conn):
+    """Create the capped feed table, returns True if it was created"""
+    exists = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='recent_activity'"
+    ).fetchone()
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS recent_activity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            user_id INTEGER,
+            username TEXT,
+            event_type TEXT NOT NULL,
+            room_number INTEGER,
+            level INTEGER,
+            detail TEXT
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_recent_activity_cap AFTER INSERT ON recent_activity
+        BEGIN
+            DELETE FROM recent_activity WHERE id <= NEW.id - {TABLE_CAP};
+        END
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)', (GENERATION_KEY,))
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_recent_activity_generation AFTER DELETE ON recent_activity
+        WHEN OLD.id > COALESCE((SELECT MAX(id) FROM recent_activity), 0) - {TABLE_CAP}
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE table_name = '{GENERATION_KEY}';
+        END
+    ''')
+    return not exists
+
+
+def record_event(conn, user_id, event_type, room_number=None, level=None, detail=None):
+    """Append an activity entry within the caller's transaction"""
+    if event_type not in FEED_EVENTS:
+        return
+    conn.execute('''
+        INSERT INTO recent_activity (user_id, username, event_type, room_number, level, detail)
+        VALUES (?, (SELECT username FROM users WHERE id = ?), ?, ?, ?, ?)
+    ''', (user_id, user_id, event_type, room_number, level, json.dumps(detail) if detail else None))
+
+
+class ActivityFeed:
+    """Ring buffer of the newest activity entries, filterable by room and event type"""
+
+    def __init__(self, db_manager, capacity=200):
+        self.db_manager = db_manager
+        self.capacity = capacity
+        self._entries = deque(maxlen=capacity)
+        self._last_id = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def recent(self, limit=10, room_number=None, event_type=None):
+        """Get the newest entries first, optionally for one room or event type"""
+        self.sync()
+        with self._lock:
+            entries = reversed(self._entries)
+            matches = []
+            for entry in entries:
+                if room_number is not None and entry['room_number'] != room_number:
+                    continue
+                if event_type is not None and entry['event_type'] != event_type:
+                    continue
+                matches.append(entry)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def sync(self):
+        """Pull entries written since the last sync, by this or any other process"""
+        with self._lock:
+            conn = self.db_manager.get_connection()
+            try:
+                row = conn.execute(
+                    'SELECT version FROM data_versions WHERE table_name = ?', (GENERATION_KEY,)
+                ).fetchone()
+                generation = row['version'] if row else 0
+                if generation != self._generation:
+                    # Entries were deleted, possibly by another worker, start over from the table
+                    self._entries.clear()
+                    self._last_id = None
+                    self._generation = generation
+                if self._last_id is None:
+                    rows = conn.execute(
+                        'SELECT * FROM recent_activity ORDER BY id DESC LIMIT ?', (self.capacity,)
+                    ).fetchall()[::-1]
+                else:
+                    # Newest first so a burst larger than the buffer keeps its latest entries
+                    rows = conn.execute(
+                        'SELECT * FROM recent_activity WHERE id > ? ORDER BY id DESC LIMIT ?',
+                        (self._last_id, self.capacity)
+                    ).fetchall()[::-1]
+            finally:
+                conn.close()
+            for row in rows:
+                self._entries.append(self._to_dict(row))
+            if rows:
+                self._last_id = rows[-1]['id']
+            elif self._last_id is None:
+                self._last_id = 0
+            return len(rows)
+
+    def reset(self):
+        """Reload from the table on next read"""
+        with self._lock:
+            self._entries.clear()
+            self._last_id = None
+            self._generation = None
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            'id': row['id'],
+            'timestamp': row['created_at'],
+            'user_id': row['user_id'],
+            'username': row['username'],
+            'event_type': row['event_type'],
+            'room_number': row['room_number'],
+            'level': row['level'],
+            'detail': json.loads(row['detail']) if row['detail'] else None
+        }
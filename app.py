@@ -1,36 +1,180 @@
-from flask import Flask, render_template_string, render_template, jsonify, request, session, redirect
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask import Flask, Blueprint, Response, current_app, render_template_string, render_template, jsonify, request, session, redirect
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user, user_loaded_from_cookie
+from flask_login.utils import decode_cookie
 import os
 from datetime import datetime
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from config import config
 from database import DatabaseManager
+from report_store import ReportStore
+from report_cache import ReportCache
+from cache import create_cache
+import rollups
+import sketches
+import gameplay
+import dashboard_events as dashboard_stats
+from dashboard_events import DashboardPublisher, Subscription, EventStreamBusyError
+from activity_feed import ActivityFeed
+from gameplay import get_room_name
+from report_queries import ReportFilters, ReportQuery
+from backup import BackupManager, BackupScheduler
+from purge import PurgeEngine
+from archive import ArchiveManager
+import user_import
+from password_hasher import PasswordHasher, HashingBusyError
+from rate_limit import TokenBucketLimiter
+from secret_keys import SecretKeyRing
+from workload import WorkloadManager, WorkloadBusyError
+from singleflight import SingleFlight
 import json
+import click
+from werkzeug.local import LocalProxy
 
-app = Flask(__name__)
-
-# Load configuration
-config_name = os.environ.get('FLASK_CONFIG', 'default')
-app.config.from_object(config[config_name])
+bp = Blueprint('ascended', __name__, cli_group=None)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'ascended.login'
 login_manager.login_message = 'Please log in to access this page.'
 
-# Initialize database manager
-db_manager = DatabaseManager(
-    database_path=app.config['DATABASE'],
-    database_dir=app.config.get('DATABASE_DIR', 'database')
-)
+def get_service(name):
+    """Get one of the current app's shared services"""
+    return current_app.extensions['ascended'][name]
+
+# Proxies to the services of whichever app is handling the request
+password_hasher = LocalProxy(lambda: get_service('password_hasher'))
+db_manager = LocalProxy(lambda: get_service('db_manager'))
+report_store = LocalProxy(lambda: get_service('report_store'))
+backup_manager = LocalProxy(lambda: get_service('backup_manager'))
+backup_scheduler = LocalProxy(lambda: get_service('backup_scheduler'))
+purge_engine = LocalProxy(lambda: get_service('purge_engine'))
+archive_manager = LocalProxy(lambda: get_service('archive_manager'))
+rate_limiter = LocalProxy(lambda: get_service('rate_limiter'))
+report_cache = LocalProxy(lambda: get_service('report_cache'))
+cache = LocalProxy(lambda: get_service('cache'))
+pdf_executor = LocalProxy(lambda: get_service('pdf_executor'))
+workloads = LocalProxy(lambda: get_service('workloads'))
+dashboard_events = LocalProxy(lambda: get_service('dashboard_events'))
+activity_feed = LocalProxy(lambda: get_service('activity_feed'))
+single_flight = LocalProxy(lambda: get_service('single_flight'))
+
+def init_services(app):
+    """Build the database manager and the other services shared by all requests"""
+    services = {}
+    
+    # Bounded pool for password hashing so login storms cannot starve gameplay requests
+    services['password_hasher'] = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+        salt_length=app.config.get('PASSWORD_SALT_LENGTH', 16),
+        max_workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_queue=app.config.get('PASSWORD_HASH_MAX_QUEUE', 64),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+    )
+    
+    # Cache shared by every worker when CACHE_BACKEND is 'shared' or 'redis'
+    services['cache'] = create_cache(app.config)
+    
+    # Initialize database manager
+    services['db_manager'] = DatabaseManager(
+        database_path=app.config['DATABASE'],
+        database_dir=app.config.get('DATABASE_DIR', 'database'),
+        password_hasher=services['password_hasher'],
+        cache=services['cache'],
+        user_cache_ttl=app.config.get('USER_CACHE_TTL', 60)
+    )
+    
+    # Initialize on-disk store for generated report files
+    services['report_store'] = ReportStore(
+        app.config['REPORT_STORE_DIR'],
+        max_reports=app.config.get('REPORT_RETENTION_MAX_COUNT'),
+        max_age_days=app.config.get('REPORT_RETENTION_MAX_AGE_DAYS'),
+        max_bytes=app.config.get('REPORT_RETENTION_MAX_BYTES')
+    )
+    
+    # Initialize online backup manager
+    services['backup_manager'] = BackupManager(
+        app.config['DATABASE'],
+        app.config.get('BACKUP_DIR', os.path.join('database', 'backups')),
+        busy_sleep=app.config.get('BACKUP_BUSY_SLEEP', 0.005)
+    )
+    
+    # Scheduled backups, rotated with grandfather-father-son retention
+    services['backup_scheduler'] = BackupScheduler(
+        services['backup_manager'],
+        interval_hours=app.config.get('BACKUP_INTERVAL_HOURS', 24),
+        window_start_hour=app.config.get('BACKUP_WINDOW_START_HOUR', 2),
+        window_end_hour=app.config.get('BACKUP_WINDOW_END_HOUR', 5),
+        compression=app.config.get('BACKUP_DEFAULT_COMPRESSION'),
+        retention={
+            'keep_daily': app.config.get('BACKUP_KEEP_DAILY', 7),
+            'keep_weekly': app.config.get('BACKUP_KEEP_WEEKLY', 4),
+            'keep_monthly': app.config.get('BACKUP_KEEP_MONTHLY', 6),
+            'max_total_bytes': app.config.get('BACKUP_MAX_TOTAL_BYTES')
+        }
+    )
+    
+    # Batched purges of expired rows
+    services['purge_engine'] = PurgeEngine(
+        app.config['DATABASE'],
+        app.config.get('PURGE_RETENTION_DAYS', {'game_state': 7}),
+        batch_size=app.config.get('PURGE_BATCH_SIZE', 500),
+        batch_pause=app.config.get('PURGE_BATCH_PAUSE', 0.01),
+        vacuum_pages_per_step=app.config.get('PURGE_VACUUM_PAGES_PER_STEP', 256)
+    )
+    
+    # Archival of inactive users to dated archive databases
+    services['archive_manager'] = ArchiveManager(
+        app.config['DATABASE'],
+        app.config.get('ARCHIVE_DIR', os.path.join('database', 'archive')),
+        inactive_days=app.config.get('ARCHIVE_INACTIVE_DAYS', 90),
+        batch_size=app.config.get('ARCHIVE_BATCH_SIZE', 200)
+    )
+    
+    # In-memory token buckets for write-heavy gameplay endpoints
+    services['rate_limiter'] = TokenBucketLimiter()
+    
+    # Cache of rendered reports, invalidated by per-table change counters
+    services['report_cache'] = ReportCache(
+        services['cache'],
+        ttl=app.config.get('REPORT_CACHE_TTL', 24 * 3600)
+    )
+    
+    # Bounded pool for PDF layout so large reports cannot occupy every request thread
+    services['pdf_executor'] = ThreadPoolExecutor(
+        max_workers=app.config.get('PDF_RENDER_WORKERS', 2),
+        thread_name_prefix='pdf-render'
+    )
+    
+    # Separate admission limits so admin work cannot take the threads gameplay needs
+    services['workloads'] = WorkloadManager(app.config.get('WORKLOAD_CLASSES', {}))
+    
+    # Identical expensive reads running at the same time share one query
+    services['single_flight'] = SingleFlight()
+    
+    # Newest activity entries in memory, topped up from the capped recent_activity table
+    services['activity_feed'] = ActivityFeed(
+        services['db_manager'],
+        capacity=app.config.get('ACTIVITY_FEED_CAPACITY', 200)
+    )
+    
+    # Single publisher behind every open dashboard event stream
+    services['dashboard_events'] = DashboardPublisher(
+        services['db_manager'],
+        services['activity_feed'],
+        interval=app.config.get('EVENT_STREAM_INTERVAL', 1.0),
+        max_subscribers=app.config.get('EVENT_STREAM_MAX_CLIENTS', 4)
+    )
+    
+    app.extensions['ascended'] = services
+    return services
 
 # Auto-initialize database on startup
 def init_app_database():
     """Initialize database automatically on app startup"""
     try:
         # Check if database exists
-        if not os.path.exists(app.config['DATABASE']):
+        if not os.path.exists(current_app.config['DATABASE']):
             print("Database not found. Creating new database...")
             result = db_manager.init_database()
             if result is True:
@@ -50,14 +194,45 @@ def init_app_database():
                 print(f"✓ Database schema updated: {result}")
             # Check if admin exists, create if not
             create_default_admin()
+            moved = migrate_legacy_reports()
+            if moved:
+                print(f"✓ Moved {moved} legacy report files into the report store")
         
         # Ensure database directory exists
-        os.makedirs(app.config.get('DATABASE_DIR', 'database'), exist_ok=True)
+        os.makedirs(current_app.config.get('DATABASE_DIR', 'database'), exist_ok=True)
         return True
     except Exception as e:
         print(f"✗ Database initialization failed: {str(e)}")
         return False
 
+def migrate_legacy_reports():
+    """Move report files still held in report_history.file_data into the report store
+    
+    Each blob is streamed into the store and its row committed on its own, so an
+    interrupted run simply continues next time. Returns the number of reports moved.
+    """
+    conn = db_manager.get_connection()
+    try:
+        rowids = [row[0] for row in conn.execute(
+            'SELECT rowid FROM report_history WHERE file_data IS NOT NULL'
+        )]
+        for rowid in rowids:
+            content_hash, size = report_store.put_chunks(
+                db_manager.iter_blob('report_history', 'file_data', rowid,
+                                     current_app.config.get('BLOB_STREAM_CHUNK_SIZE', 64 * 1024))
+            )
+            conn.execute(
+                'UPDATE report_history SET content_hash = ?, size = ?, file_data = NULL WHERE rowid = ?',
+                (content_hash, size, rowid)
+            )
+            conn.commit()
+        if rowids:
+            # Hand the space the blobs used back to the filesystem
+            purge_engine.incremental_vacuum(conn)
+        return len(rowids)
+    finally:
+        conn.close()
+
 def create_default_admin():
     """Create default admin account if none exists"""
     try:
@@ -164,26 +339,162 @@ def create_default_badges(conn):
     except Exception as e:
         print(f"✗ Error creating default badges: {str(e)}")
 
-# Initialize database on startup
-with app.app_context():
-    init_app_database()
+@bp.cli.command('backup-now')
+def backup_now_command():
+    """Take a verified backup and apply retention"""
+    result = backup_scheduler.run_once()
+    print(f"Backup {result['status']}: {result['filename'] or result['error']}")
+
+@bp.cli.command('list-backups')
+def list_backups_command():
+    """List backups, newest first"""
+    for backup in backup_manager.list_backups():
+        print(f"{backup['created_at'].isoformat()}  {backup['size']:>12}  {backup['filename']}")
+
+@bp.cli.command('purge')
+@click.option('--table', 'tables', multiple=True, help='Only purge these tables')
+def purge_command(tables):
+    """Purge rows older than their configured retention"""
+    result = run_purge(list(tables) or None)
+    for table, count in result['deleted'].items():
+        print(f"  {table}: {count} rows")
+    print(f"✓ Purged {result['total_deleted']} rows, freed {result['pages_freed']} pages")
+
+@bp.cli.command('archive')
+@click.option('--days', type=int, default=None, help='Archive users inactive for this many days')
+def archive_command(days):
+    """Move inactive users' progress into the dated archive database"""
+    result = archive_manager.archive_inactive(days)
+    print(f"✓ Archived {result['users']} users ({result['game_state']} sessions, "
+          f"{result['user_room_progress']} room progress rows) to {result['archive_file']}")
+
+@bp.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate the file without creating users')
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False), help='Write the per-row report as CSV')
+def import_users_command(path, dry_run, report_path):
+    """Create users in bulk from a CSV or XLSX file"""
+    with open(path, 'rb') as f:
+        try:
+            rows = user_import.read_user_rows(path, f)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    result = user_import.import_users(db_manager, rows, dry_run=dry_run)
+    for entry in result['rows']:
+        if entry['status'] not in ('created', 'validated'):
+            print(f"  row {entry['row']}: {entry['status']} - {entry.get('message', '')}")
+    if report_path:
+        import csv
+        with open(report_path, 'w', newline='') as f:
+            writer = csv.DictWriter(
+                f, fieldnames=['row', 'username', 'email', 'status', 'message', 'generated_password'])
+            writer.writeheader()
+            writer.writerows(result['rows'])
+    totals = ', '.join(f'{count} {status}' for status, count in result['totals'].items())
+    print(f"✓ Import {'checked' if dry_run else 'finished'}: {totals or 'no rows'}")
+
+@bp.cli.command('cache-check')
+def cache_check_command():
+    """Round-trip a value through the configured cache backend and invalidate it"""
+    namespace = 'cache-check'
+    probe = {'pid': os.getpid(), 'at': datetime.now().isoformat()}
+    version = cache.version(namespace)
+    cache.set(namespace, 'probe', probe, ttl=60, version=version)
+    checks = [
+        ('version stored', version is not None),
+        ('value read back', cache.get(namespace, 'probe') == probe),
+    ]
+    cache.invalidate(namespace)
+    checks += [
+        ('version changed', cache.version(namespace) not in (None, version)),
+        ('value dropped by invalidation', cache.get(namespace, 'probe') is None),
+        ('no backend errors', cache.stats(namespace).get('errors', 0) == 0),
+    ]
+    backend = cache.stats()['backend']
+    print(f"Cache backend: {backend.get('backend')} {backend.get('server') or backend.get('path') or ''}".rstrip())
+    for name, ok in checks:
+        print(f"{'✓' if ok else '✗'} {name}")
+    if not all(ok for _, ok in checks):
+        raise click.ClickException('Cache check failed')
+
+@bp.cli.command('rotate-secret-key')
+def rotate_secret_key_command():
+    """Add a new signing key, keeping older keys valid until they age out"""
+    key_ring = get_service('secret_keys')
+    if key_ring is None:
+        raise click.ClickException('SECRET_KEY is set in the environment, rotate it there instead')
+    signing_from = key_ring.rotate()
+    print(f"✓ Added a new secret key. Running workers accept it within {key_ring.check_interval} seconds "
+          f"and sign with it from {signing_from.strftime('%H:%M:%S')}.")
+
+@bp.cli.command('restore-backup')
+@click.argument('filename')
+@click.option('--yes', is_flag=True, help='Restore without asking for confirmation')
+def restore_backup_command(filename, yes):
+    """Verify a backup and restore it over the live database"""
+    path = filename if os.path.exists(filename) else os.path.join(backup_manager.backup_dir, filename)
+    if not os.path.exists(path):
+        raise click.ClickException(f'Backup not found: {filename}')
+    if not yes:
+        click.confirm(f'Replace {current_app.config["DATABASE"]} with {os.path.basename(path)}?', abort=True)
+    try:
+        safety_path = backup_manager.restore(path)
+    except Exception as e:
+        raise click.ClickException(str(e))
+    report_cache.invalidate()
+    db_manager.invalidate_user()
+    print(f"✓ Restored {os.path.basename(path)} (previous database saved as {os.path.basename(safety_path)})")
 
 @login_manager.user_loader
 def load_user(user_id):
     """Load user for Flask-Login"""
     return db_manager.get_user_by_id(user_id)
 
+def restore_archived_user(user):
+    """Bring an archived user's progress back into the hot database"""
+    try:
+        result = archive_manager.restore_user(user.id)
+        if result:
+            print(f"✓ Restored archived progress for user {user.id}: "
+                  f"{result['restored']} rows restored, {result['merged']} merged")
+        if result and result['kept']:
+            print(f"✗ Kept {result['kept']} archived game_state rows for user {user.id}, their sessions belong to other users")
+    except Exception as e:
+        print(f"✗ Failed to restore archived progress for user {user.id}: {str(e)}")
+
+def restore_archived_user_from_cookie(sender, user):
+    restore_archived_user(user)
+
+@bp.before_app_request
+def refresh_secret_keys():
+    """Follow key rotations and re-sign remember cookies made with an older key"""
+    key_ring = get_service('secret_keys')
+    if key_ring is None:
+        return
+    key_ring.refresh(current_app._get_current_object())
+    
+    cookie_name = current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')
+    cookie = request.cookies.get(cookie_name)
+    if not cookie or '_user_id' in session or decode_cookie(cookie):
+        return
+    user_id = key_ring.decode_remember_cookie(cookie)
+    if user_id:
+        # Flask-Login loads the user from the session and re-issues the cookie with the new key
+        session['_user_id'] = user_id
+        session['_fresh'] = False
+        session['_remember'] = 'set'
+
 def check_file_exists(filepath):
     """Check if a file exists"""
     return os.path.exists(filepath)
 
-@app.route('/')
+@bp.route('/')
 def root():
     """Serve the actual game index.html"""
     return render_template('index.html')
 
 # Add a catch-all route for static files in root directory
-@app.route('/<path:filename>')
+@bp.route('/<path:filename>')
 def serve_static_files(filename):
     """Serve static files from root directory"""
     if check_file_exists(filename):
@@ -193,7 +504,7 @@ def serve_static_files(filename):
         # Return 404 for missing files
         from flask import abort
         abort(404)
-@app.route('/api/test')
+@bp.route('/api/test')
 def api_test():
     """Test API endpoint"""
     return jsonify({
@@ -203,14 +514,14 @@ def api_test():
         'database': 'connected'
     })
 
-@app.route('/verify')
+@bp.route('/verify')
 def verify():
     """System verification page replacing verify.php"""
     # Check database connection
     db_info = db_manager.test_connection()
     
     # Check required files
-    required_files = app.config.get('REQUIRED_FILES', [
+    required_files = current_app.config.get('REQUIRED_FILES', [
         'index.html',
         'static/js/main.js', 
         'static/css/main.css',
@@ -223,7 +534,7 @@ def verify():
     
     return render_template('verify.html', db_info=db_info, file_status=file_status)
 
-@app.route('/setup')
+@bp.route('/setup')
 def setup():
     """Database setup page"""
     setup_result = None
@@ -240,11 +551,43 @@ def setup():
         else:
             setup_result = {'success': True, 'message': f'Database schema updated: {result}'}
     
-    return render_template('setup.html', setup_result=setup_result, config=app.config)
+    return render_template('setup.html', setup_result=setup_result, config=current_app.config)
+
+def workload(name):
+    """Decorator to run the view within the WORKLOAD_CLASSES[name] concurrency limit
+    
+    Goes below the auth decorators so only requests that will do real work
+    take a slot. Returns 503 with Retry-After when the class is saturated.
+    Views whose work is shared through single_flight call run_admitted for
+    the shared part instead, so waiting on another request takes no slot.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                return run_admitted(name, f, *args, **kwargs)
+            except WorkloadBusyError as e:
+                return workload_busy_response(e)
+        return decorated_function
+    return decorator
+
+def run_admitted(name, fn, *args, **kwargs):
+    """Run fn within the WORKLOAD_CLASSES[name] concurrency limit, raises WorkloadBusyError when saturated"""
+    if not current_app.config.get('WORKLOAD_ENABLED', True) or name not in workloads.classes:
+        return fn(*args, **kwargs)
+    with workloads.admit(name):
+        return fn(*args, **kwargs)
+
+def workload_busy_response(error):
+    """Build the 503 response for a saturated workload class"""
+    return jsonify({'status': 'error', 'message': str(error)}), 503, {
+        'Retry-After': str(error.retry_after)
+    }
 
 # API endpoints for game functionality
-@app.route('/api/save_progress', methods=['POST'])
+@bp.route('/api/save_progress', methods=['POST'])
 @login_required
+@workload('gameplay')
 def save_progress():
     """Save game progress"""
     try:
@@ -258,8 +601,9 @@ def save_progress():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/load_progress/<session_id>')
+@bp.route('/api/load_progress/<session_id>')
 @login_required
+@workload('gameplay')
 def load_progress(session_id):
     """Load game progress"""
     try:
@@ -279,7 +623,7 @@ def load_progress(session_id):
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 # Add new routes for authentication
-@app.route('/api/auth/register', methods=['POST'])
+@bp.route('/api/auth/register', methods=['POST'])
 def register():
     try:
         data = request.get_json()
@@ -297,10 +641,12 @@ def register():
         else:
             status_code = 409 if 'already exists' in result['error'] else 500
             return jsonify({'status': 'error', 'message': result['error']}), status_code
+    except HashingBusyError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': '2'}
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+@bp.route('/api/auth/login', methods=['POST'])
 def login():
     try:
         data = request.get_json()
@@ -315,6 +661,7 @@ def login():
         if user:
             print(f"User authenticated: {user.username}, is_admin: {user.is_admin}")  # Debug logging
             login_user(user, remember=remember)
+            restore_archived_user(user)
             return jsonify({
                 'status': 'success',
                 'user': {
@@ -326,11 +673,13 @@ def login():
         else:
             print(f"Authentication failed for: {identifier}")  # Debug logging
             return jsonify({'status': 'error', 'message': 'Invalid credentials'}), 401
+    except HashingBusyError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': '2'}
     except Exception as e:
         print(f"Login error: {str(e)}")  # Debug logging
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/auth/logout')
+@bp.route('/api/auth/logout')
 @login_required
 def logout():
     logout_user()
@@ -338,7 +687,7 @@ def logout():
     session.clear()
     return jsonify({'status': 'success', 'redirect': '/'})
 
-@app.route('/logout', methods=['POST'])
+@bp.route('/logout', methods=['POST'])
 def logout_post():
     """Alternative logout endpoint for POST requests"""
     if current_user.is_authenticated:
@@ -346,6 +695,29 @@ def logout_post():
     session.clear()
     return redirect('/')
 
+def rate_limit(name):
+    """Decorator to apply the RATE_LIMITS[name] token buckets per user and per IP
+    
+    Runs before login_required and reads the user id straight from the session
+    cookie, so rejected requests never load the user or touch the database.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limits = current_app.config.get('RATE_LIMITS', {}).get(name)
+            if limits and current_app.config.get('RATE_LIMIT_ENABLED', True):
+                allowed, retry_after = rate_limiter.check(name, limits, [
+                    ('user', session.get('_user_id')),
+                    ('ip', request.remote_addr)
+                ])
+                if not allowed:
+                    return jsonify({'status': 'error', 'message': 'Too many requests'}), 429, {
+                        'Retry-After': str(retry_after)
+                    }
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
 def admin_required(f):
     """Decorator to require admin access"""
     @wraps(f)
@@ -360,80 +732,78 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def open_report_cursor(conn, report_type, config):
+    """Open a cursor over the rows of a tabular report, or None for summary-style reports"""
+    filters = ReportFilters.from_config(config)
+    
+    if report_type == 'user-performance':
+        # Get user performance metrics, dates limit the sessions counted and
+        # cohort/room filters limit the users listed
+        join_sql, join_params = ReportQuery(filters).date_range('gs.updated_at').sql('AND')
+        where_sql, where_params = ReportQuery(filters).cohort('u.id').rooms('u.id').sql()
+        return conn.execute(f'''
+            SELECT u.username, u.email, u.created_at,
+                   COUNT(DISTINCT gs.session_id) as sessions,
+                   MAX(gs.current_level) as max_level,
+                   AVG(CAST(gs.current_level as FLOAT)) as avg_level
+            FROM users u
+            LEFT JOIN game_state gs ON gs.user_id = u.id {join_sql}
+            {where_sql}
+            GROUP BY u.id
+            ORDER BY max_level DESC
+        ''', join_params + where_params)
+    elif report_type == 'challenge-completion':
+        # Get challenge completion statistics
+        where_sql, params = ReportQuery(filters).date_range('updated_at').cohort('user_id').rooms('user_id').sql()
+        return conn.execute(f'''
+            SELECT current_level as level, 
+                   COUNT(*) as completions,
+                   AVG(CASE WHEN progress LIKE '%score%' 
+                       THEN CAST(json_extract(progress, '$.score') as INTEGER) 
+                       ELSE 0 END) as avg_score
+            FROM game_state
+            {where_sql}
+            GROUP BY current_level
+            ORDER BY current_level
+        ''', params)
+    elif report_type == 'engagement-trends':
+        filters = ReportFilters.from_config(config, default_days=30)
+        if filters.has_cohort or filters.rooms:
+            # The per-session rollup counts the same actions as the daily totals, for matching users only
+            where_sql, params = ReportQuery(filters).date_range('day').cohort('user_id').rooms('user_id').sql()
+            return rollups.get_session_engagement_trends(conn, where_sql, params)
+        # Get engagement trends over time from the daily rollups
+        return rollups.get_engagement_trends(conn, filters.start_day, filters.end_day)
+    return None
+
 def generate_report_data(report_type, config):
     """Generate report data based on type and configuration"""
     try:
         conn = db_manager.get_connection()
         
-        if report_type == 'user-performance':
-            # Get user performance metrics
-            data = conn.execute('''
-                SELECT u.username, u.email, u.created_at,
-                       COUNT(DISTINCT gs.session_id) as sessions,
-                       MAX(gs.current_level) as max_level,
-                       AVG(CAST(gs.current_level as FLOAT)) as avg_level
-                FROM users u
-                LEFT JOIN game_state gs ON gs.session_id LIKE 'user_' || u.id || '_%'
-                GROUP BY u.id
-                ORDER BY max_level DESC
-            ''').fetchall()
-            
-            return {
-                'report_type': report_type,
-                'generated_at': datetime.now().isoformat(),
-                'data': [dict(row) for row in data]
-            }
-            
-        elif report_type == 'challenge-completion':
-            # Get challenge completion statistics
-            data = conn.execute('''
-                SELECT current_level as level, 
-                       COUNT(*) as completions,
-                       AVG(CASE WHEN progress_data LIKE '%score%' 
-                           THEN CAST(json_extract(progress_data, '$.score') as INTEGER) 
-                           ELSE 0 END) as avg_score
-                FROM game_state
-                GROUP BY current_level
-                ORDER BY current_level
-            ''').fetchall()
-            
-            return {
-                'report_type': report_type,
-                'generated_at': datetime.now().isoformat(),
-                'data': [dict(row) for row in data]
-            }
-            
-        elif report_type == 'engagement-trends':
-            # Get engagement trends over time
-            data = conn.execute('''
-                SELECT DATE(updated_at) as date,
-                       COUNT(DISTINCT session_id) as active_sessions,
-                       COUNT(*) as total_actions
-                FROM game_state
-                WHERE updated_at > datetime('now', '-30 days')
-                GROUP BY DATE(updated_at)
-                ORDER BY date DESC
-            ''').fetchall()
-            
+        cursor = open_report_cursor(conn, report_type, config)
+        if cursor is not None:
             return {
                 'report_type': report_type,
                 'generated_at': datetime.now().isoformat(),
-                'data': [dict(row) for row in data]
+                'data': [dict(row) for row in cursor]
             }
             
-        elif report_type == 'system-effectiveness':
+        if report_type == 'system-effectiveness':
             # Get system effectiveness metrics
-            total_users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
-            active_users = conn.execute(
-                "SELECT COUNT(DISTINCT session_id) FROM game_state WHERE updated_at > datetime('now', '-7 days')"
-            ).fetchone()[0]
+            filters = ReportFilters.from_config(config, default_days=7)
+            cohort_sql, cohort_params = ReportQuery(filters).cohort('id').sql()
+            total_users = conn.execute(f'SELECT COUNT(*) FROM users {cohort_sql}', cohort_params).fetchone()[0]
             
-            level_distribution = conn.execute('''
-                SELECT current_level, COUNT(*) as user_count
-                FROM game_state
-                GROUP BY current_level
-                ORDER BY current_level
-            ''').fetchall()
+            active_cohort = None
+            if filters.has_cohort:
+                active_cohort = ReportQuery(filters).cohort('CAST(user_key AS INTEGER)').sql('')
+            active_users = sketches.count_active_users(
+                conn, filters.start_day, filters.end_day, rooms=filters.rooms,
+                exact=bool(config.get('exact_counts')), cohort=active_cohort
+            )
+            level_distribution = rollups.get_level_distribution(conn)
+            room_completions = rollups.get_room_completions(conn, filters.start_day, filters.end_day, filters.rooms)
             
             return {
                 'report_type': report_type,
@@ -443,7 +813,8 @@ def generate_report_data(report_type, config):
                     'active_users': active_users,
                     'engagement_rate': (active_users / max(total_users, 1)) * 100
                 },
-                'level_distribution': [dict(row) for row in level_distribution]
+                'level_distribution': [dict(row) for row in level_distribution],
+                'room_completions': [dict(row) for row in room_completions]
             }
             
         else:
@@ -494,26 +865,25 @@ def generate_csv_response(data, filename):
     
     return response
 
-def generate_excel_response(data, filename):
-    """Generate Excel response from report data"""
+def generate_excel_file(report_type, config):
+    """Write a report to a temporary Excel file and return its path"""
+    import tempfile
+    from openpyxl import Workbook
+    
+    # Write-only mode streams rows to disk instead of keeping every cell in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Report Data")
+    
+    conn = db_manager.get_connection()
     try:
-        import openpyxl
-        from openpyxl.utils.dataframe import dataframe_to_rows
-        import pandas as pd
-        from flask import make_response
-        import io
-        
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Report Data"
-        
-        if 'data' in data and data['data']:
-            # Convert to DataFrame for easier Excel handling
-            df = pd.DataFrame(data['data'])
-            for r in dataframe_to_rows(df, index=False, header=True):
-                ws.append(r)
+        cursor = open_report_cursor(conn, report_type, config)
+        if cursor is not None:
+            ws.append([column[0] for column in cursor.description])
+            for row in cursor:
+                ws.append(tuple(row))
         else:
             # Handle summary-style reports
+            data = generate_report_data(report_type, config)
             ws.append(['Report Type', data.get('report_type', 'Unknown')])
             ws.append(['Generated At', data.get('generated_at', '')])
             if 'summary' in data:
@@ -522,77 +892,96 @@ def generate_excel_response(data, filename):
                 for key, value in data['summary'].items():
                     ws.append([key, value])
         
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}.xlsx'
-        
-        return response
-        
-    except ImportError:
-        # Fallback to CSV if Excel libraries not available
-        return generate_csv_response(data, filename)
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            wb.save(path)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+    finally:
+        conn.close()
 
-def generate_pdf_response(data, filename):
-    """Generate PDF response from report data"""
+def generate_pdf_file(report_type, config):
+    """Render a report to a temporary PDF file and return its path"""
+    import tempfile
+    import reportlab  # noqa: F401 - raise ImportError before collecting rows
+    
+    max_rows = current_app.config.get('PDF_MAX_ROWS', 5000)
+    headers, rows, total_rows = [], [], 0
+    
+    conn = db_manager.get_connection()
     try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-        from reportlab.lib.styles import getSampleStyleSheet
-        from reportlab.lib import colors
-        from flask import make_response
-        import io
-        
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Title
-        title = Paragraph(f"Report: {data.get('report_type', 'Unknown')}", styles['Title'])
-        elements.append(title)
-        
-        # Generated date
-        date_para = Paragraph(f"Generated: {data.get('generated_at', '')}", styles['Normal'])
-        elements.append(date_para)
-        
-        if 'data' in data and data['data']:
-            # Create table from data
-            table_data = []
-            if data['data']:
-                headers = list(data['data'][0].keys())
-                table_data.append(headers)
-                for row in data['data']:
-                    table_data.append([str(row.get(h, '')) for h in headers])
-                
-                table = Table(table_data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 14),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                elements.append(table)
-        
-        doc.build(elements)
-        buffer.seek(0)
-        
-        response = make_response(buffer.getvalue())
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}.pdf'
-        
-        return response
-        
-    except ImportError:
-        # Fallback to CSV if PDF libraries not available
-        return generate_csv_response(data, filename)
+        cursor = open_report_cursor(conn, report_type, config)
+        if cursor is not None:
+            headers = [column[0] for column in cursor.description]
+            rows = [[str(value if value is not None else '') for value in row] for row in cursor.fetchmany(max_rows)]
+            total_rows = len(rows) + sum(1 for _ in cursor)
+    finally:
+        conn.close()
+    
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    
+    future = pdf_executor.submit(
+        render_pdf_report, path, report_type, datetime.now().isoformat(), headers, rows, total_rows,
+        current_app.config.get('PDF_TABLE_CHUNK_ROWS', 50)
+    )
+    try:
+        future.result(timeout=current_app.config.get('PDF_RENDER_TIMEOUT', 60))
+    except FuturesTimeoutError:
+        # Leave the render running but discard its output when it finishes
+        future.add_done_callback(lambda _: os.path.exists(path) and os.remove(path))
+        raise Exception('PDF rendering timed out, try CSV or Excel for large reports')
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+def render_pdf_report(path, report_type, generated_at, headers, rows, total_rows, chunk_rows):
+    """Lay out a PDF report as a series of page-sized tables"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+    
+    doc = SimpleDocTemplate(path, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+    
+    # Title
+    elements.append(Paragraph(f"Report: {report_type}", styles['Title']))
+    
+    # Generated date
+    elements.append(Paragraph(f"Generated: {generated_at}", styles['Normal']))
+    
+    if rows:
+        if total_rows > len(rows):
+            elements.append(Paragraph(
+                f"Showing the first {len(rows)} of {total_rows} rows. "
+                f"Export as CSV or Excel for the full data.",
+                styles['Italic']
+            ))
+        
+        table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 14),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+        
+        # Small tables keep layout linear, one huge table is re-split on every page
+        for start in range(0, len(rows), chunk_rows):
+            table = LongTable([headers] + rows[start:start + chunk_rows], repeatRows=1)
+            table.setStyle(table_style)
+            elements.append(table)
+    
+    doc.build(elements)
 
 def generate_csv_content(data):
     """Generate CSV content string from report data"""
@@ -618,85 +1007,108 @@ def generate_csv_content(data):
     
     return output.getvalue()
 
-def save_report_to_history(report_type, config, file_data, format_type):
+# Content types for stored report formats
+REPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'pdf': 'application/pdf',
+    'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'zip': 'application/zip'
+}
+
+def save_report_to_history(report_type, config, file_data, format_type, content_hash=None, size=None):
     """Save generated report to history"""
     try:
         import uuid
         
-        conn = db_manager.get_connection()
+        # Report contents live in the content-addressed store, the table only keeps metadata
+        if content_hash is None:
+            content_hash, file_size = report_store.put_bytes(file_data or b'')
+        else:
+            file_size = size
         
-        # Ensure report_history table exists
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS report_history (
-                id TEXT PRIMARY KEY,
-                type TEXT NOT NULL,
-                format TEXT NOT NULL,
-                config TEXT,
-                file_data BLOB,
-                size INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                description TEXT,
-                metadata TEXT
-            )
-        ''')
+        conn = db_manager.get_connection()
+        db_manager.ensure_report_history_table(conn)
         
         report_id = str(uuid.uuid4())
         config_json = json.dumps(config) if config else None
-        file_size = len(file_data) if file_data else 0
         description = f"{report_type} report in {format_type} format"
         
         conn.execute('''
-            INSERT INTO report_history (id, type, format, config, file_data, size, description)
+            INSERT INTO report_history (id, type, format, config, content_hash, size, description)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (report_id, report_type, format_type, config_json, file_data, file_size, description))
+        ''', (report_id, report_type, format_type, config_json, content_hash, file_size, description))
         
         conn.commit()
+        
+        # Keep history within the configured count, age and size limits
+        report_store.enforce_retention(conn)
         conn.close()
         
-        return {'success': True, 'report_id': report_id}
+        return {'success': True, 'report_id': report_id, 'content_hash': content_hash, 'size': file_size}
         
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
-@app.route('/admin')
+@bp.route('/admin')
 @login_required
 @admin_required
 def admin_dashboard():
     """Admin dashboard"""
     return render_template('admin/dashboard.html')
 
-@app.route('/api/admin/stats')
+@bp.route('/api/admin/stats')
 @login_required
 @admin_required
 def admin_stats():
     """Get admin statistics"""
     try:
-        conn = db_manager.get_connection()
-        
-        # Get total users
-        total_users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
-        
-        # Get active sessions (sessions updated in last 24 hours)
-        active_sessions = conn.execute(
-            "SELECT COUNT(*) FROM game_state WHERE updated_at > datetime('now', '-1 day')"
-        ).fetchone()[0]
+        # ?exact=1 counts active users exactly for audits
+        exact = request.args.get('exact') == '1'
+        # Only the request running the counts takes a dashboard slot, identical ones wait for its result
+        counts = single_flight.do(f'admin-stats:{exact}', run_admitted, 'dashboard', admin_stat_counts, exact)
         
-        conn.close()
+        # Only set when serving through asgi.py
+        async_db = current_app.extensions['ascended'].get('async_db')
         
         return jsonify({
             'status': 'success',
             'stats': {
-                'total_users': total_users,
-                'active_sessions': active_sessions,
+                'total_users': counts['total_users'],
+                'active_sessions': counts['active_sessions'],
+                'active_users': counts['active_users'],
+                'password_hashing': password_hasher.stats(),
+                'workloads': workloads.stats(),
+                'event_streams': dashboard_events.stats(),
+                'cache': cache.stats(),
+                'single_flight': single_flight.stats(),
+                'async_db': async_db.stats() if async_db else None,
                 'db_size': 'Unknown'  # Could implement actual DB size calculation
             }
         })
+    except WorkloadBusyError as e:
+        return workload_busy_response(e)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/users')
+def admin_stat_counts(exact=False):
+    """Count users, active sessions and DAU/WAU/MAU for the admin stats"""
+    conn = db_manager.get_connection()
+    try:
+        return {
+            'total_users': conn.execute('SELECT COUNT(*) FROM users').fetchone()[0],
+            # Sessions updated in last 24 hours
+            'active_sessions': dashboard_stats.active_session_count(conn),
+            # From the activity sketches unless exact
+            'active_users': sketches.active_user_metrics(conn, exact=exact)
+        }
+    finally:
+        conn.close()
+
+@bp.route('/api/admin/users')
 @login_required
 @admin_required
+@workload('dashboard')
 def admin_users():
     """Get all users for admin with optional filtering"""
     try:
@@ -733,70 +1145,106 @@ def admin_users():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/user-stats')
+@bp.route('/api/admin/user-stats')
 @login_required
 @admin_required
 def admin_user_stats():
     """Get user statistics by type"""
     try:
-        conn = db_manager.get_connection()
-        
         # Get counts by user type
-        total_users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
-        admin_count = conn.execute('SELECT COUNT(*) FROM users WHERE is_admin = 1').fetchone()[0]
-        regular_count = total_users - admin_count
-        
-        conn.close()
+        counts = single_flight.do('user-stats', run_admitted, 'dashboard', with_connection, dashboard_stats.user_counts)
         
         return jsonify({
             'status': 'success',
-            'stats': {
-                'total_users': total_users,
-                'admin_users': admin_count,
-                'regular_users': regular_count
-            }
+            'stats': counts
         })
+    except WorkloadBusyError as e:
+        return workload_busy_response(e)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/game-stats')
+@bp.route('/api/admin/game-stats')
 @login_required
 @admin_required
 def admin_game_stats():
     """Get game statistics"""
     try:
-        conn = db_manager.get_connection()
-        
-        # Level completion stats
-        level_stats = conn.execute('''
-            SELECT current_level as level, COUNT(*) as completions 
-            FROM game_state 
-            GROUP BY current_level 
-            ORDER BY current_level
-        ''').fetchall()
-        
-        # Recent activity
-        recent_activity = conn.execute('''
-            SELECT u.username, gs.current_level as level, gs.updated_at as timestamp
-            FROM game_state gs
-            JOIN users u ON gs.session_id LIKE 'user_' || u.id || '_%'
-            ORDER BY gs.updated_at DESC
-            LIMIT 10
-        ''').fetchall()
-        
-        conn.close()
+        stats = single_flight.do('game-stats', run_admitted, 'dashboard', game_stats)
         
         return jsonify({
             'status': 'success',
-            'stats': {
-                'level_completion': [{'level': row['level'], 'completions': row['completions']} for row in level_stats],
-                'recent_activity': [{'username': row['username'], 'level': row['level'], 'timestamp': row['timestamp']} for row in recent_activity]
-            }
+            'stats': stats
         })
+    except WorkloadBusyError as e:
+        return workload_busy_response(e)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/auth/user')
+def game_stats():
+    """Get level completion stats and recent activity"""
+    return {
+        'level_completion': with_connection(dashboard_stats.level_completion),
+        'recent_activity': activity_feed.recent(10)
+    }
+
+def with_connection(query):
+    """Run query(conn) on a fresh connection"""
+    conn = db_manager.get_connection()
+    try:
+        return query(conn)
+    finally:
+        conn.close()
+
+@bp.route('/api/admin/activity')
+@login_required
+@admin_required
+def admin_activity():
+    """Get recent activity, optionally for one room or event type"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), activity_feed.capacity)
+        entries = activity_feed.recent(
+            limit,
+            room_number=request.args.get('room', type=int),
+            event_type=request.args.get('event_type') or None
+        )
+        return jsonify({'status': 'success', 'activity': entries})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/admin/events')
+@login_required
+@admin_required
+def admin_events():
+    """Stream dashboard stat changes and new activity as server-sent events"""
+    subscription = Subscription(max_queue=current_app.config.get('EVENT_STREAM_QUEUE', 100))
+    try:
+        dashboard_events.subscribe(subscription)
+    except EventStreamBusyError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': '10'}
+    
+    publisher = dashboard_events._get_current_object()
+    keepalive = current_app.config.get('EVENT_STREAM_KEEPALIVE', 15)
+    
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            yield from subscription.messages(keepalive)
+        finally:
+            publisher.unsubscribe(subscription)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.after_app_request
+def wake_dashboard_events(response):
+    """Let open dashboards pick up a successful write straight away"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        dashboard_events.notify()
+    return response
+
+@bp.route('/api/auth/user')
 def get_current_user():
     if current_user.is_authenticated:
         return jsonify({
@@ -810,7 +1258,7 @@ def get_current_user():
     else:
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
 
-@app.route('/setup_admin', methods=['POST'])
+@bp.route('/setup_admin', methods=['POST'])
 def setup_admin():
     """
     Create an admin account if it does not exist.
@@ -827,7 +1275,7 @@ def setup_admin():
     else:
         return jsonify({'status': 'error', 'message': result['error']}), 400
 
-@app.route('/api/admin/toggle-admin', methods=['POST'])
+@bp.route('/api/admin/toggle-admin', methods=['POST'])
 @login_required
 @admin_required
 def toggle_admin():
@@ -851,12 +1299,13 @@ def toggle_admin():
         )
         conn.commit()
         conn.close()
+        db_manager.invalidate_user(user_id)
         
         return jsonify({'status': 'success', 'message': 'User admin status updated'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/delete-user', methods=['POST'])
+@bp.route('/api/admin/delete-user', methods=['POST'])
 @login_required
 @admin_required
 def delete_user():
@@ -872,104 +1321,325 @@ def delete_user():
         if user_id == current_user.id:
             return jsonify({'status': 'error', 'message': 'Cannot delete yourself'}), 400
         
-        conn = db_manager.get_connection()
-        
-        # Delete user's game progress first (foreign key constraint)
-        conn.execute('DELETE FROM game_state WHERE session_id LIKE ?', (f'user_{user_id}_%',))
-        conn.execute('DELETE FROM user_progress WHERE username = (SELECT username FROM users WHERE id = ?)', (user_id,))
-        
-        # Delete the user
-        conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
-        conn.commit()
-        conn.close()
+        delete_users_and_archives([user_id])
         
         return jsonify({'status': 'success', 'message': 'User deleted successfully'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/backup-db')
+@bp.route('/api/admin/users/bulk-delete', methods=['POST'])
 @login_required
 @admin_required
-def backup_database():
-    """Create a database backup"""
+@workload('admin_heavy')
+def bulk_delete_users():
+    """Delete many users and all of their data in one transaction"""
     try:
-        import shutil
-        from datetime import datetime
+        data = request.get_json() or {}
+        user_ids = data.get('user_ids')
         
-        # Create backup filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f'backup_ascended_{timestamp}.db'
-        backup_path = os.path.join(app.config.get('DATABASE_DIR', 'database'), backup_filename)
+        if not user_ids or not isinstance(user_ids, list):
+            return jsonify({'status': 'error', 'message': 'user_ids must be a non-empty list'}), 400
+        try:
+            user_ids = [int(user_id) for user_id in user_ids]
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'user_ids must be integers'}), 400
         
-        # Copy the database file
-        shutil.copy2(app.config['DATABASE'], backup_path)
+        # Prevent deleting yourself
+        if int(current_user.id) in user_ids:
+            return jsonify({'status': 'error', 'message': 'Cannot delete yourself'}), 400
         
-        # Send the backup file as download
-        from flask import send_file
-        return send_file(backup_path, as_attachment=True, download_name=backup_filename)
+        deleted = delete_users_and_archives(user_ids)
+        return jsonify({
+            'status': 'success',
+            'message': f"Deleted {deleted.get('users', 0)} users",
+            'deleted': deleted
+        })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/clear-sessions', methods=['POST'])
+@bp.route('/api/admin/users/import', methods=['POST'])
 @login_required
 @admin_required
-def clear_old_sessions():
-    """Clear old game sessions"""
+@workload('admin_heavy')
+def import_users():
+    """Create users in bulk from an uploaded CSV or XLSX file"""
     try:
-        conn = db_manager.get_connection()
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({'status': 'error', 'message': 'No file uploaded'}), 400
         
-        # Delete sessions older than 7 days
-        conn.execute(
-            "DELETE FROM game_state WHERE updated_at < datetime('now', '-7 days')"
+        try:
+            rows = user_import.read_user_rows(upload.filename, upload.stream)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        max_rows = current_app.config.get('IMPORT_MAX_ROWS', 5000)
+        if len(rows) > max_rows:
+            return jsonify({'status': 'error', 'message': f'Too many rows ({len(rows)}), the limit is {max_rows}'}), 400
+        
+        result = user_import.import_users(
+            db_manager,
+            rows,
+            dry_run=request.form.get('dry_run') in ('1', 'true')
         )
-        
-        rows_deleted = conn.total_changes
-        conn.commit()
-        conn.close()
+        return jsonify(dict(result, status='success'))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def delete_users_and_archives(user_ids):
+    """Delete users with their dependent rows, then their archived rows"""
+    result = db_manager.delete_users(user_ids)
+    if result['archived']:
+        archive_manager.delete_archived(result['archived'])
+    return result['deleted']
+
+@bp.route('/api/admin/backup-db')
+@login_required
+@admin_required
+@workload('admin_heavy')
+def backup_database():
+    """Create a database backup and download it once finished"""
+    try:
+        compression = request.args.get('compression', current_app.config.get('BACKUP_DEFAULT_COMPRESSION'))
+        job = backup_manager.start_backup(compression or None)
+        job.done.wait()
+        return send_backup_file(job)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/admin/backups', methods=['POST'])
+@login_required
+@admin_required
+def start_backup():
+    """Start a database backup in the background"""
+    try:
+        data = request.get_json(silent=True) or {}
+        compression = data.get('compression', current_app.config.get('BACKUP_DEFAULT_COMPRESSION'))
+        job = backup_manager.start_backup(compression or None)
+        return jsonify({'status': 'success', 'backup': job.to_dict()}), 202
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/admin/backups')
+@login_required
+@admin_required
+@workload('dashboard')
+def list_backups():
+    """List stored backups with their sizes"""
+    backups = backup_manager.list_backups()
+    return jsonify({
+        'status': 'success',
+        'backups': [
+            {'filename': b['filename'], 'size': b['size'], 'created_at': b['created_at'].isoformat()}
+            for b in backups
+        ],
+        'total_size': sum(b['size'] for b in backups),
+        'last_scheduled': backup_scheduler.last_result
+    })
+
+@bp.route('/api/admin/backups/<job_id>')
+@login_required
+@admin_required
+@workload('dashboard')
+def get_backup_status(job_id):
+    """Get progress of a background backup"""
+    job = backup_manager.get_job(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Backup not found'}), 404
+    return jsonify({'status': 'success', 'backup': job.to_dict()})
+
+@bp.route('/api/admin/backups/<job_id>/download')
+@login_required
+@admin_required
+def download_backup(job_id):
+    """Download a finished backup"""
+    job = backup_manager.get_job(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': 'Backup not found'}), 404
+    if job.status != 'completed':
+        return jsonify({'status': 'error', 'message': f'Backup is {job.status}'}), 409
+    return send_backup_file(job)
+
+def send_backup_file(job):
+    """Stream a finished backup file as a download"""
+    if job.status != 'completed':
+        return jsonify({'status': 'error', 'message': job.error or 'Backup failed'}), 500
+    from flask import send_file
+    return send_file(job.path, as_attachment=True, download_name=os.path.basename(job.path))
+
+@bp.route('/api/admin/clear-sessions', methods=['POST'])
+@login_required
+@admin_required
+@workload('admin_heavy')
+def clear_old_sessions():
+    """Clear old game sessions"""
+    try:
+        result = purge_engine.purge(['game_state'])
+        rows_deleted = result['deleted'].get('game_state', 0)
         
         return jsonify({
             'status': 'success', 
-            'message': f'Cleared {rows_deleted} old sessions'
+            'message': f'Cleared {rows_deleted} old sessions',
+            'rows_deleted': rows_deleted,
+            'pages_freed': result['pages_freed']
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/reports/<report_type>', methods=['POST'])
+@bp.route('/api/admin/purge', methods=['POST'])
+@login_required
+@admin_required
+@workload('admin_heavy')
+def purge_expired_data():
+    """Purge expired rows from every table with a retention period"""
+    try:
+        data = request.get_json(silent=True) or {}
+        return jsonify(dict(run_purge(data.get('tables')), status='success'))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@bp.route('/api/admin/archive', methods=['POST'])
+@login_required
+@admin_required
+@workload('admin_heavy')
+def archive_inactive_users():
+    """Move inactive users' progress into the dated archive database"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = archive_manager.archive_inactive(data.get('days'))
+        return jsonify(dict(result, status='success'))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def run_purge(tables=None):
+    """Run the purge engine and drop report files no longer referenced"""
+    result = purge_engine.purge(tables)
+    if result['deleted'].get('report_history'):
+        conn = db_manager.get_connection()
+        try:
+            result['report_files_removed'] = report_store.remove_orphans(conn)
+        finally:
+            conn.close()
+    return result
+
+@bp.route('/api/admin/reports/<report_type>', methods=['POST'])
 @login_required
 @admin_required
 def generate_report(report_type):
     """Generate specific report type"""
     try:
         config = request.get_json() or {}
-        report_data = generate_report_data(report_type, config)
+        format_type = config.get('format') if config.get('format') in ('csv', 'excel', 'pdf') else 'json'
+        
+        # Reuse the last rendering if none of the tables behind this report changed
+        cache_key = ReportCache.make_key(report_type, config)
+        watermark = get_report_watermark(report_type, config)
+        rendered = report_cache.get(cache_key, watermark)
+        if not (rendered and report_store.exists(rendered['content_hash'])):
+            # Identical requests wait for one rendering rather than each queueing for an admin_heavy slot
+            rendered = single_flight.do(
+                f'report:{cache_key}:{watermark}',
+                run_admitted, 'admin_heavy', render_report, report_type, config, format_type, cache_key, watermark
+            )
         
-        if config.get('format') == 'csv':
-            csv_response = generate_csv_response(report_data, f'{report_type}-report')
-            # Save to history
-            save_report_to_history(report_type, config, csv_response.get_data(), 'csv')
-            return csv_response
-        elif config.get('format') == 'excel':
-            excel_response = generate_excel_response(report_data, f'{report_type}-report')
-            # Save to history  
-            save_report_to_history(report_type, config, excel_response.get_data(), 'excel')
-            return excel_response
-        elif config.get('format') == 'pdf':
-            pdf_response = generate_pdf_response(report_data, f'{report_type}-report')
-            # Save to history
-            save_report_to_history(report_type, config, pdf_response.get_data(), 'pdf')
-            return pdf_response
-        else:
-            # Save JSON to history
-            json_data = json.dumps(report_data, indent=2).encode('utf-8')
-            save_report_to_history(report_type, config, json_data, 'json')
-            return jsonify({'status': 'success', 'data': report_data})
-            
+        save_report_to_history(
+            report_type, config, None, rendered['format'], content_hash=rendered['content_hash'], size=rendered['size']
+        )
+        return cached_report_response(report_type, rendered)
+    except WorkloadBusyError as e:
+        return workload_busy_response(e)
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/reports/bulk', methods=['POST'])
+def render_report(report_type, config, format_type, cache_key, watermark):
+    """Render a report into the report store and return its cache entry"""
+    file_path = None
+    if format_type in ('excel', 'pdf'):
+        try:
+            if format_type == 'excel':
+                file_path = generate_excel_file(report_type, config)
+            else:
+                file_path = generate_pdf_file(report_type, config)
+        except ImportError:
+            # Fallback to CSV if Excel/PDF libraries not available
+            format_type = 'csv'
+    
+    if file_path:
+        # Rendered files go straight from disk into the report store
+        content_hash, size = report_store.put_file(file_path)
+        extension = 'xlsx' if format_type == 'excel' else 'pdf'
+        content_type = REPORT_CONTENT_TYPES[format_type]
+        content_disposition = f'attachment; filename={report_type}-report.{extension}'
+        cacheable = True
+    else:
+        report_data = generate_report_data(report_type, config)
+        
+        if format_type == 'csv':
+            response = generate_csv_response(report_data, f'{report_type}-report')
+            file_data = response.get_data()
+            content_type = response.headers.get('Content-Type')
+            content_disposition = response.headers.get('Content-Disposition')
+        else:
+            file_data = json.dumps(report_data, indent=2).encode('utf-8')
+            content_type = REPORT_CONTENT_TYPES['json']
+            content_disposition = None
+        content_hash, size = report_store.put_bytes(file_data)
+        cacheable = 'error' not in report_data
+    
+    rendered = {
+        'content_hash': content_hash,
+        'size': size,
+        'format': format_type,
+        'content_type': content_type,
+        'content_disposition': content_disposition
+    }
+    if cacheable and report_type in REPORT_DEPENDENCIES:
+        report_cache.put(
+            cache_key, watermark, size,
+            content_hash=content_hash,
+            format=format_type,
+            content_type=content_type,
+            content_disposition=content_disposition
+        )
+    return rendered
+
+# Tables each report reads, used to build its cache watermark
+REPORT_DEPENDENCIES = {
+    'user-performance': ('users', 'game_state'),
+    'challenge-completion': ('game_state',),
+    'engagement-trends': ('game_state',),
+    'system-effectiveness': ('users', 'game_state', 'user_room_progress')
+}
+
+# Reports with a rolling time window (or a days filter) also go stale when the day changes
+TIME_WINDOWED_REPORTS = {'engagement-trends', 'system-effectiveness'}
+
+def get_report_watermark(report_type, config):
+    """Get the data watermark a cached report must match to be reused"""
+    watermark = db_manager.get_data_watermark(REPORT_DEPENDENCIES.get(report_type))
+    if report_type in TIME_WINDOWED_REPORTS or config.get('days'):
+        watermark += (datetime.utcnow().date().isoformat(),)
+    return watermark
+
+def cached_report_response(report_type, cached):
+    """Build a response for a report served from the cache"""
+    path = report_store.path_for(cached['content_hash'])
+    if cached['format'] == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            return jsonify({'status': 'success', 'data': json.load(f)})
+    
+    from flask import send_file
+    response = send_file(path, mimetype=cached['content_type'])
+    if cached['content_disposition']:
+        response.headers['Content-Disposition'] = cached['content_disposition']
+    return response
+
+@bp.route('/api/admin/reports/bulk', methods=['POST'])
 @login_required
 @admin_required
+@workload('admin_heavy')
 def generate_bulk_reports():
     """Generate multiple reports as a ZIP package"""
     try:
@@ -1026,28 +1696,17 @@ def generate_bulk_reports():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/reports/history')
+@bp.route('/api/admin/reports/history')
 @login_required
 @admin_required
+@workload('dashboard')
 def get_report_history():
     """Get report history"""
     try:
         conn = db_manager.get_connection()
         
         # Ensure report_history table exists
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS report_history (
-                id TEXT PRIMARY KEY,
-                type TEXT NOT NULL,
-                format TEXT NOT NULL,
-                config TEXT,
-                file_data BLOB,
-                size INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                description TEXT,
-                metadata TEXT
-            )
-        ''')
+        db_manager.ensure_report_history_table(conn)
         
         reports = conn.execute('''
             SELECT id, type, format, config, size, created_at, description, metadata
@@ -1075,7 +1734,7 @@ def get_report_history():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/reports/history/<report_id>')
+@bp.route('/api/admin/reports/history/<report_id>')
 @login_required
 @admin_required
 def get_report_details(report_id):
@@ -1084,7 +1743,8 @@ def get_report_details(report_id):
         conn = db_manager.get_connection()
         
         report = conn.execute('''
-            SELECT * FROM report_history WHERE id = ?
+            SELECT id, type, format, config, size, created_at, description, metadata
+            FROM report_history WHERE id = ?
         ''', (report_id,)).fetchone()
         
         conn.close()
@@ -1107,7 +1767,7 @@ def get_report_details(report_id):
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/reports/history/<report_id>/download')
+@bp.route('/api/admin/reports/history/<report_id>/download')
 @login_required
 @admin_required
 def download_report_from_history(report_id):
@@ -1116,7 +1776,8 @@ def download_report_from_history(report_id):
         conn = db_manager.get_connection()
         
         report = conn.execute('''
-            SELECT * FROM report_history WHERE id = ?
+            SELECT type, format, content_hash
+            FROM report_history WHERE id = ?
         ''', (report_id,)).fetchone()
         
         conn.close()
@@ -1124,32 +1785,25 @@ def download_report_from_history(report_id):
         if not report:
             return jsonify({'status': 'error', 'message': 'Report not found'}), 404
         
-        # Get file data
-        file_data = report['file_data']
-        if not file_data:
-            return jsonify({'status': 'error', 'message': 'Report file not available'}), 404
-        
-        from flask import make_response
-        response = make_response(file_data)
-        
         # Set appropriate content type
-        content_types = {
-            'csv': 'text/csv',
-            'json': 'application/json',
-            'pdf': 'application/pdf',
-            'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            'zip': 'application/zip'
-        }
+        content_type = REPORT_CONTENT_TYPES.get(report['format'], 'application/octet-stream')
+        download_name = f'{report["type"]}-{report_id}.{report["format"]}'
         
-        response.headers['Content-Type'] = content_types.get(report['format'], 'application/octet-stream')
-        response.headers['Content-Disposition'] = f'attachment; filename={report["type"]}-{report_id}.{report["format"]}'
+        if not report_store.exists(report['content_hash']):
+            return jsonify({'status': 'error', 'message': 'Report file not available'}), 404
         
-        return response
+        from flask import send_file
+        return send_file(
+            report_store.path_for(report['content_hash']),
+            mimetype=content_type,
+            as_attachment=True,
+            download_name=download_name
+        )
         
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/reports/history/<report_id>', methods=['DELETE'])
+@bp.route('/api/admin/reports/history/<report_id>', methods=['DELETE'])
 @login_required
 @admin_required
 def delete_report_from_history(report_id):
@@ -1158,21 +1812,22 @@ def delete_report_from_history(report_id):
         conn = db_manager.get_connection()
         
         # Check if report exists
-        report = conn.execute('SELECT id FROM report_history WHERE id = ?', (report_id,)).fetchone()
+        report = conn.execute('SELECT id, content_hash FROM report_history WHERE id = ?', (report_id,)).fetchone()
         if not report:
             conn.close()
             return jsonify({'status': 'error', 'message': 'Report not found'}), 404
         
-        # Delete the report
+        # Delete the report, and its file unless another report shares the same contents
         conn.execute('DELETE FROM report_history WHERE id = ?', (report_id,))
         conn.commit()
+        report_store.delete_if_unreferenced(conn, report['content_hash'])
         conn.close()
         
         return jsonify({'status': 'success', 'message': 'Report deleted successfully'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/admin/reports/history', methods=['DELETE'])
+@bp.route('/api/admin/reports/history', methods=['DELETE'])
 @login_required
 @admin_required
 def clear_report_history():
@@ -1184,6 +1839,7 @@ def clear_report_history():
         cursor = conn.execute('DELETE FROM report_history')
         rows_deleted = cursor.rowcount
         conn.commit()
+        report_store.remove_orphans(conn)
         conn.close()
         
         return jsonify({
@@ -1193,7 +1849,7 @@ def clear_report_history():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @login_required
 def user_dashboard():
     """User dashboard"""
@@ -1202,208 +1858,61 @@ def user_dashboard():
         return redirect('/admin')
     return render_template('user-dashboard.html')
 
-@app.route('/api/user/progress')
+@bp.route('/api/user/progress')
 @login_required
+@workload('gameplay')
 def get_user_progress():
     """Get user's game progress with detailed metrics for dashboard"""
-    try:
-        # Get comprehensive progress summary
-        progress_summary = db_manager.get_overall_progress_summary(current_user.id)
-        
-        if not progress_summary['success']:
-            return jsonify({'status': 'error', 'message': progress_summary.get('error', 'Failed to load progress')}), 500
-        
-        # If no progress data yet, return default structure
-        if not progress_summary['summary']:
-            return jsonify({
-                'status': 'success',
-                'stats': {
-                    'completed_rooms': 0,
-                    'current_room': 1,
-                    'current_level': 1,
-                    'badge_count': 0,
-                    'session_count': 0,
-                    'last_played': None,
-                    'total_score': 0,
-                    'completion_rate': 0
-                },
-                'rooms': []
-            })
-        
-        # Get room-specific progress
-        rooms = []
-        for room_id in range(1, 6):  # 5 game rooms
-            room_progress = db_manager.get_detailed_progress(current_user.id, room_id)
-            if room_progress['success'] and room_progress['progress']:
-                rooms.append(room_progress['progress'])
-            else:
-                # Add placeholder for rooms not started yet
-                rooms.append({
-                    'room_number': room_id,
-                    'room_name': f"Room {room_id}",
-                    'completion_status': 'not_started',
-                    'completion_percentage': 0,
-                    'time_spent': 0,
-                    'best_score': 0,
-                    'attempts': 0
-                })
-        
-        # Get badge count
-        conn = db_manager.get_connection()
-        badge_count = 0
-        try:
-            badge_count = conn.execute(
-                "SELECT COUNT(*) FROM user_badges WHERE user_id = ?",
-                (current_user.id,)
-            ).fetchone()[0]
-        except:
-            pass
-        
-        # Get session count
-        session_count = 0
-        try:
-            session_count = conn.execute(
-                "SELECT COUNT(*) FROM user_sessions WHERE user_id = ?",
-                (current_user.id,)
-            ).fetchone()[0]
-        except:
-            pass
-        
-        conn.close()
-        
-        # Get current position
-        current_room = 1
-        current_level = 1
-        # Use the room with highest percentage that's not completed, or the first one
-        for room in rooms:
-            if room['completion_status'] != 'completed' and room['completion_percentage'] > 0:
-                current_room = room['room_number']
-                break
-            elif room['completion_status'] == 'completed':
-                current_room = room['room_number'] + 1
-                if current_room > 5:
-                    current_room = 5  # Cap at max room
-        
-        summary = progress_summary['summary']
-        return jsonify({
-            'status': 'success',
-            'stats': {
-                'completed_rooms': summary['completed_rooms'],
-                'total_rooms': summary['total_rooms'],
-                'current_room': current_room,
-                'current_level': current_level,
-                'badge_count': badge_count,
-                'session_count': session_count,
-                'last_played': rooms[0].get('last_accessed') if rooms else None,
-                'total_score': summary['total_score'],
-                'total_time_spent': summary['total_time_spent'],
-                'completion_rate': round(summary['completion_rate'], 1),
-                'performance': summary['performance_metrics']
-            },
-            'rooms': rooms
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    payload, status = gameplay.user_progress(db_manager, current_user.id)
+    return jsonify(payload), status
 
-@app.route('/api/user/room-progress/<int:room_id>')
+@bp.route('/api/user/room-progress/<int:room_id>')
 @login_required
+@workload('gameplay')
 def get_room_progress(room_id):
     """Get detailed progress for a specific room"""
-    try:
-        result = db_manager.get_detailed_progress(current_user.id, room_id)
-        if result['success']:
-            return jsonify({'status': 'success', 'progress': result['progress']})
-        else:
-            return jsonify({'status': 'error', 'message': result.get('error', 'Failed to load room progress')}), 500
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    payload, status = gameplay.room_progress(db_manager, current_user.id, room_id)
+    return jsonify(payload), status
 
-@app.route('/api/user/track-progress', methods=['POST'])
+@bp.route('/api/user/track-progress', methods=['POST'])
+@rate_limit('track_progress')
 @login_required
+@workload('gameplay')
 def track_user_progress():
     """Update user's progress for a room"""
-    try:
-        data = request.get_json()
-        room_id = data.get('room_id')
-        progress_data = data.get('progress_data', {})
-        
-        if not room_id:
-            return jsonify({'status': 'error', 'message': 'Room ID is required'}), 400
-            
-        result = db_manager.save_user_room_progress(current_user.id, room_id, progress_data)
-        
-        if not result['success']:
-            return jsonify({'status': 'error', 'message': result.get('error', 'Failed to save progress')}), 500
-            
-        # Return updated completion percentage
-        return jsonify({
-            'status': 'success', 
-            'completion_percentage': result.get('completion_percentage', 0)
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    payload, status = gameplay.track_progress(db_manager, current_user.id, request.get_json(silent=True))
+    return jsonify(payload), status
 
-@app.route('/api/user/track-event', methods=['POST'])
+@bp.route('/api/user/track-event', methods=['POST'])
+@rate_limit('track_event')
 @login_required
+@workload('gameplay')
 def track_user_event():
     """Track a game event for progress tracking"""
-    try:
-        data = request.get_json()
-        room_id = data.get('room_id')
-        event_type = data.get('event_type')
-        event_data = data.get('event_data', {})
-        
-        if not all([room_id, event_type]):
-            return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
-            
-        result = db_manager.track_game_event(current_user.id, room_id, event_type, event_data)
-        
-        if not result['success']:
-            return jsonify({'status': 'error', 'message': result.get('error', 'Failed to track event')}), 500
-            
-        return jsonify({
-            'status': 'success',
-            'room_data': result.get('room_data', {})
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    payload, status = gameplay.track_event(db_manager, current_user.id, request.get_json(silent=True))
+    return jsonify(payload), status
+
+@bp.route('/api/user/heartbeat', methods=['POST'])
+@rate_limit('heartbeat')
+@login_required
+@workload('gameplay')
+def session_heartbeat():
+    """Keep the current play session open"""
+    payload, status = gameplay.heartbeat(
+        db_manager, current_user.id, request.get_json(silent=True),
+        ip_address=request.remote_addr,
+        user_agent=request.headers.get('User-Agent'),
+        idle_timeout=current_app.config.get('SESSION_IDLE_TIMEOUT', 1800)
+    )
+    return jsonify(payload), status
 
-@app.route('/api/user/all-room-progress')
+@bp.route('/api/user/all-room-progress')
 @login_required
+@workload('gameplay')
 def get_all_room_progress():
     """Get progress for all rooms for dashboard display"""
-    try:
-        rooms = []
-        for room_id in range(1, 6):  # 5 game rooms
-            room_progress = db_manager.get_detailed_progress(current_user.id, room_id)
-            if room_progress['success'] and room_progress['progress']:
-                rooms.append(room_progress['progress'])
-            else:
-                # Add placeholder for rooms not started yet
-                rooms.append({
-                    'room_number': room_id,
-                    'room_name': get_room_name(room_id),
-                    'completion_status': 'not_started',
-                    'completion_percentage': 0,
-                    'time_spent': 0,
-                    'best_score': 0,
-                    'attempts': 0
-                })
-                
-        return jsonify({'status': 'success', 'rooms': rooms})
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
-
-def get_room_name(room_id):
-    """Get standard room name by ID"""
-    room_names = {
-        1: 'Flowchart Lab',
-        2: 'Network Nexus',
-        3: 'AI Systems',
-        4: 'Database Crisis',
-        5: 'Programming Crisis'
-    }
-    return room_names.get(room_id, f'Room {room_id}')
+    payload, status = gameplay.all_room_progress(db_manager, current_user.id)
+    return jsonify(payload), status
 
 # Add utility function to database manager class
 def get_all_room_progress(self, user_id):
@@ -1432,10 +1941,53 @@ def get_all_room_progress(self, user_id):
 # Add the method to the DatabaseManager class
 DatabaseManager.get_all_room_progress = get_all_room_progress
 
+def create_app(config_name=None, init_database=True, start_scheduler=None):
+    """Create and configure the Flask application
+    
+    init_database runs migrations and seeds the default admin. start_scheduler
+    defaults to BACKUP_SCHEDULE_ENABLED; multi-process launchers enable it in
+    one worker only.
+    """
+    config_name = config_name or os.environ.get('FLASK_CONFIG', 'default')
+    app = Flask(__name__)
+    app.config.from_object(config[config_name])
+    
+    login_manager.init_app(app)
+    init_services(app)
+    
+    # Every worker signs with the same persisted keys unless SECRET_KEY is pinned
+    key_ring = None
+    if not app.config.get('SECRET_KEY'):
+        key_ring = SecretKeyRing(
+            app.config['SECRET_KEY_FILE'],
+            max_keys=app.config.get('SECRET_KEY_MAX_ACTIVE', 3),
+            check_interval=app.config.get('SECRET_KEY_CHECK_INTERVAL', 30)
+        )
+        key_ring.load()
+        key_ring.apply(app)
+    app.extensions['ascended']['secret_keys'] = key_ring
+    app.register_blueprint(bp)
+    user_loaded_from_cookie.connect(restore_archived_user_from_cookie, app)
+    
+    if init_database:
+        with app.app_context():
+            init_app_database()
+    
+    if start_scheduler is None:
+        # Start once, in the reloader child when debugging
+        start_scheduler = app.config.get('BACKUP_SCHEDULE_ENABLED') and (
+            not app.config.get('DEBUG') or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+        )
+    if start_scheduler:
+        app.extensions['ascended']['backup_scheduler'].start()
+    
+    return app
+
 if __name__ == '__main__':
+    config_name = os.environ.get('FLASK_CONFIG', 'default')
     config_obj = config[config_name]
-    app.run(
+    create_app(config_name).run(
         debug=config_obj.DEBUG,
         host=config_obj.HOST,
         port=config_obj.PORT
-    )
\ No newline at end of file
+    )
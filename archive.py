@@ -0,0 +1,285 @@
+"""Cold-data archival of inactive users to dated archive databases
+
+Users with no game_state or user_room_progress writes, play sessions or
+logins for a while are moved into archive_YYYY_MM.db files with ATTACH +
+INSERT ... SELECT, and moved back the next time they log in.
+"""
+import os
+import sqlite3
+from datetime import datetime
+
+ARCHIVED_TABLES = ('game_state', 'user_room_progress')
+
+
+def ensure_archive_tables(conn):
+    """Create the table that records which archive holds each user, returns True if created"""
+    exists = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='archived_users'"
+    ).fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_users (
+            user_id INTEGER PRIMARY KEY,
+            archive_file TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return not exists
+
+
+class ArchiveManager:
+    """Moves inactive users' rows between the hot database and archive files"""
+
+    def __init__(self, database_path, archive_dir, inactive_days=90, batch_size=200, busy_timeout=5.0):
+        self.database_path = database_path
+        self.archive_dir = os.path.abspath(archive_dir)
+        self.inactive_days = inactive_days
+        self.batch_size = batch_size
+        self.busy_timeout = busy_timeout
+
+    def archive_inactive(self, inactive_days=None):
+        """Archive every user inactive for inactive_days, returns counts of moved rows"""
+        days = int(inactive_days if inactive_days is not None else self.inactive_days)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archive_file = f"archive_{datetime.now().strftime('%Y_%m')}.db"
+
+        conn = self._connect()
+        try:
+            self._attach(conn, archive_file)
+            cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{days} days',)).fetchone()[0]
+            result = {'users': 0, 'archive_file': archive_file}
+            result.update({table: 0 for table in ARCHIVED_TABLES})
+
+            while True:
+                user_ids = [row[0] for row in conn.execute('''
+                    SELECT u.id FROM users u
+                    WHERE u.is_admin = 0
+                      AND u.id NOT IN (SELECT user_id FROM archived_users)
+                      AND (EXISTS (SELECT 1 FROM game_state WHERE user_id = u.id)
+                           OR EXISTS (SELECT 1 FROM user_room_progress WHERE user_id = u.id))
+                      AND NOT EXISTS (SELECT 1 FROM game_state WHERE user_id = u.id AND updated_at >= ?)
+                      AND NOT EXISTS (SELECT 1 FROM user_room_progress WHERE user_id = u.id AND updated_at >= ?)
+                      AND NOT EXISTS (
+                          SELECT 1 FROM user_sessions WHERE user_id = u.id
+                            AND datetime(session_start, '+' || total_time || ' seconds') >= ?
+                      )
+                      AND NOT EXISTS (
+                          SELECT 1 FROM activity_daily_users WHERE user_key = CAST(u.id AS TEXT) AND day >= DATE(?)
+                      )
+                    LIMIT ?
+                ''', (cutoff, cutoff, cutoff, cutoff, self.batch_size))]
+                if not user_ids:
+                    return result
+
+                placeholders = ','.join('?' * len(user_ids))
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    for table in ARCHIVED_TABLES:
+                        columns = self._columns(conn, table)
+                        moved = conn.execute(
+                            f'INSERT INTO archive.{table} ({columns}) '
+                            f'SELECT {columns} FROM main.{table} WHERE user_id IN ({placeholders})',
+                            user_ids
+                        ).rowcount
+                        conn.execute(f'DELETE FROM main.{table} WHERE user_id IN ({placeholders})', user_ids)
+                        result[table] += moved
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO archived_users (user_id, archive_file) VALUES (?, ?)',
+                        [(user_id, archive_file) for user_id in user_ids]
+                    )
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+                result['users'] += len(user_ids)
+        finally:
+            conn.close()
+
+    def restore_user(self, user_id):
+        """Move an archived user's rows back into the hot database
+
+        Rows the user wrote while archived are merged with their archived
+        copies rather than replacing them. game_state rows whose session now
+        belongs to another user stay in the archive and are counted as kept.
+        Returns None if the user is not archived, otherwise row counts.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT archive_file FROM archived_users WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            if not row:
+                return None
+            self._attach(conn, row[0])
+
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._snapshot_rollups(conn, user_id)
+                result = self._restore_game_state(conn, user_id)
+                merged, restored = self._restore_room_progress(conn, user_id)
+                result['merged'] += merged
+                result['restored'] += restored
+                self._reset_rollups(conn)
+                if not result['kept']:
+                    conn.execute('DELETE FROM archived_users WHERE user_id = ?', (user_id,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return result
+        finally:
+            conn.close()
+
+    def delete_archived(self, archived):
+        """Remove archived rows for deleted users, given (user_id, archive_file) pairs"""
+        by_file = {}
+        for user_id, archive_file in archived:
+            by_file.setdefault(archive_file, []).append(user_id)
+
+        conn = self._connect()
+        try:
+            for archive_file, user_ids in by_file.items():
+                if not os.path.exists(os.path.join(self.archive_dir, archive_file)):
+                    continue
+                self._attach(conn, archive_file)
+                placeholders = ','.join('?' * len(user_ids))
+                conn.execute('BEGIN IMMEDIATE')
+                for table in ARCHIVED_TABLES:
+                    conn.execute(f'DELETE FROM archive.{table} WHERE user_id IN ({placeholders})', user_ids)
+                conn.execute('COMMIT')
+                conn.execute('DETACH DATABASE archive')
+        finally:
+            conn.close()
+
+    def _restore_game_state(self, conn, user_id):
+        # game_state holds the latest state per session, so the newer copy of a session wins
+        kept, merged = conn.execute('''
+            SELECT COALESCE(SUM(m.user_id IS NOT a.user_id), 0), COALESCE(SUM(m.user_id = a.user_id), 0)
+            FROM archive.game_state a JOIN main.game_state m ON m.session_id = a.session_id
+            WHERE a.user_id = ?
+        ''', (user_id,)).fetchone()
+        total = conn.execute('SELECT COUNT(*) FROM archive.game_state WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+        # Rows get new ids, nothing refers to them and an archived id may have been reused
+        columns = [column for column in self._columns(conn, 'game_state').split(', ') if column != 'id']
+        updates = ', '.join(
+            f'{column} = excluded.{column}' for column in columns if column not in ('session_id', 'user_id', 'created_at')
+        )
+        conn.execute(f'''
+            INSERT INTO main.game_state ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM archive.game_state WHERE user_id = ?
+            ON CONFLICT (session_id) DO UPDATE SET {updates}
+            WHERE excluded.updated_at > game_state.updated_at AND excluded.user_id = game_state.user_id
+        ''', (user_id,))
+        conn.execute('''
+            DELETE FROM archive.game_state WHERE user_id = ? AND NOT EXISTS (
+                SELECT 1 FROM main.game_state m
+                WHERE m.session_id = archive.game_state.session_id AND m.user_id IS NOT archive.game_state.user_id
+            )
+        ''', (user_id,))
+        return {'restored': total - merged - kept, 'merged': merged, 'kept': kept}
+
+    def _restore_room_progress(self, conn, user_id):
+        # Progress made while archived started from scratch, so it adds to the archived progress
+        merged = conn.execute('''
+            SELECT COUNT(*) FROM archive.user_room_progress a JOIN main.user_room_progress m
+              ON m.user_id = a.user_id AND m.room_number = a.room_number
+            WHERE a.user_id = ?
+        ''', (user_id,)).fetchone()[0]
+        total = conn.execute(
+            'SELECT COUNT(*) FROM archive.user_room_progress WHERE user_id = ?', (user_id,)
+        ).fetchone()[0]
+
+        # Rows get new ids, as for game_state
+        columns = ', '.join(column for column in self._columns(conn, 'user_room_progress').split(', ') if column != 'id')
+        conn.execute(f'''
+            INSERT INTO main.user_room_progress ({columns})
+            SELECT {columns} FROM archive.user_room_progress WHERE user_id = ?
+            ON CONFLICT (user_id, room_number) DO UPDATE SET
+                completion_status = CASE
+                    WHEN 'completed' IN (excluded.completion_status, user_room_progress.completion_status) THEN 'completed'
+                    ELSE user_room_progress.completion_status END,
+                completion_percentage = MAX(COALESCE(excluded.completion_percentage, 0),
+                                            COALESCE(user_room_progress.completion_percentage, 0)),
+                time_spent = COALESCE(excluded.time_spent, 0) + COALESCE(user_room_progress.time_spent, 0),
+                best_score = MAX(COALESCE(excluded.best_score, 0), COALESCE(user_room_progress.best_score, 0)),
+                attempts = COALESCE(excluded.attempts, 0) + COALESCE(user_room_progress.attempts, 0),
+                completed_at = CASE
+                    WHEN excluded.completed_at IS NULL THEN user_room_progress.completed_at
+                    WHEN user_room_progress.completed_at IS NULL THEN excluded.completed_at
+                    ELSE MIN(excluded.completed_at, user_room_progress.completed_at) END,
+                created_at = COALESCE(MIN(excluded.created_at, user_room_progress.created_at), user_room_progress.created_at)
+        ''', (user_id,))
+        conn.execute('DELETE FROM archive.user_room_progress WHERE user_id = ?', (user_id,))
+        return merged, total - merged
+
+    def _snapshot_rollups(self, conn, user_id):
+        # The write triggers count restored and merged rows as new activity. Save the
+        # daily rollup rows they can touch so _reset_rollups can put them back unchanged.
+        conn.execute('''
+            CREATE TEMP TABLE restore_session_keys AS
+            SELECT DISTINCT DATE(updated_at) AS day, session_id FROM archive.game_state
+            WHERE user_id = ? AND updated_at IS NOT NULL AND session_id IS NOT NULL
+        ''', (user_id,))
+        conn.execute('''
+            CREATE TEMP TABLE restore_room_keys AS
+            SELECT DATE(completed_at) AS day, room_number FROM archive.user_room_progress
+            WHERE user_id = ? AND completed_at IS NOT NULL
+            UNION
+            SELECT DATE(completed_at), room_number FROM main.user_room_progress
+            WHERE user_id = ? AND completed_at IS NOT NULL
+        ''', (user_id, user_id))
+        conn.execute('''
+            CREATE TEMP TABLE restore_daily_sessions AS
+            SELECT r.* FROM main.rollup_daily_sessions r JOIN restore_session_keys k USING (day, session_id)
+        ''')
+        conn.execute('''
+            CREATE TEMP TABLE restore_daily_activity AS
+            SELECT * FROM main.rollup_daily_activity WHERE day IN (SELECT day FROM restore_session_keys)
+        ''')
+        conn.execute('''
+            CREATE TEMP TABLE restore_room_completions AS
+            SELECT r.* FROM main.rollup_daily_room_completions r JOIN restore_room_keys k USING (day, room_number)
+        ''')
+
+    def _reset_rollups(self, conn):
+        # Sessions first, their insert trigger moves rollup_daily_activity which is reset after
+        conn.execute('''
+            DELETE FROM main.rollup_daily_sessions WHERE EXISTS (
+                SELECT 1 FROM restore_session_keys k
+                WHERE k.day = rollup_daily_sessions.day AND k.session_id = rollup_daily_sessions.session_id
+            )
+        ''')
+        conn.execute('INSERT INTO main.rollup_daily_sessions SELECT * FROM restore_daily_sessions')
+        conn.execute('DELETE FROM main.rollup_daily_activity WHERE day IN (SELECT day FROM restore_session_keys)')
+        conn.execute('INSERT INTO main.rollup_daily_activity SELECT * FROM restore_daily_activity')
+        conn.execute('''
+            DELETE FROM main.rollup_daily_room_completions WHERE EXISTS (
+                SELECT 1 FROM restore_room_keys k
+                WHERE k.day = rollup_daily_room_completions.day AND k.room_number = rollup_daily_room_completions.room_number
+            )
+        ''')
+        conn.execute('INSERT INTO main.rollup_daily_room_completions SELECT * FROM restore_room_completions')
+        for table in ('restore_session_keys', 'restore_room_keys', 'restore_daily_sessions',
+                      'restore_daily_activity', 'restore_room_completions'):
+            conn.execute(f'DROP TABLE temp.{table}')
+
+    def _connect(self):
+        return sqlite3.connect(self.database_path, timeout=self.busy_timeout, isolation_level=None)
+
+    def _attach(self, conn, archive_file):
+        conn.execute('ATTACH DATABASE ? AS archive', (os.path.join(self.archive_dir, archive_file),))
+        for table in ARCHIVED_TABLES:
+            self._sync_archive_table(conn, table)
+
+    def _sync_archive_table(self, conn, table):
+        # Archive tables mirror the hot columns without constraints, adding any new ones
+        conn.execute(f'CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS archive.idx_{table}_user_id ON {table} (user_id)')
+        archived = {row[1] for row in conn.execute(f'PRAGMA archive.table_info({table})')}
+        for row in conn.execute(f'PRAGMA main.table_info({table})').fetchall():
+            if row[1] not in archived:
+                conn.execute(f'ALTER TABLE archive.{table} ADD COLUMN {row[1]} {row[2]}')
+
+    @staticmethod
+    def _columns(conn, table):
+        return ', '.join(row[1] for row in conn.execute(f'PRAGMA main.table_info({table})'))
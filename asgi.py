@@ -0,0 +1,384 @@
+"""Async server for the gameplay API
+
+    python asgi.py --port 5000
+    uvicorn --factory asgi:create_asgi_app
+
+Progress reads, track-event, track-progress and heartbeats are served on the
+event loop, so thousands of mostly idle polling clients cost a socket each
+rather than a request thread. Their database work runs through AsyncDatabase
+on a dedicated thread, using the same gameplay functions as the Flask views.
+
+The admin dashboard event stream is served natively as well, so open
+dashboards do not hold threads either. Every other path is handed to the
+Flask app on a small thread pool. Those responses are buffered, so admin
+downloads are better served by server.py.
+"""
+import argparse
+import asyncio
+import io
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie, CookieError
+
+from flask_login.utils import decode_cookie
+from itsdangerous import BadSignature
+
+import gameplay
+from async_db import AsyncDatabase, DatabaseBusyError
+from config import config
+from dashboard_events import AsyncSubscription, EventStreamBusyError
+
+
+class GameplayRoute:
+    def __init__(self, method, pattern, handler, rate_limit=None):
+        self.method = method
+        self.pattern = re.compile(pattern)
+        self.handler = handler
+        self.rate_limit = rate_limit
+
+
+class GameplayApp:
+    """ASGI application serving the gameplay API natively and the rest through Flask"""
+
+    def __init__(self, flask_app, db_threads=1, db_max_queue=2000, wsgi_threads=8, max_body_bytes=64 * 1024):
+        self.flask_app = flask_app
+        services = flask_app.extensions['ascended']
+        self.db = AsyncDatabase(services['db_manager'], threads=db_threads, max_queue=db_max_queue)
+        self.rate_limiter = services['rate_limiter']
+        self.key_ring = services.get('secret_keys')
+        self.max_body_bytes = max_body_bytes
+        self.wsgi_pool = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix='wsgi')
+        services['async_db'] = self.db
+        self.events = services['dashboard_events']
+        self.events.max_subscribers = flask_app.config.get('ASYNC_EVENT_STREAM_MAX_CLIENTS', 1000)
+        self.routes = [
+            GameplayRoute('GET', r'/api/user/progress', self.user_progress),
+            GameplayRoute('GET', r'/api/user/room-progress/(\d+)', self.room_progress),
+            GameplayRoute('GET', r'/api/user/all-room-progress', self.all_room_progress),
+            GameplayRoute('POST', r'/api/user/track-progress', self.track_progress, 'track_progress'),
+            GameplayRoute('POST', r'/api/user/track-event', self.track_event, 'track_event'),
+            GameplayRoute('POST', r'/api/user/heartbeat', self.heartbeat, 'heartbeat')
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        if scope['path'] == '/api/admin/events' and scope['method'] == 'GET':
+            await self._events(scope, receive, send)
+            return
+        for route in self.routes:
+            match = route.pattern.fullmatch(scope['path'])
+            if match and scope['method'] == route.method:
+                await self._gameplay(route, match, scope, receive, send)
+                return
+        await self._wsgi(scope, receive, send)
+
+    # Gameplay handlers, each returning (payload, status)
+
+    async def user_progress(self, user_id, match, request):
+        return await self.db.call(gameplay.user_progress, user_id)
+
+    async def room_progress(self, user_id, match, request):
+        return await self.db.call(gameplay.room_progress, user_id, int(match.group(1)))
+
+    async def all_room_progress(self, user_id, match, request):
+        return await self.db.call(gameplay.all_room_progress, user_id)
+
+    async def track_progress(self, user_id, match, request):
+        return await self.db.call(gameplay.track_progress, user_id, request['json'])
+
+    async def track_event(self, user_id, match, request):
+        return await self.db.call(gameplay.track_event, user_id, request['json'])
+
+    async def heartbeat(self, user_id, match, request):
+        return await self.db.call(
+            gameplay.heartbeat, user_id, request['json'],
+            ip_address=request['remote_addr'],
+            user_agent=request['headers'].get('user-agent'),
+            idle_timeout=self.flask_app.config.get('SESSION_IDLE_TIMEOUT', 1800)
+        )
+
+    async def _gameplay(self, route, match, scope, receive, send):
+        headers = _headers(scope)
+        remote_addr = (scope.get('client') or (None,))[0]
+        user_id = self._session_user_id(headers)
+
+        # Same buckets and order as the Flask rate_limit decorator, checked before any other work
+        limits = self.flask_app.config.get('RATE_LIMITS', {}).get(route.rate_limit)
+        if limits and self.flask_app.config.get('RATE_LIMIT_ENABLED', True):
+            allowed, retry_after = self.rate_limiter.check(
+                route.rate_limit, limits, [('user', user_id), ('ip', remote_addr)]
+            )
+            if not allowed:
+                await self._json(send, {'status': 'error', 'message': 'Too many requests'}, 429,
+                                 [(b'retry-after', str(retry_after).encode())])
+                return
+
+        try:
+            user = await self._session_user(user_id)
+        except DatabaseBusyError as e:
+            await self._json(send, {'status': 'error', 'message': str(e)}, 503, [(b'retry-after', b'1')])
+            return
+        if user is None:
+            await self._json(send, {'status': 'error', 'message': 'Authentication required'}, 401)
+            return
+
+        body = await _read_body(receive, self.max_body_bytes)
+        if body is None:
+            await self._json(send, {'status': 'error', 'message': 'Request body too large'}, 413)
+            return
+        try:
+            data = self.flask_app.json.loads(body) if body else None
+        except ValueError:
+            data = None
+
+        request = {'headers': headers, 'remote_addr': remote_addr, 'json': data}
+        try:
+            payload, status = await route.handler(user_id, match, request)
+        except DatabaseBusyError as e:
+            await self._json(send, {'status': 'error', 'message': str(e)}, 503, [(b'retry-after', b'1')])
+            return
+        if route.method == 'POST' and status < 400:
+            self.events.notify()
+        await self._json(send, payload, status)
+
+    async def _events(self, scope, receive, send):
+        """Serve the admin dashboard event stream on the event loop"""
+        user = await self._session_user(self._session_user_id(_headers(scope)))
+        if user is None:
+            await self._json(send, {'status': 'error', 'message': 'Authentication required'}, 401)
+            return
+        if not user.is_admin:
+            await self._json(send, {'status': 'error', 'message': 'Admin access required'}, 403)
+            return
+
+        subscription = AsyncSubscription(
+            asyncio.get_running_loop(), max_queue=self.flask_app.config.get('EVENT_STREAM_QUEUE', 100)
+        )
+        try:
+            # Subscribing may query the snapshot, keep that off the event loop
+            await self.db.call(lambda db_manager: self.events.subscribe(subscription))
+        except EventStreamBusyError as e:
+            await self._json(send, {'status': 'error', 'message': str(e)}, 503, [(b'retry-after', b'10')])
+            return
+
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            subscription.close()
+
+        disconnect = asyncio.create_task(wait_for_disconnect())
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')
+                ]
+            })
+            await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+            keepalive = self.flask_app.config.get('EVENT_STREAM_KEEPALIVE', 15)
+            async for message in subscription.messages(keepalive):
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        except OSError:
+            pass  # Client went away mid-write
+        finally:
+            disconnect.cancel()
+            self.events.unsubscribe(subscription)
+
+    def _session_user_id(self, headers):
+        """Get the logged-in user id from the Flask session or remember cookie"""
+        app = self.flask_app
+        if self.key_ring is not None:
+            self.key_ring.refresh(app)
+
+        cookies = SimpleCookie()
+        try:
+            cookies.load(headers.get('cookie', ''))
+        except CookieError:
+            return None
+
+        user_id = None
+        session_cookie = cookies.get(app.config['SESSION_COOKIE_NAME'])
+        serializer = app.session_interface.get_signing_serializer(app)
+        if session_cookie and serializer is not None:
+            try:
+                data = serializer.loads(
+                    session_cookie.value, max_age=int(app.permanent_session_lifetime.total_seconds())
+                )
+                user_id = data.get('_user_id')
+            except BadSignature:
+                pass
+
+        remember_cookie = cookies.get(app.config.get('REMEMBER_COOKIE_NAME', 'remember_token'))
+        if user_id is None and remember_cookie:
+            user_id = decode_cookie(remember_cookie.value, key=app.config['SECRET_KEY'])
+            if user_id is None and self.key_ring is not None:
+                user_id = self.key_ring.decode_remember_cookie(remember_cookie.value)
+
+        try:
+            return int(user_id) if user_id is not None else None
+        except ValueError:
+            return None
+
+    async def _session_user(self, user_id):
+        """Load the cookie's user like Flask-Login's user_loader, None once they have been deleted"""
+        if user_id is None:
+            return None
+        return await self.db.get_user_by_id(user_id)
+
+    async def _json(self, send, payload, status, extra_headers=()):
+        body = self.flask_app.json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                *extra_headers
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _wsgi(self, scope, receive, send):
+        """Run any other request through the Flask app on the WSGI thread pool"""
+        body = await _read_body(receive)
+        environ = _wsgi_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        status, headers, chunks = await loop.run_in_executor(self.wsgi_pool, self._call_wsgi, environ)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    def _call_wsgi(self, environ):
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+            ]
+            return chunks.append
+
+        result = self.flask_app(environ, start_response)
+        try:
+            for chunk in result:
+                chunks.append(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], chunks
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.events.close()
+                self.db.close()
+                self.wsgi_pool.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def _headers(scope):
+    headers = {}
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        headers[name] = f'{headers[name]}, {value}' if name in headers else value
+    return headers
+
+
+async def _read_body(receive, limit=None):
+    """Read the whole request body, returns None once it grows past limit"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body.extend(message.get('body', b''))
+        if limit is not None and len(body) > limit:
+            return None
+        if not message.get('more_body'):
+            break
+    return bytes(body)
+
+
+def _wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in _headers(scope).items():
+        key = name.upper().replace('-', '_')
+        if key == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif key != 'CONTENT_LENGTH':
+            environ[f'HTTP_{key}'] = value
+    return environ
+
+
+def create_asgi_app(config_name=None, init_database=True, start_scheduler=None):
+    """Create the Flask app and wrap it for async serving"""
+    from app import create_app
+
+    flask_app = create_app(config_name, init_database=init_database, start_scheduler=start_scheduler)
+    return GameplayApp(
+        flask_app,
+        db_threads=flask_app.config.get('ASYNC_DB_THREADS', 1),
+        db_max_queue=flask_app.config.get('ASYNC_DB_MAX_QUEUE', 2000),
+        wsgi_threads=flask_app.config.get('ASYNC_WSGI_THREADS', 8),
+        max_body_bytes=flask_app.config.get('ASYNC_MAX_BODY_BYTES', 64 * 1024)
+    )
+
+
+def main(argv=None):
+    config_name = os.environ.get('FLASK_CONFIG', 'production')
+    config_obj = config[config_name]
+
+    parser = argparse.ArgumentParser(description='Run Ascended with the async gameplay API')
+    parser.add_argument('--host', default=getattr(config_obj, 'HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=getattr(config_obj, 'PORT', 5000))
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        print('✗ Async mode needs an ASGI server: pip install uvicorn')
+        return 1
+
+    print(f"Serving on http://{args.host}:{args.port} with the async gameplay API")
+    uvicorn.run(create_asgi_app(config_name), host=args.host, port=args.port, backlog=2048)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DatabaseBusyError(Exception):
+    """Raised when too many database calls are already waiting"""
+
+
+class AsyncDatabase:
+    """Awaitable facade over DatabaseManager for asyncio code
+
+    Blocking calls run on a dedicated database thread, so the event loop never
+    waits on SQLite. Either call a DatabaseManager method by name:
+
+        progress = await async_db.get_detailed_progress(user_id, room_id)
+
+    or run a function that takes the DatabaseManager as its first argument,
+    which is how the shared gameplay functions are called:
+
+        payload, status = await async_db.call(gameplay.track_event, user_id, data)
+    """
+
+    def __init__(self, db_manager, threads=1, max_queue=2000):
+        self.db_manager = db_manager
+        self.threads = threads
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='async-db')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {'completed': 0, 'rejected': 0, 'wait_seconds': 0.0, 'max_queue_seen': 0}
+
+    def __getattr__(self, name):
+        method = getattr(self.db_manager, name)
+        if not callable(method):
+            return method
+
+        async def call_method(*args, **kwargs):
+            return await self._run(functools.partial(method, *args, **kwargs))
+        return call_method
+
+    async def call(self, fn, *args, **kwargs):
+        """Run fn(db_manager, *args, **kwargs) on the database thread"""
+        return await self._run(functools.partial(fn, self.db_manager, *args, **kwargs))
+
+    def stats(self):
+        """Get queue depth and throughput counters"""
+        with self._lock:
+            completed = self._stats['completed']
+            return {
+                'threads': self.threads,
+                'queue_depth': self._pending,
+                'max_queue': self.max_queue,
+                'max_queue_seen': self._stats['max_queue_seen'],
+                'completed': completed,
+                'rejected': self._stats['rejected'],
+                'avg_wait_ms': round(1000 * self._stats['wait_seconds'] / completed, 2) if completed else 0
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, fn):
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise DatabaseBusyError('Too many requests in progress, please retry shortly')
+            self._pending += 1
+            self._stats['max_queue_seen'] = max(self._stats['max_queue_seen'], self._pending)
+
+        loop = asyncio.get_running_loop()
+        submitted = loop.time()
+
+        def timed():
+            with self._lock:
+                self._stats['wait_seconds'] += loop.time() - submitted
+            return fn()
+
+        try:
+            return await loop.run_in_executor(self._executor, timed)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._stats['completed'] += 1
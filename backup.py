@@ -0,0 +1,433 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+BACKUP_NAME_PATTERN = re.compile(r'^backup_ascended_(\d{8}_\d{6})(?:_[0-9a-f]{8})?\.db(?:\.gz|\.zst)?$')
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+
+class BackupJob:
+    """State of one background backup, polled through the admin API
+
+    Every change is also written to a status file in the backup directory,
+    so any worker can answer status polls and downloads for it.
+    """
+
+    def __init__(self, compression=None):
+        self.id = str(uuid.uuid4())
+        self.pid = os.getpid()
+        self.host = socket.gethostname()
+        self.compression = compression
+        self.status = 'pending'
+        self.pages_total = 0
+        self.pages_done = 0
+        self.path = None
+        self.size = None
+        self.verified = False
+        self.error = None
+        self.started_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'compression': self.compression,
+            'progress': round(100 * self.pages_done / self.pages_total, 1) if self.pages_total else 0,
+            'pages_done': self.pages_done,
+            'pages_total': self.pages_total,
+            'filename': os.path.basename(self.path) if self.path else None,
+            'size': self.size,
+            'verified': self.verified,
+            'error': self.error,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+    @classmethod
+    def from_status(cls, status, backup_dir):
+        """Rebuild a job from its status file contents"""
+        job = cls(status['compression'])
+        for field in ('id', 'status', 'pages_done', 'pages_total', 'size', 'verified', 'error',
+                      'started_at', 'finished_at', 'pid', 'host'):
+            setattr(job, field, status.get(field))
+        job.path = os.path.join(backup_dir, status['filename']) if status.get('filename') else None
+        if job.status in FINISHED_STATUSES:
+            job.done.set()
+        elif job.host == socket.gethostname() and not _process_alive(job.pid):
+            # The worker running it exited before finishing
+            job.status = 'failed'
+            job.error = 'Backup was interrupted'
+            job.done.set()
+        return job
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, TypeError):
+        pass
+    return True
+
+
+class BackupManager:
+    """Consistent online backups using the SQLite backup API"""
+
+    COMPRESSION_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, database_path, backup_dir, busy_sleep=0.005, max_jobs=20):
+        self.database_path = database_path
+        self.backup_dir = os.path.abspath(backup_dir)
+        self.busy_sleep = busy_sleep
+        self.max_jobs = max_jobs
+        self.jobs_dir = os.path.join(self.backup_dir, 'jobs')
+
+    def start_backup(self, compression=None):
+        """Start a backup in a background thread and return its job"""
+        if compression not in self.COMPRESSION_EXTENSIONS:
+            raise ValueError(f'Unsupported compression: {compression}')
+        if compression == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                raise ValueError('zstd compression requires the zstandard package')
+
+        job = BackupJob(compression)
+        self._save_job(job)
+        self._prune_jobs()
+
+        threading.Thread(target=self._run, args=(job,), name=f'backup-{job.id[:8]}', daemon=True).start()
+        return job
+
+    def get_job(self, job_id):
+        """Get a backup job by id, whichever worker started it"""
+        if not JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        try:
+            with open(os.path.join(self.jobs_dir, f'{job_id}.json'), 'r', encoding='utf-8') as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return BackupJob.from_status(status, self.backup_dir)
+
+    def save_status(self, name, status):
+        """Store a small JSON status document next to the backups for every worker to read"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        path = os.path.join(self.jobs_dir, f'{name}.json')
+        fd, temp_path = tempfile.mkstemp(dir=self.jobs_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(status, f, default=str)
+            os.replace(temp_path, path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    def load_status(self, name):
+        """Read a status document written by save_status, or None"""
+        try:
+            with open(os.path.join(self.jobs_dir, f'{name}.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_job(self, job):
+        self.save_status(job.id, dict(job.to_dict(), pid=job.pid, host=job.host))
+
+    def _prune_jobs(self):
+        # Forget the oldest finished jobs so the status directory stays small
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            job_id, extension = os.path.splitext(name)
+            if extension != '.json' or not JOB_ID_PATTERN.match(job_id):
+                continue
+            path = os.path.join(self.jobs_dir, name)
+            try:
+                jobs.append((os.path.getmtime(path), job_id, path))
+            except OSError:
+                continue
+        jobs.sort()
+        for _, job_id, path in jobs[:max(0, len(jobs) - self.max_jobs)]:
+            job = self.get_job(job_id)
+            if job and job.done.is_set():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def backup_to(self, target_path, progress=None):
+        """Copy the live database into target_path in a single step
+
+        The database uses the rollback journal, where a write by any other
+        connection restarts a backup copied in several steps, so a busy server
+        would never finish one. One step holds the read lock for the whole copy
+        instead: writers wait for it (within their busy timeout) rather than
+        starting it over.
+        """
+        source = sqlite3.connect(self.database_path)
+        target = sqlite3.connect(target_path)
+        try:
+            # Retried after busy_sleep while a writer holds the lock
+            source.backup(target, pages=-1, progress=progress, sleep=self.busy_sleep)
+        finally:
+            target.close()
+            source.close()
+
+    def run_backup(self, compression=None):
+        """Take a backup and wait for it to finish"""
+        job = self.start_backup(compression)
+        job.done.wait()
+        return job
+
+    @staticmethod
+    def quick_check(path):
+        """Run PRAGMA quick_check on an uncompressed database file"""
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            rows = conn.execute('PRAGMA quick_check').fetchall()
+            return 'ok' if rows == [('ok',)] else '; '.join(row[0] for row in rows)
+        finally:
+            conn.close()
+
+    def list_backups(self):
+        """List finished backups, newest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        backups = []
+        for name in os.listdir(self.backup_dir):
+            match = BACKUP_NAME_PATTERN.match(name)
+            if not match:
+                continue
+            path = os.path.join(self.backup_dir, name)
+            backups.append({
+                'filename': name,
+                'path': path,
+                'size': os.path.getsize(path),
+                'created_at': datetime.strptime(match.group(1), '%Y%m%d_%H%M%S')
+            })
+        return sorted(backups, key=lambda backup: backup['created_at'], reverse=True)
+
+    def apply_retention(self, keep_daily=7, keep_weekly=4, keep_monthly=6, max_total_bytes=None):
+        """Prune backups with grandfather-father-son retention and a total size cap"""
+        backups = self.list_backups()
+        keep = set()
+        if backups:
+            keep.add(backups[0]['filename'])  # Always keep the newest backup
+
+        # Newest backup of each of the last N days, weeks and months
+        for keep_count, period in (
+            (keep_daily, lambda d: d.date()),
+            (keep_weekly, lambda d: d.isocalendar()[:2]),
+            (keep_monthly, lambda d: (d.year, d.month))
+        ):
+            seen_periods = []
+            for backup in backups:
+                key = period(backup['created_at'])
+                if key in seen_periods:
+                    continue
+                if len(seen_periods) >= keep_count:
+                    break
+                seen_periods.append(key)
+                keep.add(backup['filename'])
+
+        if max_total_bytes is not None:
+            total = 0
+            for backup in backups:
+                if backup['filename'] not in keep:
+                    continue
+                total += backup['size']
+                if total > max_total_bytes and backup is not backups[0]:
+                    keep.discard(backup['filename'])
+
+        removed = []
+        for backup in backups:
+            if backup['filename'] not in keep:
+                os.remove(backup['path'])
+                removed.append(backup['filename'])
+        return removed
+
+    def restore(self, backup_path):
+        """Replace the live database contents with a verified backup"""
+        fd, raw_path = tempfile.mkstemp(suffix='.db', dir=self.backup_dir)
+        os.close(fd)
+        try:
+            self.decompress_to(backup_path, raw_path)
+            result = self.quick_check(raw_path)
+            if result != 'ok':
+                raise Exception(f'Backup failed integrity check: {result}')
+
+            # Keep the current state so a bad restore can be undone
+            safety_job = self.run_backup()
+            if safety_job.status != 'completed':
+                raise Exception(f'Could not back up current database before restore: {safety_job.error}')
+
+            source = sqlite3.connect(raw_path)
+            target = sqlite3.connect(self.database_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            return safety_job.path
+        finally:
+            os.remove(raw_path)
+
+    @staticmethod
+    def decompress_to(source_path, target_path):
+        """Write an uncompressed copy of a (possibly compressed) backup"""
+        if source_path.endswith('.gz'):
+            with gzip.open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+        elif source_path.endswith('.zst'):
+            import zstandard
+            with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+                zstandard.ZstdDecompressor().copy_stream(source, target)
+        else:
+            shutil.copyfile(source_path, target_path)
+
+    def _run(self, job):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        raw_path = os.path.join(self.backup_dir, f'.backup_ascended_{timestamp}_{job.id[:8]}.db.partial')
+
+        saved_at = [0]
+
+        def progress(status, remaining, total):
+            job.pages_total = total
+            job.pages_done = total - remaining
+            # Progress is polled about once a second, no need to write it more often
+            if time.monotonic() - saved_at[0] >= 0.5:
+                self._save_job(job)
+                saved_at[0] = time.monotonic()
+
+        try:
+            job.status = 'running'
+            self._save_job(job)
+            self.backup_to(raw_path, progress)
+
+            job.status = 'verifying'
+            self._save_job(job)
+            result = self.quick_check(raw_path)
+            if result != 'ok':
+                raise Exception(f'Backup failed integrity check: {result}')
+            job.verified = True
+
+            extension = self.COMPRESSION_EXTENSIONS[job.compression]
+            final_path = os.path.join(self.backup_dir, f'backup_ascended_{timestamp}.db{extension}')
+            if os.path.exists(final_path):
+                final_path = os.path.join(self.backup_dir, f'backup_ascended_{timestamp}_{job.id[:8]}.db{extension}')
+            if job.compression:
+                self._compress(raw_path, final_path, job.compression)
+                os.remove(raw_path)
+            else:
+                os.replace(raw_path, final_path)
+
+            job.path = final_path
+            job.size = os.path.getsize(final_path)
+            job.status = 'completed'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            try:
+                self._save_job(job)
+            except Exception as e:
+                print(f"✗ Could not save backup job status: {str(e)}")
+            job.done.set()
+
+    @staticmethod
+    def _compress(source_path, target_path, compression):
+        with open(source_path, 'rb') as source:
+            if compression == 'gzip':
+                with gzip.open(target_path, 'wb', compresslevel=6) as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+            else:
+                import zstandard
+                with open(target_path, 'wb') as target:
+                    zstandard.ZstdCompressor(level=3).copy_stream(source, target)
+
+
+class BackupScheduler:
+    """Background thread that takes, verifies and rotates backups in an off-peak window"""
+
+    def __init__(self, manager, interval_hours=24, window_start_hour=2, window_end_hour=5,
+                 compression='gzip', retention=None, check_interval=60):
+        self.manager = manager
+        self.interval = timedelta(hours=interval_hours)
+        self.window_start_hour = window_start_hour
+        self.window_end_hour = window_end_hour
+        self.compression = compression
+        self.retention = retention or {}
+        self.check_interval = check_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler thread if it is not already running"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='backup-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        self._stop.set()
+
+    def in_window(self, now=None):
+        """Check if now falls inside the off-peak window (which may wrap midnight)"""
+        hour = (now or datetime.now()).hour
+        if self.window_start_hour <= self.window_end_hour:
+            return self.window_start_hour <= hour < self.window_end_hour
+        return hour >= self.window_start_hour or hour < self.window_end_hour
+
+    def is_due(self, now=None):
+        """Check if a scheduled backup should run now"""
+        now = now or datetime.now()
+        if not self.in_window(now):
+            return False
+        backups = self.manager.list_backups()
+        return not backups or now - backups[0]['created_at'] >= self.interval
+
+    def run_once(self):
+        """Take a backup and prune old ones"""
+        job = self.manager.run_backup(self.compression)
+        removed = self.manager.apply_retention(**self.retention) if job.status == 'completed' else []
+        result = dict(job.to_dict(), removed=removed)
+        # Shared so workers without the scheduler thread can report it too
+        self.manager.save_status('last_scheduled', result)
+        print(f"{'✓' if job.status == 'completed' else '✗'} Scheduled backup {job.status}"
+              f"{': ' + job.error if job.error else ''}, pruned {len(removed)} old backups")
+        return result
+
+    @property
+    def last_result(self):
+        """Result of the most recent scheduled backup taken by any worker"""
+        return self.manager.load_status('last_scheduled')
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.is_due():
+                    self.run_once()
+            except Exception as e:
+                print(f"✗ Scheduled backup error: {str(e)}")
+            self._stop.wait(self.check_interval)
@@ -0,0 +1,530 @@
+"""Shared cache with pluggable backends
+
+    lru     in-process LRU, one copy per worker
+    shared  hash table in a memory-mapped file, shared by every worker on the host
+    redis   any server speaking the Redis protocol, shared across hosts
+
+Cache wraps a backend with namespaces and versioned keys. Every namespace has
+a version stored in the backend itself, and every value is stored tagged with
+the version it was written under, so a lookup reads both in one round trip.
+Invalidating a namespace writes a new random version: every worker on every
+host sees it on its next lookup, and entries from older versions simply stop
+matching. Version keys are pinned: backends never evict them to make room,
+as a replaced version would silently drop the whole namespace.
+
+Callers that cache data read from elsewhere should take the namespace
+version before reading and write under it, so a value read before an
+invalidation cannot be stored after it.
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import secrets
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+class CacheError(Exception):
+    """Raised when a cache backend cannot be reached or answers with an error"""
+
+
+class LRUBackend:
+    """In-process LRU store with an entry and byte budget, pinned keys sit outside the budget"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=10000):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._pinned = {}  # key -> value, never evicted
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_many(self, keys):
+        now = time.time()
+        values = []
+        with self._lock:
+            for key in keys:
+                if key in self._pinned:
+                    values.append(self._pinned[key])
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] and entry[1] < now:
+                    self._remove(key)
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                values.append(entry[0] if entry else None)
+        return values
+
+    def set(self, key, value, ttl=None, pinned=False):
+        if len(value) > self.max_bytes:
+            return False
+        with self._lock:
+            self._store(key, value, ttl, pinned)
+        return True
+
+    def add(self, key, value, ttl=None, pinned=False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if key in self._pinned or (entry is not None and not (entry[1] and entry[1] < time.time())):
+                return False
+            self._store(key, value, ttl, pinned)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._pinned.pop(key, None)
+            if key in self._entries:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'lru',
+                'entries': len(self._entries) + len(self._pinned),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
+
+    def _store(self, key, value, ttl, pinned=False):
+        if key in self._entries:
+            self._remove(key)
+        if pinned:
+            self._pinned[key] = value
+            return
+        self._pinned.pop(key, None)
+        self._entries[key] = (value, time.time() + ttl if ttl else 0)
+        self._total_bytes += len(value)
+        while self._entries and (self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._total_bytes -= len(value)
+
+
+class SharedMemoryBackend:
+    """Fixed-size hash table in a memory-mapped file shared by every process on the host
+
+    Each key hashes to a handful of candidate slots; a full set of candidates
+    evicts the unpinned one written longest ago, and when every candidate is
+    pinned the value is not cached. Values too big for a slot are not cached
+    either. Processes coordinate through flock on the file.
+    """
+
+    MAGIC = b'ASCCACH2'
+    HEADER = struct.Struct('<8sII')  # magic, slot count, slot size
+    SLOT = struct.Struct('<QddIIB')  # key hash, expires at, written at, key length, value length, pinned
+    PROBES = 8
+
+    def __init__(self, path, slots=8192, slot_bytes=2048):
+        self.path = os.path.abspath(path)
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.size = self.HEADER.size + slots * slot_bytes
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.too_large = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._open()
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, self.HEADER.size, 0)
+            if len(header) < self.HEADER.size or self.HEADER.unpack(header) != (self.MAGIC, self.slots, self.slot_bytes):
+                # New file or a different layout, start empty
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, self.HEADER.pack(self.MAGIC, self.slots, self.slot_bytes), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._map = mmap.mmap(fd, self.size)
+        self._pid = os.getpid()
+
+    def get_many(self, keys):
+        now = time.time()
+        with self._locked(fcntl.LOCK_SH):
+            values = []
+            for key in keys:
+                found = self._find(key.encode('utf-8'), now)
+                values.append(found[1] if found else None)
+            return values
+
+    def set(self, key, value, ttl=None, pinned=False):
+        key_bytes = key.encode('utf-8')
+        if self.SLOT.size + len(key_bytes) + len(value) > self.slot_bytes:
+            self.too_large += 1
+            return False
+        with self._locked(fcntl.LOCK_EX):
+            return self._write(key_bytes, value, ttl, pinned)
+
+    def add(self, key, value, ttl=None, pinned=False):
+        key_bytes = key.encode('utf-8')
+        if self.SLOT.size + len(key_bytes) + len(value) > self.slot_bytes:
+            self.too_large += 1
+            return False
+        with self._locked(fcntl.LOCK_EX):
+            if self._find(key_bytes, time.time()):
+                return False
+            return self._write(key_bytes, value, ttl, pinned)
+
+    def delete(self, key):
+        with self._locked(fcntl.LOCK_EX):
+            found = self._find(key.encode('utf-8'), None)
+            if found:
+                self.SLOT.pack_into(self._map, found[0], 0, 0, 0, 0, 0, 0)
+
+    def stats(self):
+        now = time.time()
+        with self._locked(fcntl.LOCK_SH):
+            entries = 0
+            for index in range(self.slots):
+                key_hash, expires_at, _, _, _, _ = self.SLOT.unpack_from(self._map, self._offset(index))
+                if key_hash and not (expires_at and expires_at < now):
+                    entries += 1
+        return {
+            'backend': 'shared',
+            'path': self.path,
+            'entries': entries,
+            'slots': self.slots,
+            'slot_bytes': self.slot_bytes,
+            'evictions': self.evictions,
+            'too_large': self.too_large
+        }
+
+    @contextmanager
+    def _locked(self, mode):
+        # flock is per open file, so threads of this process take turns first
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked after opening, a shared file description would not exclude the parent
+                self._open()
+            fcntl.flock(self._fd, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _hash(self, key_bytes):
+        return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), 'little') or 1
+
+    def _offset(self, index):
+        return self.HEADER.size + index * self.slot_bytes
+
+    def _candidates(self, key_hash):
+        start = key_hash % self.slots
+        return [self._offset((start + probe) % self.slots) for probe in range(self.PROBES)]
+
+    def _find(self, key_bytes, now):
+        key_hash = self._hash(key_bytes)
+        for offset in self._candidates(key_hash):
+            slot_hash, expires_at, _, key_length, value_length, _ = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash != key_hash:
+                continue
+            start = offset + self.SLOT.size
+            if self._map[start:start + key_length] != key_bytes:
+                continue
+            if now is not None and expires_at and expires_at < now:
+                return None
+            return offset, self._map[start + key_length:start + key_length + value_length]
+        return None
+
+    def _write(self, key_bytes, value, ttl, pinned=False):
+        key_hash = self._hash(key_bytes)
+        now = time.time()
+        target = None
+        oldest = None
+        for offset in self._candidates(key_hash):
+            slot_hash, expires_at, written_at, key_length, _, slot_pinned = self.SLOT.unpack_from(self._map, offset)
+            start = offset + self.SLOT.size
+            if slot_hash == key_hash and self._map[start:start + key_length] == key_bytes:
+                target = offset
+                break
+            if target is None and (not slot_hash or (expires_at and expires_at < now)):
+                target = offset
+            if not slot_pinned and (oldest is None or written_at < oldest[1]):
+                oldest = (offset, written_at)
+        if target is None:
+            if oldest is None:
+                # Every candidate holds a pinned key
+                return False
+            target = oldest[0]
+            self.evictions += 1
+
+        start = target + self.SLOT.size
+        self._map[start:start + len(key_bytes)] = key_bytes
+        self._map[start + len(key_bytes):start + len(key_bytes) + len(value)] = value
+        # Header last, so a reader never matches a half-written slot
+        self.SLOT.pack_into(
+            self._map, target, key_hash, now + ttl if ttl else 0, now, len(key_bytes), len(value), 1 if pinned else 0
+        )
+        return True
+
+
+class RedisBackend:
+    """Minimal client for servers speaking the Redis protocol (RESP)
+
+    Pinned keys are stored without an expiry, which the volatile-* eviction
+    policies never evict; configure the server with one of those.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', timeout=0.5, max_connections=8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        return self._command('MGET', *keys)
+
+    def set(self, key, value, ttl=None, pinned=False):
+        args = ['SET', key, value]
+        if ttl and not pinned:
+            args += ['PX', int(ttl * 1000)]
+        return self._command(*args) == b'OK'
+
+    def add(self, key, value, ttl=None, pinned=False):
+        args = ['SET', key, value, 'NX']
+        if ttl and not pinned:
+            args += ['PX', int(ttl * 1000)]
+        return self._command(*args) == b'OK'
+
+    def delete(self, key):
+        self._command('DEL', key)
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._pool)
+        return {'backend': 'redis', 'server': f'{self.host}:{self.port}/{self.db}', 'idle_connections': idle}
+
+    def _command(self, *args):
+        connection = self._checkout()
+        try:
+            connection[0].sendall(self._encode(args))
+            reply = self._read_reply(connection[1])
+        except (OSError, ValueError) as e:
+            # The connection may be half-read, never reuse it
+            connection[0].close()
+            raise CacheError(f'Cache server {self.host}:{self.port} failed: {e}') from e
+        self._checkin(connection)
+        if isinstance(reply, CacheError):
+            raise reply
+        return reply
+
+    def _checkout(self):
+        with self._lock:
+            if self._pool:
+                return self._pool.pop()
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise CacheError(f'Cache server {self.host}:{self.port} unreachable: {e}') from e
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = (sock, sock.makefile('rb'))
+        setup = ([('AUTH', self.password)] if self.password else []) + ([('SELECT', self.db)] if self.db else [])
+        for command in setup:
+            sock.sendall(self._encode(command))
+            reply = self._read_reply(connection[1])
+            if isinstance(reply, CacheError):
+                sock.close()
+                raise reply
+        return connection
+
+    def _checkin(self, connection):
+        with self._lock:
+            if len(self._pool) < self.max_connections:
+                self._pool.append(connection)
+                return
+        connection[0].close()
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            elif not isinstance(arg, bytes):
+                arg = str(arg).encode('ascii')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read_reply(self, stream):
+        line = stream.readline()
+        if not line.endswith(b'\r\n'):
+            raise ValueError('connection closed')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload
+        if kind == b'-':
+            return CacheError(payload.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = stream.read(length + 2)
+            if len(data) != length + 2:
+                raise ValueError('connection closed')
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read_reply(stream) for _ in range(count)]
+        raise ValueError(f'unexpected reply {line!r}')
+
+
+class Cache:
+    """Namespaced JSON values over a backend, with versioned keys for invalidation
+
+    Backend failures count as misses, so the app keeps working, only slower,
+    while a cache server is down.
+    """
+
+    def __init__(self, backend, prefix='ascended', default_ttl=None):
+        self.backend = backend
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._failing = False
+
+    def get(self, namespace, key):
+        """Get a value, or None if missing or written before the last invalidation"""
+        try:
+            version, stored = self.backend.get_many([self._version_key(namespace), self._key(namespace, key)])
+        except CacheError as e:
+            self._failed(namespace, e)
+            return None
+        value = None
+        if version is not None and stored is not None:
+            stored_version, _, payload = bytes(stored).partition(b'\n')
+            if stored_version == bytes(version):
+                value = json.loads(payload)
+        self._count(namespace, 'hits' if value is not None else 'misses')
+        return value
+
+    def version(self, namespace):
+        """Get the namespace's current version, or None while the backend is failing"""
+        try:
+            return self._current_version(namespace)
+        except CacheError as e:
+            self._failed(namespace, e)
+            return None
+
+    def set(self, namespace, key, value, ttl=None, version=None):
+        """Store a JSON-serializable value under the namespace's current version
+
+        Pass a version taken from version() before reading the value, so a value
+        read before an invalidation is never a hit after it.
+        """
+        try:
+            version = version or self._current_version(namespace)
+            payload = json.dumps(value, separators=(',', ':'), default=str).encode('utf-8')
+            self.backend.set(self._key(namespace, key), version + b'\n' + payload, ttl or self.default_ttl)
+            self._count(namespace, 'sets')
+        except CacheError as e:
+            self._failed(namespace, e)
+
+    def delete(self, namespace, key):
+        try:
+            self.backend.delete(self._key(namespace, key))
+        except CacheError as e:
+            self._failed(namespace, e)
+
+    def invalidate(self, namespace):
+        """Drop every entry in a namespace, for every process sharing the backend"""
+        try:
+            self.backend.set(self._version_key(namespace), self._new_version(), pinned=True)
+            self._count(namespace, 'invalidations')
+        except CacheError as e:
+            self._failed(namespace, e)
+
+    def stats(self, namespace=None):
+        """Get hit and miss counters for this process, plus backend usage"""
+        with self._lock:
+            if namespace is not None:
+                return dict(self._stats.get(namespace, {}))
+            counters = {name: dict(values) for name, values in self._stats.items()}
+        try:
+            backend = self.backend.stats()
+        except CacheError as e:
+            backend = {'error': str(e)}
+        return {'namespaces': counters, 'backend': backend}
+
+    def _current_version(self, namespace):
+        version_key = self._version_key(namespace)
+        version = self.backend.get_many([version_key])[0]
+        if version is None:
+            # Missing or evicted, a fresh random version cannot match any old entry
+            self.backend.add(version_key, self._new_version(), pinned=True)
+            version = self.backend.get_many([version_key])[0]
+            if version is None:
+                raise CacheError(f'Could not store a version for {namespace}')
+        return bytes(version)
+
+    @staticmethod
+    def _new_version():
+        return str(secrets.randbits(63)).encode('ascii')
+
+    def _key(self, namespace, key):
+        return f'{self.prefix}:{namespace}:{key}'
+
+    def _version_key(self, namespace):
+        return f'{self.prefix}:{namespace}:__version__'
+
+    def _count(self, namespace, counter):
+        with self._lock:
+            counters = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0, 'errors': 0})
+            counters[counter] += 1
+            if counter != 'errors':
+                self._failing = False
+
+    def _failed(self, namespace, error):
+        self._count(namespace, 'errors')
+        with self._lock:
+            first, self._failing = not self._failing, True
+        if first:
+            print(f"✗ Cache unavailable, continuing without it: {error}")
+
+
+def create_cache(config):
+    """Build the Cache for the configured CACHE_BACKEND"""
+    backend_name = config.get('CACHE_BACKEND', 'lru')
+    if backend_name == 'lru':
+        backend = LRUBackend(
+            max_bytes=config.get('CACHE_LRU_MAX_BYTES', 64 * 1024 * 1024),
+            max_entries=config.get('CACHE_LRU_MAX_ENTRIES', 10000)
+        )
+    elif backend_name == 'shared':
+        backend = SharedMemoryBackend(
+            config.get('CACHE_SHARED_PATH') or os.path.join('database', 'shared_cache.bin'),
+            slots=config.get('CACHE_SHARED_SLOTS', 8192),
+            slot_bytes=config.get('CACHE_SHARED_SLOT_BYTES', 2048)
+        )
+    elif backend_name == 'redis':
+        backend = RedisBackend(
+            config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+            timeout=config.get('CACHE_REDIS_TIMEOUT', 0.5)
+        )
+    else:
+        raise ValueError(f'Unknown CACHE_BACKEND: {backend_name}')
+    return Cache(backend, prefix=config.get('CACHE_PREFIX', 'ascended'), default_ttl=config.get('CACHE_DEFAULT_TTL'))
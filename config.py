@@ -1,9 +1,13 @@
 import os
-import secrets
 
 class Config:
     """Base configuration class"""
-    SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_hex(16)
+    # Pin keys through the environment, otherwise every worker shares the persisted key file
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    SECRET_KEY_FALLBACKS = [key for key in os.environ.get('SECRET_KEY_FALLBACKS', '').split(',') if key]
+    SECRET_KEY_FILE = os.environ.get('SECRET_KEY_FILE') or os.path.join('database', 'secret_keys.json')
+    SECRET_KEY_MAX_ACTIVE = 3  # One key signs, the others (including a just-rotated one) are still accepted
+    SECRET_KEY_CHECK_INTERVAL = 30  # seconds between checks for a rotation by another process
     DATABASE = os.environ.get('DATABASE_URL') or 'database/ascended_prototype.db'
     
     # Flask-Login configuration
@@ -19,6 +23,113 @@ class Config:
     # Database configuration
     DATABASE_DIR = 'database'
     
+    # Report history file store and retention limits
+    REPORT_STORE_DIR = os.environ.get('REPORT_STORE_DIR') or os.path.join('database', 'reports')
+    REPORT_RETENTION_MAX_COUNT = 200
+    REPORT_RETENTION_MAX_AGE_DAYS = 90
+    REPORT_RETENTION_MAX_BYTES = 500 * 1024 * 1024  # 500 MB
+    REPORT_CACHE_TTL = 24 * 3600  # seconds, entries are also dropped as soon as their tables change
+    BLOB_STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read per chunk when moving legacy report blobs into the store
+    
+    # PDF report rendering limits
+    PDF_MAX_ROWS = 5000  # Larger reports are truncated with a note to use CSV/Excel
+    PDF_TABLE_CHUNK_ROWS = 50
+    PDF_RENDER_WORKERS = 2
+    PDF_RENDER_TIMEOUT = 60  # seconds
+    
+    # Online backups (SQLite backup API)
+    BACKUP_DIR = os.environ.get('BACKUP_DIR') or os.path.join('database', 'backups')
+    BACKUP_BUSY_SLEEP = 0.005  # seconds to wait before retrying while a writer holds the lock
+    BACKUP_DEFAULT_COMPRESSION = 'gzip'  # None, 'gzip' or 'zstd' (needs the zstandard package)
+    
+    # Scheduled backups and grandfather-father-son retention
+    BACKUP_SCHEDULE_ENABLED = os.environ.get('BACKUP_SCHEDULE_ENABLED', '1') == '1'
+    BACKUP_INTERVAL_HOURS = 24
+    BACKUP_WINDOW_START_HOUR = 2  # Off-peak window in server local time, may wrap midnight
+    BACKUP_WINDOW_END_HOUR = 5
+    BACKUP_KEEP_DAILY = 7
+    BACKUP_KEEP_WEEKLY = 4
+    BACKUP_KEEP_MONTHLY = 6
+    BACKUP_MAX_TOTAL_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB across all backups
+    
+    # Batched purges of expired rows (days to keep, None keeps everything)
+    PURGE_RETENTION_DAYS = {
+        'game_state': 7,
+        'user_sessions': 90,
+        'report_history': REPORT_RETENTION_MAX_AGE_DAYS,
+        'activity_daily_users': 400,
+        'activity_sketches': 400,
+        'rollup_daily_sessions': 400
+    }
+    PURGE_BATCH_SIZE = 500  # Rows deleted per transaction
+    PURGE_BATCH_PAUSE = 0.01  # seconds between batches so other writers get the lock
+    PURGE_VACUUM_PAGES_PER_STEP = 256
+    
+    # Cold-data archival of inactive users
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or os.path.join('database', 'archive')
+    ARCHIVE_INACTIVE_DAYS = 90
+    ARCHIVE_BATCH_SIZE = 200  # Users moved per transaction
+    
+    # Password hashing (Werkzeug method strings), run on a bounded pool off the request threads
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = 2  # Max cores spent on hashing at once
+    PASSWORD_HASH_MAX_QUEUE = 64  # Logins waiting beyond this get a 503
+    PASSWORD_HASH_TIMEOUT = 10  # seconds
+    
+    # Token-bucket rate limits per endpoint: scope -> (tokens per second, burst size)
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMITS = {
+        'track_progress': {'user': (2, 20), 'ip': (10, 100)},
+        'track_event': {'user': (5, 50), 'ip': (20, 200)},
+        'heartbeat': {'user': (1, 5), 'ip': (10, 100)}
+    }
+    SESSION_IDLE_TIMEOUT = 1800  # seconds without a heartbeat before a play session ends
+    
+    # Admission control per request class, limits apply per worker process.
+    # Queued requests hold a request thread, so dashboard and admin_heavy together
+    # (max_concurrent + max_queue) stay well below SERVER_THREADS to leave room for gameplay.
+    WORKLOAD_ENABLED = True
+    WORKLOAD_CLASSES = {
+        'gameplay': {'max_concurrent': 32, 'max_queue': 64, 'queue_timeout': 2},
+        'dashboard': {'max_concurrent': 2, 'max_queue': 4, 'queue_timeout': 10},
+        'admin_heavy': {'max_concurrent': 1, 'max_queue': 2, 'queue_timeout': 30}
+    }
+    
+    # Server-sent events for the admin dashboard, each open stream holds a request thread
+    EVENT_STREAM_INTERVAL = 1.0  # seconds between checks for writes made by other workers
+    EVENT_STREAM_MAX_CLIENTS = 4  # per worker process
+    EVENT_STREAM_QUEUE = 100  # events buffered for a slow client before it is dropped
+    EVENT_STREAM_KEEPALIVE = 15  # seconds
+    ACTIVITY_FEED_CAPACITY = 200  # Recent activity entries kept in memory per worker
+    
+    # Cache for users and rendered reports: 'lru' (per worker), 'shared' (mmap file, per host) or 'redis'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'lru')
+    CACHE_PREFIX = 'ascended'  # Key prefix, lets several deployments share one cache server
+    CACHE_LRU_MAX_BYTES = 64 * 1024 * 1024
+    CACHE_LRU_MAX_ENTRIES = 10000
+    CACHE_SHARED_PATH = os.environ.get('CACHE_SHARED_PATH') or os.path.join('database', 'shared_cache.bin')
+    CACHE_SHARED_SLOTS = 8192
+    CACHE_SHARED_SLOT_BYTES = 2048  # Larger values are not cached by the shared backend
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_REDIS_TIMEOUT = 0.5  # seconds, the app treats a slow cache server as a miss
+    USER_CACHE_TTL = 60  # seconds, role changes and deletes invalidate sooner
+    
+    # Pre-forking server (server.py)
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 0)) or None  # None uses one per CPU
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 16))  # Request threads per worker
+    SERVER_GRACEFUL_TIMEOUT = 30  # seconds to finish in-flight requests on reload/stop
+    
+    # Async gameplay API (asgi.py)
+    ASYNC_DB_THREADS = 1  # Dedicated threads running database work for the event loop
+    ASYNC_DB_MAX_QUEUE = 2000  # Calls waiting beyond this get a 503
+    ASYNC_WSGI_THREADS = 8  # Threads serving the remaining Flask routes
+    ASYNC_MAX_BODY_BYTES = 64 * 1024
+    ASYNC_EVENT_STREAM_MAX_CLIENTS = 1000  # Streams cost no thread in async mode
+    
+    # Bulk user import from CSV/XLSX
+    IMPORT_MAX_ROWS = 5000
+    
     # File paths for verification
     REQUIRED_FILES = [
         'index.html',
@@ -43,16 +154,17 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'shared')
     HOST = '0.0.0.0'
     PORT = int(os.environ.get('PORT', 5000))
-    SECRET_KEY = os.urandom(24)
-    if not SECRET_KEY:
-        raise ValueError("No SECRET_KEY set for production environment")
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     DATABASE = ':memory:'  # Use in-memory database for testing
+    SECRET_KEY = 'testing-secret-key'
+    BACKUP_SCHEDULE_ENABLED = False
+    RATE_LIMIT_ENABLED = False
 
 # Configuration mapping
 config = {
@@ -0,0 +1,265 @@
+"""Server-sent events for the admin dashboard
+
+One watcher thread per process recomputes the dashboard stats only when the
+data_versions counters move, then fans the changed fields and any new
+activity out to every connected admin. Writes handled by this process wake
+the watcher at once; writes made by other workers are noticed on its next
+poll. However many dashboards are open, the queries run once per change.
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import sketches
+
+
+class EventStreamBusyError(Exception):
+    """Raised when the maximum number of event streams are already open"""
+
+
+def user_counts(conn):
+    """Get total, admin and regular user counts"""
+    total_users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    admin_count = conn.execute('SELECT COUNT(*) FROM users WHERE is_admin = 1').fetchone()[0]
+    return {
+        'total_users': total_users,
+        'admin_users': admin_count,
+        'regular_users': total_users - admin_count
+    }
+
+
+def active_session_count(conn):
+    """Count sessions updated in the last 24 hours"""
+    return conn.execute(
+        "SELECT COUNT(*) FROM game_state WHERE updated_at > datetime('now', '-1 day')"
+    ).fetchone()[0]
+
+
+def level_completion(conn):
+    """Count game sessions per current level"""
+    rows = conn.execute('''
+        SELECT current_level as level, COUNT(*) as completions
+        FROM game_state
+        GROUP BY current_level
+        ORDER BY current_level
+    ''').fetchall()
+    return [{'level': row['level'], 'completions': row['completions']} for row in rows]
+
+
+def format_event(event, data, event_id=None):
+    """Encode one server-sent event"""
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+KEEPALIVE = ': keepalive\n\n'
+
+
+class Subscription:
+    """Event queue for one stream served from a request thread"""
+
+    def __init__(self, max_queue=100):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.closed = False
+
+    def deliver(self, message):
+        """Queue a message, returns False once the client has fallen too far behind"""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except queue.Full:
+            self.close()
+            return False
+
+    def close(self):
+        self.closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def messages(self, keepalive=15):
+        """Yield queued messages until closed, with a comment line every keepalive seconds"""
+        while True:
+            try:
+                message = self._queue.get(timeout=keepalive)
+            except queue.Empty:
+                yield KEEPALIVE
+                continue
+            if message is None or self.closed:
+                return
+            yield message
+
+
+class AsyncSubscription:
+    """Event queue for one stream served from an asyncio event loop"""
+
+    def __init__(self, loop, max_queue=100):
+        self.loop = loop
+        self.max_queue = max_queue
+        self._queue = asyncio.Queue()
+        self.closed = False
+
+    def deliver(self, message):
+        if self.closed:
+            return False
+        if self._queue.qsize() >= self.max_queue:
+            self.close()
+            return False
+        try:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, message)
+            return True
+        except RuntimeError:  # Event loop already closed
+            self.closed = True
+            return False
+
+    def close(self):
+        self.closed = True
+        try:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, None)
+        except RuntimeError:
+            pass
+
+    async def messages(self, keepalive=15):
+        while True:
+            try:
+                message = await asyncio.wait_for(self._queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+                continue
+            if message is None or self.closed:
+                return
+            yield message
+
+
+class DashboardPublisher:
+    """Watches for data changes and broadcasts dashboard updates to subscribers
+
+    New subscribers get a full snapshot event, then stats events holding only
+    the fields that changed and activity events holding new activity entries.
+    The watcher thread runs only while someone is subscribed.
+    """
+
+    def __init__(self, db_manager, activity_feed, interval=1.0, max_age=30, max_subscribers=4, activity_limit=10):
+        self.db_manager = db_manager
+        self.activity_feed = activity_feed
+        self.interval = interval
+        self.max_age = max_age
+        self.max_subscribers = max_subscribers
+        self.activity_limit = activity_limit
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subscribers = set()
+        self._thread = None
+        self._watermark = None
+        self._refreshed_at = 0
+        self._snapshot = None
+        self._event_id = 0
+        self.published = 0
+
+    def subscribe(self, subscription):
+        """Add a subscriber and send it the current snapshot"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise EventStreamBusyError('Too many dashboard streams open, please retry shortly')
+            if self._snapshot is None or time.monotonic() - self._refreshed_at > self.max_age:
+                self._watermark, snapshot = self._collect()
+                self._snapshot = snapshot
+                self._refreshed_at = time.monotonic()
+            subscription.deliver(format_event('snapshot', self._snapshot, self._event_id))
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='dashboard-events', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def notify(self):
+        """Wake the watcher after a write in this process"""
+        if self._subscribers:
+            self._wake.set()
+
+    def close(self):
+        """End every open stream, used when the worker shuts down"""
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+        for subscription in subscribers:
+            subscription.close()
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'max_subscribers': self.max_subscribers,
+                'events_published': self.published
+            }
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"✗ Dashboard event refresh failed: {e}")
+
+    def _refresh(self):
+        watermark = self.db_manager.get_data_watermark()
+        stale = time.monotonic() - self._refreshed_at > self.max_age
+        if watermark == self._watermark and not stale:
+            return
+
+        # Queried outside the lock so new subscribers are not held up
+        watermark, snapshot = self._collect(watermark)
+        with self._lock:
+            previous = self._snapshot or {'stats': {}, 'recent_activity': []}
+            changed = {
+                name: value for name, value in snapshot['stats'].items()
+                if previous['stats'].get(name) != value
+            }
+            last_seen = max((entry['id'] for entry in previous['recent_activity']), default=0)
+            new_activity = [entry for entry in snapshot['recent_activity'] if entry['id'] > last_seen]
+            self._watermark = watermark
+            self._snapshot = snapshot
+            self._refreshed_at = time.monotonic()
+            if changed:
+                self._broadcast('stats', changed)
+            if new_activity:
+                self._broadcast('activity', new_activity)
+
+    def _collect(self, watermark=None):
+        watermark = watermark or self.db_manager.get_data_watermark()
+        conn = self.db_manager.get_connection()
+        try:
+            stats = user_counts(conn)
+            stats['active_sessions'] = active_session_count(conn)
+            stats['active_users'] = sketches.active_user_metrics(conn)
+            stats['level_completion'] = level_completion(conn)
+        finally:
+            conn.close()
+        activity = self.activity_feed.recent(self.activity_limit)
+        return watermark, {'stats': stats, 'recent_activity': activity}
+
+    def _broadcast(self, event, data):
+        # Called with the lock held so events reach every subscriber in the same order
+        self._event_id += 1
+        message = format_event(event, data, self._event_id)
+        for subscription in list(self._subscribers):
+            if not subscription.deliver(message):
+                # Too slow or gone, the browser reconnects and gets a fresh snapshot
+                self._subscribers.discard(subscription)
+        self.published += 1
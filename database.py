@@ -4,6 +4,11 @@ import os
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from rollups import ensure_rollups
+from sketches import ensure_activity_sketches, record_activity, user_key_for_session
+from archive import ensure_archive_tables
+from activity_feed import ensure_activity_feed, record_event
+from password_hasher import HashingBusyError
 
 class User(UserMixin):
     """User model for Flask-Login"""
@@ -43,9 +48,39 @@ class User(UserMixin):
 class DatabaseManager:
     """Database manager for the Ascended game"""
     
-    def __init__(self, database_path, database_dir='database'):
+    def __init__(self, database_path, database_dir='database', password_hasher=None, cache=None, user_cache_ttl=60):
         self.database_path = database_path
         self.database_dir = database_dir
+        self.password_hasher = password_hasher
+        self.cache = cache
+        self.user_cache_ttl = user_cache_ttl
+    
+    def hash_password(self, password):
+        """Hash a password on the bounded hashing pool when one is configured"""
+        if self.password_hasher:
+            return self.password_hasher.generate(password)
+        return generate_password_hash(password)
+    
+    def hash_passwords(self, passwords):
+        """Hash a batch of passwords in order, sharing the hashing pool fairly with logins"""
+        if self.password_hasher:
+            return self.password_hasher.generate_many(passwords)
+        return [generate_password_hash(password) for password in passwords]
+    
+    def check_password(self, conn, user_id, password_hash, password):
+        """Check a password and upgrade its stored hash if the hash parameters changed"""
+        if not self.password_hasher:
+            return check_password_hash(password_hash, password)
+        if not self.password_hasher.verify(password_hash, password):
+            return False
+        if self.password_hasher.needs_rehash(password_hash):
+            conn.execute(
+                'UPDATE users SET password_hash = ? WHERE id = ?',
+                (self.password_hasher.generate(password), user_id)
+            )
+            conn.commit()
+            self.password_hasher.record_rehash()
+        return True
     
     def get_connection(self):
         """Get database connection"""
@@ -64,11 +99,15 @@ class DatabaseManager:
             
             conn = self.get_connection()
             
+            # Must be set before the first table so purges can hand space back incrementally
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            
             # Create tables with all current columns
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS game_state (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     session_id TEXT UNIQUE,
+                    user_id INTEGER,
                     current_level INTEGER DEFAULT 1,
                     progress TEXT DEFAULT '{}',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -173,6 +212,15 @@ class DatabaseManager:
                 )
             ''')
             
+            self.ensure_report_history_table(conn)
+            self.ensure_data_versions(conn)
+            self.ensure_indexes(conn)
+            self.ensure_unique_logins(conn)
+            ensure_rollups(conn)
+            ensure_activity_sketches(conn)
+            ensure_archive_tables(conn)
+            ensure_activity_feed(conn)
+            
             conn.commit()
             conn.close()
             return True
@@ -193,6 +241,19 @@ class DatabaseManager:
                 conn.execute('ALTER TABLE users ADD COLUMN is_admin INTEGER DEFAULT 0')
                 migrations_applied.append('Added is_admin column to users table')
             
+            # Check if game_state rows carry their owner's user id
+            cursor = conn.execute("PRAGMA table_info(game_state)")
+            game_state_columns = [column[1] for column in cursor.fetchall()]
+            
+            if 'user_id' not in game_state_columns:
+                conn.execute('ALTER TABLE game_state ADD COLUMN user_id INTEGER')
+                conn.execute('''
+                    UPDATE game_state
+                    SET user_id = CAST(substr(session_id, 6, instr(substr(session_id, 6), '_') - 1) AS INTEGER)
+                    WHERE user_id IS NULL AND session_id LIKE 'user\\_%\\_%' ESCAPE '\\'
+                ''')
+                migrations_applied.append('Added user_id column to game_state table')
+            
             # Check if level_data table exists
             cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='level_data'")
             if not cursor.fetchone():
@@ -291,7 +352,55 @@ class DatabaseManager:
                 ''')
                 migrations_applied.append('Created user_sessions table')
             
+            # Check if report_history stores report files outside the database
+            cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='report_history'")
+            if cursor.fetchone():
+                cursor = conn.execute("PRAGMA table_info(report_history)")
+                report_columns = [column[1] for column in cursor.fetchall()]
+                if 'content_hash' not in report_columns:
+                    migrations_applied.append('Added content_hash column to report_history table')
+            self.ensure_report_history_table(conn)
+            
+            # Check if report, cascade and login lookup indexes exist
+            created_indexes = self.ensure_indexes(conn)
+            if created_indexes:
+                migrations_applied.append(f"Created indexes: {', '.join(created_indexes)}")
+            
+            # Check if usernames and emails are unique regardless of case
+            created, collisions = self.ensure_unique_logins(conn)
+            if created:
+                migrations_applied.append(f"Made {' and '.join(self.UNIQUE_LOGIN_INDEXES[name][0] + 's' for name in created)} unique ignoring case")
+            for column, ids, values in collisions:
+                print(f"  ⚠️  Users {ids} have the same {column} ignoring case ({values}), "
+                      f"rename all but one to make {column}s unique")
+            
+            # Check if change counters for report caching exist
+            if self.ensure_data_versions(conn):
+                migrations_applied.append('Created data_versions change counters')
+            
+            # Check if daily rollups for reports exist
+            if ensure_rollups(conn):
+                migrations_applied.append('Created daily report rollups')
+            
+            # Check if active-user sketches exist
+            if ensure_activity_sketches(conn):
+                migrations_applied.append('Created active-user sketches')
+            
+            # Check if the archived users table exists
+            if ensure_archive_tables(conn):
+                migrations_applied.append('Created archived_users table')
+            
+            # Check if the recent activity feed table exists
+            if ensure_activity_feed(conn):
+                migrations_applied.append('Created recent_activity feed table')
+            
             conn.commit()
+            
+            # Switching an existing database to incremental auto-vacuum needs one full VACUUM
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+                migrations_applied.append('Enabled incremental auto-vacuum')
             conn.close()
             
             if migrations_applied:
@@ -333,15 +442,52 @@ class DatabaseManager:
                 'error': str(e)
             }
     
+    def iter_blob(self, table, column, rowid, chunk_size=64 * 1024):
+        """Yield a BLOB value in fixed-size chunks without loading it into memory"""
+        conn = self.get_connection()
+        try:
+            if hasattr(conn, 'blobopen'):
+                # Incremental BLOB I/O (Python 3.11+)
+                with conn.blobopen(table, column, rowid, readonly=True) as blob:
+                    while True:
+                        chunk = blob.read(chunk_size)
+                        if not chunk:
+                            break
+                        yield chunk
+            else:
+                offset = 1
+                while True:
+                    row = conn.execute(
+                        f'SELECT substr({column}, ?, ?) FROM {table} WHERE rowid = ?',
+                        (offset, chunk_size, rowid)
+                    ).fetchone()
+                    if not row or not row[0]:
+                        break
+                    yield row[0]
+                    offset += chunk_size
+        finally:
+            conn.close()
+    
     def save_progress(self, session_id, level, progress):
         """Save game progress"""
         try:
             progress_json = json.dumps(progress)
             conn = self.get_connection()
+            user_key = user_key_for_session(session_id)
+            user_id = int(user_key) if user_key.isdigit() else None
+            
+            # Upsert rather than REPLACE so update triggers keep the report rollups current
             conn.execute('''
-                INSERT OR REPLACE INTO game_state (session_id, current_level, progress, updated_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (session_id, level, progress_json))
+                INSERT INTO game_state (session_id, user_id, current_level, progress, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    current_level = excluded.current_level,
+                    progress = excluded.progress,
+                    updated_at = excluded.updated_at
+            ''', (session_id, user_id, level, progress_json))
+            record_activity(conn, user_key)
+            if user_id is not None:
+                record_event(conn, user_id, 'progress_saved', level=level)
             conn.commit()
             conn.close()
             return True
@@ -373,61 +519,107 @@ class DatabaseManager:
     def register_user(self, username, email, password):
         """Register a new user"""
         try:
-            password_hash = generate_password_hash(password)
             conn = self.get_connection()
             try:
-                conn.execute(
+                # Skip hashing for names already taken, the unique indexes catch any race
+                if self.find_user(conn, username) or self.find_user(conn, email):
+                    return {'success': False, 'error': 'Username or email already exists'}
+                password_hash = self.hash_password(password)
+                user_id = conn.execute(
                     'INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
                     (username, email, password_hash)
-                )
+                ).lastrowid
+                record_event(conn, user_id, 'registered')
                 conn.commit()
                 return {'success': True}
             except sqlite3.IntegrityError:
                 return {'success': False, 'error': 'Username or email already exists'}
             finally:
                 conn.close()
+        except HashingBusyError:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def normalize_identifier(identifier):
+        """Normalize a username or email for case-insensitive lookup"""
+        return (identifier or '').strip().lower()
+    
+    def find_user(self, conn, identifier):
+        """Find a user row by email or username, ignoring case
+        
+        Served by the LOWER(email) and LOWER(username) indexes. An exact match
+        wins if one user's username is another user's email, or while older
+        accounts still differ only by case (see ensure_unique_logins).
+        """
+        normalized = self.normalize_identifier(identifier)
+        if not normalized:
+            return None
+        return conn.execute(
+            '''SELECT * FROM users WHERE LOWER(email) = ? OR LOWER(username) = ?
+               ORDER BY (email = ? OR username = ?) DESC, id LIMIT 1''',
+            (normalized, normalized, identifier, identifier)
+        ).fetchone()
+    
     def authenticate_user(self, identifier, password):
         """Authenticate user by email or username"""
         try:
-            conn = self.get_connection()
-            user = conn.execute(
-                'SELECT * FROM users WHERE email = ? OR username = ?', 
-                (identifier, identifier)
-            ).fetchone()
-            conn.close()
-            
-            if user and check_password_hash(user['password_hash'], password):
+            user = self.verify_password(identifier, password)
+            if user:
                 return {
                     'success': True,
                     'user': {
-                        'id': user['id'],
-                        'username': user['username'],
-                        'email': user['email']
+                        'id': user.id,
+                        'username': user.username,
+                        'email': user.email
                     }
                 }
             return {'success': False, 'error': 'Invalid credentials'}
+        except HashingBusyError:
+            raise
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
     def get_user_by_id(self, user_id):
-        """Get user by ID for Flask-Login"""
-        return User.get(user_id, self)
+        """Get user by ID for Flask-Login, from the shared cache when one is configured"""
+        if self.cache is None:
+            return User.get(user_id, self)
+        cached = self.cache.get('users', str(user_id))
+        if cached is not None:
+            return User(cached['id'], cached['username'], cached['email'], cached['is_admin'])
+        # Taken before the read, so a row read before an invalidation is stored under the old version
+        version = self.cache.version('users')
+        user = User.get(user_id, self)
+        if user and version is not None:
+            self.cache.set('users', str(user_id), {
+                'id': user.id,
+                'username': user.username,
+                'email': user.email,
+                'is_admin': user.is_admin
+            }, ttl=self.user_cache_ttl, version=version)
+        return user
+    
+    def invalidate_user(self, user_id=None):
+        """Drop a changed user from the cache in every worker, or every user when no ID is given
+        
+        Either way the whole namespace moves to a new version: deleting only the
+        one key would let a request that read the old row store it again
+        afterwards. Users change rarely, reloading the others is cheap.
+        """
+        if self.cache is None:
+            return
+        self.cache.invalidate('users')
     
     def get_user_by_email_or_username(self, identifier):
         """Get user by email or username"""
         try:
             conn = self.get_connection()
-            user_data = conn.execute(
-                'SELECT * FROM users WHERE email = ? OR username = ?', 
-                (identifier, identifier)
-            ).fetchone()
+            user_data = self.find_user(conn, identifier)
             conn.close()
             
             if user_data:
-                return User(user_data['id'], user_data['username'], user_data['email'])
+                return User(user_data['id'], user_data['username'], user_data['email'], bool(user_data['is_admin']))
             return None
         except Exception:
             return None
@@ -436,17 +628,17 @@ class DatabaseManager:
         """Verify user password"""
         try:
             conn = self.get_connection()
-            user_data = conn.execute(
-                'SELECT * FROM users WHERE email = ? OR username = ?', 
-                (identifier, identifier)
-            ).fetchone()
+            user_data = self.find_user(conn, identifier)
             
             print(f"Looking for user: {identifier}")  # Debug logging
             
             if user_data:
                 print(f"Found user: {user_data['username']}, checking password...")  # Debug logging
-                if check_password_hash(user_data['password_hash'], password):
+                if self.check_password(conn, user_data['id'], user_data['password_hash'], password):
                     print(f"Password verified for user: {user_data['username']}")  # Debug logging
+                    # A login counts as activity, so the archiver leaves this user alone
+                    record_activity(conn, user_data['id'])
+                    conn.commit()
                     # Fix: Access is_admin column directly, with fallback
                     is_admin = user_data['is_admin'] if 'is_admin' in user_data.keys() else 0
                     conn.close()
@@ -463,6 +655,8 @@ class DatabaseManager:
             
             conn.close()
             return None
+        except HashingBusyError:
+            raise
         except Exception as e:
             print(f"Database error in verify_password: {str(e)}")  # Debug logging
             return None
@@ -478,7 +672,7 @@ class DatabaseManager:
             if admin:
                 conn.close()
                 return {'success': False, 'error': 'Admin account already exists'}
-            password_hash = generate_password_hash(password)
+            password_hash = self.hash_password(password)
             conn.execute(
                 'INSERT INTO users (username, email, password_hash, is_admin) VALUES (?, ?, ?, 1)',
                 (username, email, password_hash)
@@ -575,6 +769,11 @@ class DatabaseManager:
                     ''', (user_id, room_number, room_name, completion_status, completion_percentage,
                           time_spent, score, attempts, room_data_json))
             
+            record_activity(conn, user_id, room_number)
+            record_event(
+                conn, user_id, 'room_completed' if completion_status == 'completed' else 'room_progress',
+                room_number=room_number, detail={'completion_percentage': completion_percentage}
+            )
             conn.commit()
             conn.close()
             return {'success': True, 'completion_percentage': completion_percentage}
@@ -625,6 +824,12 @@ class DatabaseManager:
         
         return min(100, max(0, round(total_percentage)))
     
+    # Event types track_game_event understands
+    GAME_EVENTS = frozenset({
+        'puzzle_solved', 'challenge_completed', 'secret_found', 'item_collected', 'checkpoint_reached',
+        'death', 'hint_used', 'exploration_update', 'position_update', 'objective_completed'
+    })
+    
     def track_game_event(self, user_id, room_number, event_type, event_data=None):
         """Track specific game events for detailed progress analysis"""
         try:
@@ -708,12 +913,56 @@ class DatabaseManager:
                     VALUES (?, ?, ?, ?)
                 ''', (user_id, room_number, f'Room {room_number}', room_data_json))
             
+            record_activity(conn, user_id, room_number)
+            record_event(conn, user_id, event_type, room_number=room_number, detail=event_data or None)
             conn.commit()
             conn.close()
             return {'success': True, 'room_data': room_data}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    def record_heartbeat(self, user_id, room_number=None, ip_address=None, user_agent=None, idle_timeout=1800):
+        """Extend the user's open play session, or start one if the last was idle for over idle_timeout seconds"""
+        try:
+            conn = self.get_connection()
+            current = conn.execute('''
+                SELECT id, rooms_visited, total_time,
+                       CAST(strftime('%s', 'now') - strftime('%s', session_start) AS INTEGER) AS elapsed
+                FROM user_sessions
+                WHERE user_id = ? AND session_end IS NULL
+                ORDER BY session_start DESC LIMIT 1
+            ''', (user_id,)).fetchone()
+            
+            if current and current['elapsed'] - current['total_time'] <= idle_timeout:
+                rooms_visited = json.loads(current['rooms_visited'] or '[]')
+                if room_number and room_number not in rooms_visited:
+                    rooms_visited.append(room_number)
+                conn.execute('''
+                    UPDATE user_sessions
+                    SET total_time = ?, actions_count = actions_count + 1, rooms_visited = ?
+                    WHERE id = ?
+                ''', (current['elapsed'], json.dumps(rooms_visited), current['id']))
+                session_id, total_time = current['id'], current['elapsed']
+            else:
+                if current:
+                    # Close the stale session at its last heartbeat, not now
+                    conn.execute(
+                        "UPDATE user_sessions SET session_end = datetime(session_start, '+' || total_time || ' seconds') WHERE id = ?",
+                        (current['id'],)
+                    )
+                session_id = conn.execute('''
+                    INSERT INTO user_sessions (user_id, rooms_visited, actions_count, ip_address, user_agent)
+                    VALUES (?, ?, 1, ?, ?)
+                ''', (user_id, json.dumps([room_number] if room_number else []), ip_address, user_agent)).lastrowid
+                total_time = 0
+            
+            record_activity(conn, user_id, room_number)
+            conn.commit()
+            conn.close()
+            return {'success': True, 'session_id': session_id, 'session_time': total_time}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
     def get_detailed_progress(self, user_id, room_number):
         """Get detailed progress breakdown for a specific room"""
         try:
@@ -934,6 +1183,201 @@ class DatabaseManager:
             if close_connection and 'conn' in locals():
                 conn.close()
 
+    # Indexes backing report filters and per-user lookups
+    INDEXES = {
+        'idx_game_state_updated_at': 'game_state (updated_at)',
+        'idx_game_state_user_id': 'game_state (user_id, updated_at)',
+        'idx_user_room_progress_room_updated': 'user_room_progress (room_number, updated_at)',
+        'idx_user_sessions_session_start': 'user_sessions (session_start)',
+        'idx_user_sessions_user_id': 'user_sessions (user_id)',
+        'idx_user_achievements_user_id': 'user_achievements (user_id)',
+        'idx_user_progress_username': 'user_progress (username)',
+        'idx_activity_daily_users_user_key': 'activity_daily_users (user_key, day)'
+    }
+    
+    def ensure_indexes(self, conn):
+        """Create any missing indexes on existing tables and return their names"""
+        existing = {
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'table')")
+        }
+        created = []
+        for name, target in self.INDEXES.items():
+            if name not in existing and target.split(' ')[0] in existing:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+                created.append(name)
+        return created
+    
+    # Unique expression indexes that make login identifiers unique regardless of case,
+    # and the plain lookup indexes used until existing case collisions are resolved
+    UNIQUE_LOGIN_INDEXES = {
+        'idx_users_username_nocase': ('username', 'idx_users_username_lower'),
+        'idx_users_email_nocase': ('email', 'idx_users_email_lower')
+    }
+    
+    def ensure_unique_logins(self, conn):
+        """Create the case-insensitive unique indexes on usernames and emails
+        
+        Accounts are never changed here. While existing accounts only differ by
+        case the unique index is left out, they keep logging in with their exact
+        spelling through a plain lookup index, and the next migration tries
+        again. Returns (created index names, collisions as (column, ids, values)).
+        """
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        created, collisions = [], []
+        for name, (column, lookup_index) in self.UNIQUE_LOGIN_INDEXES.items():
+            if name in existing:
+                continue
+            duplicates = conn.execute(f'''
+                SELECT GROUP_CONCAT(id), GROUP_CONCAT({column}, ', ') FROM users
+                GROUP BY LOWER({column}) HAVING COUNT(*) > 1
+            ''').fetchall()
+            if duplicates:
+                collisions += [(column, ids, values) for ids, values in duplicates]
+                conn.execute(f'CREATE INDEX IF NOT EXISTS {lookup_index} ON users (LOWER({column}))')
+                continue
+            conn.execute(f'CREATE UNIQUE INDEX {name} ON users (LOWER({column}))')
+            conn.execute(f'DROP INDEX IF EXISTS {lookup_index}')
+            created.append(name)
+        return created, collisions
+    
+    # Tables with a user_id column whose rows are deleted along with the user
+    USER_CHILD_TABLES = (
+        'game_state', 'user_room_progress', 'user_badges', 'user_sessions', 'user_achievements', 'archived_users',
+        'recent_activity'
+    )
+    
+    def delete_users(self, user_ids):
+        """Delete users and all rows that depend on them in one transaction
+        
+        Returns per-table delete counts and the archive files that still hold
+        rows for any archived users among them.
+        """
+        user_ids = sorted({int(user_id) for user_id in user_ids})
+        conn = self.get_connection()
+        conn.isolation_level = None
+        try:
+            tables = {
+                row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            }
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('CREATE TEMP TABLE IF NOT EXISTS delete_user_ids (id INTEGER PRIMARY KEY)')
+                conn.execute('DELETE FROM temp.delete_user_ids')
+                conn.executemany('INSERT INTO temp.delete_user_ids (id) VALUES (?)', [(i,) for i in user_ids])
+                
+                archived = []
+                if 'archived_users' in tables:
+                    archived = [tuple(row) for row in conn.execute(
+                        'SELECT user_id, archive_file FROM archived_users WHERE user_id IN (SELECT id FROM temp.delete_user_ids)'
+                    )]
+                
+                # Every child delete is an indexed lookup on user_id (or username for user_progress)
+                deleted = {}
+                for table in self.USER_CHILD_TABLES:
+                    if table in tables:
+                        deleted[table] = conn.execute(
+                            f'DELETE FROM {table} WHERE user_id IN (SELECT id FROM temp.delete_user_ids)'
+                        ).rowcount
+                deleted['user_progress'] = conn.execute(
+                    'DELETE FROM user_progress WHERE username IN '
+                    '(SELECT username FROM users WHERE id IN (SELECT id FROM temp.delete_user_ids))'
+                ).rowcount
+                deleted['users'] = conn.execute(
+                    'DELETE FROM users WHERE id IN (SELECT id FROM temp.delete_user_ids)'
+                ).rowcount
+                conn.execute('DELETE FROM temp.delete_user_ids')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self.invalidate_user()
+            return {'deleted': deleted, 'archived': archived}
+        finally:
+            conn.close()
+    
+    # Tables whose writes bump a change counter, used to invalidate cached reports
+    VERSIONED_TABLES = ('users', 'game_state', 'user_room_progress')
+    
+    def ensure_data_versions(self, conn):
+        """Ensure per-table change counters and the triggers that maintain them exist"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        created = []
+        for table in self.VERSIONED_TABLES:
+            conn.execute('INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)', (table,))
+            for action in ('INSERT', 'UPDATE', 'DELETE'):
+                trigger = f'trg_{table}_version_{action.lower()}'
+                exists = conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='trigger' AND name=?", (trigger,)
+                ).fetchone()
+                if exists:
+                    continue
+                conn.execute(f'''
+                    CREATE TRIGGER {trigger} AFTER {action} ON {table}
+                    BEGIN
+                        UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+                    END
+                ''')
+                created.append(trigger)
+        return created
+    
+    def get_data_watermark(self, tables=None):
+        """Get the change counters for the given tables as a comparable tuple"""
+        tables = tuple(tables or self.VERSIONED_TABLES)
+        conn = self.get_connection()
+        try:
+            versions = dict(conn.execute(
+                f'SELECT table_name, version FROM data_versions WHERE table_name IN ({",".join("?" * len(tables))})',
+                tables
+            ).fetchall())
+        finally:
+            conn.close()
+        return tuple(versions.get(table, 0) for table in tables)
+    
+    def ensure_report_history_table(self, conn=None):
+        """Ensure report_history table exists and stores file contents by hash"""
+        close_connection = False
+        try:
+            if conn is None:
+                conn = self.get_connection()
+                close_connection = True
+            
+            # file_data held reports saved before the on-disk store, startup moves them out
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS report_history (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    config TEXT,
+                    file_data BLOB,
+                    size INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    description TEXT,
+                    metadata TEXT,
+                    content_hash TEXT
+                )
+            ''')
+            
+            cursor = conn.execute("PRAGMA table_info(report_history)")
+            columns = [column[1] for column in cursor.fetchall()]
+            if 'content_hash' not in columns:
+                conn.execute('ALTER TABLE report_history ADD COLUMN content_hash TEXT')
+            
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_report_history_created_at ON report_history (created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_report_history_content_hash ON report_history (content_hash)')
+            
+            if close_connection:
+                conn.commit()
+            return True
+        finally:
+            if close_connection and conn is not None:
+                conn.close()
+
     def create_default_badges(self, conn=None):
         """Create default badges for the game with proper error handling"""
         try:
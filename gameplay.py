@@ -0,0 +1,224 @@
+"""Gameplay API logic shared by the Flask routes and the async server
+
+Each function takes the DatabaseManager and the authenticated user id and
+returns (payload, status). The Flask views call them directly on the request
+thread; asgi.py runs them on its database thread.
+"""
+
+ROOM_COUNT = 5
+
+ROOM_NAMES = {
+    1: 'Flowchart Lab',
+    2: 'Network Nexus',
+    3: 'AI Systems',
+    4: 'Database Crisis',
+    5: 'Programming Crisis'
+}
+
+
+def get_room_name(room_id):
+    """Get standard room name by ID"""
+    return ROOM_NAMES.get(room_id, f'Room {room_id}')
+
+
+def _not_started(room_id, room_name):
+    return {
+        'room_number': room_id,
+        'room_name': room_name,
+        'completion_status': 'not_started',
+        'completion_percentage': 0,
+        'time_spent': 0,
+        'best_score': 0,
+        'attempts': 0
+    }
+
+
+def user_progress(db_manager, user_id):
+    """Get user's game progress with detailed metrics for dashboard"""
+    try:
+        # Get comprehensive progress summary
+        progress_summary = db_manager.get_overall_progress_summary(user_id)
+
+        if not progress_summary['success']:
+            return {'status': 'error', 'message': progress_summary.get('error', 'Failed to load progress')}, 500
+
+        # If no progress data yet, return default structure
+        if not progress_summary['summary']:
+            return {
+                'status': 'success',
+                'stats': {
+                    'completed_rooms': 0,
+                    'current_room': 1,
+                    'current_level': 1,
+                    'badge_count': 0,
+                    'session_count': 0,
+                    'last_played': None,
+                    'total_score': 0,
+                    'completion_rate': 0
+                },
+                'rooms': []
+            }, 200
+
+        # Get room-specific progress
+        rooms = []
+        for room_id in range(1, ROOM_COUNT + 1):
+            room_progress = db_manager.get_detailed_progress(user_id, room_id)
+            if room_progress['success'] and room_progress['progress']:
+                rooms.append(room_progress['progress'])
+            else:
+                # Add placeholder for rooms not started yet
+                rooms.append(_not_started(room_id, f"Room {room_id}"))
+
+        # Get badge count
+        conn = db_manager.get_connection()
+        badge_count = 0
+        try:
+            badge_count = conn.execute(
+                "SELECT COUNT(*) FROM user_badges WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()[0]
+        except:
+            pass
+
+        # Get session count
+        session_count = 0
+        try:
+            session_count = conn.execute(
+                "SELECT COUNT(*) FROM user_sessions WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()[0]
+        except:
+            pass
+
+        conn.close()
+
+        # Get current position
+        current_room = 1
+        current_level = 1
+        # Use the room with highest percentage that's not completed, or the first one
+        for room in rooms:
+            if room['completion_status'] != 'completed' and room['completion_percentage'] > 0:
+                current_room = room['room_number']
+                break
+            elif room['completion_status'] == 'completed':
+                current_room = room['room_number'] + 1
+                if current_room > ROOM_COUNT:
+                    current_room = ROOM_COUNT  # Cap at max room
+
+        summary = progress_summary['summary']
+        return {
+            'status': 'success',
+            'stats': {
+                'completed_rooms': summary['completed_rooms'],
+                'total_rooms': summary['total_rooms'],
+                'current_room': current_room,
+                'current_level': current_level,
+                'badge_count': badge_count,
+                'session_count': session_count,
+                'last_played': rooms[0].get('last_accessed') if rooms else None,
+                'total_score': summary['total_score'],
+                'total_time_spent': summary['total_time_spent'],
+                'completion_rate': round(summary['completion_rate'], 1),
+                'performance': summary['performance_metrics']
+            },
+            'rooms': rooms
+        }, 200
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}, 500
+
+
+def room_progress(db_manager, user_id, room_id):
+    """Get detailed progress for a specific room"""
+    try:
+        result = db_manager.get_detailed_progress(user_id, room_id)
+        if result['success']:
+            return {'status': 'success', 'progress': result['progress']}, 200
+        else:
+            return {'status': 'error', 'message': result.get('error', 'Failed to load room progress')}, 500
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}, 500
+
+
+def all_room_progress(db_manager, user_id):
+    """Get progress for all rooms for dashboard display"""
+    try:
+        rooms = []
+        for room_id in range(1, ROOM_COUNT + 1):
+            room_progress = db_manager.get_detailed_progress(user_id, room_id)
+            if room_progress['success'] and room_progress['progress']:
+                rooms.append(room_progress['progress'])
+            else:
+                # Add placeholder for rooms not started yet
+                rooms.append(_not_started(room_id, get_room_name(room_id)))
+
+        return {'status': 'success', 'rooms': rooms}, 200
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}, 500
+
+
+def track_progress(db_manager, user_id, data):
+    """Update user's progress for a room"""
+    try:
+        data = data or {}
+        room_id = data.get('room_id')
+        progress_data = data.get('progress_data', {})
+
+        if not room_id:
+            return {'status': 'error', 'message': 'Room ID is required'}, 400
+
+        result = db_manager.save_user_room_progress(user_id, room_id, progress_data)
+
+        if not result['success']:
+            return {'status': 'error', 'message': result.get('error', 'Failed to save progress')}, 500
+
+        # Return updated completion percentage
+        return {
+            'status': 'success',
+            'completion_percentage': result.get('completion_percentage', 0)
+        }, 200
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}, 500
+
+
+def track_event(db_manager, user_id, data):
+    """Track a game event for progress tracking"""
+    try:
+        data = data or {}
+        room_id = data.get('room_id')
+        event_type = data.get('event_type')
+        event_data = data.get('event_data', {})
+
+        if not all([room_id, event_type]):
+            return {'status': 'error', 'message': 'Missing required fields'}, 400
+        if event_type not in db_manager.GAME_EVENTS:
+            return {'status': 'error', 'message': 'Unknown event type'}, 400
+
+        result = db_manager.track_game_event(user_id, room_id, event_type, event_data)
+
+        if not result['success']:
+            return {'status': 'error', 'message': result.get('error', 'Failed to track event')}, 500
+
+        return {
+            'status': 'success',
+            'room_data': result.get('room_data', {})
+        }, 200
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}, 500
+
+
+def heartbeat(db_manager, user_id, data, ip_address=None, user_agent=None, idle_timeout=1800):
+    """Keep the user's play session open and count them as active"""
+    try:
+        data = data or {}
+        result = db_manager.record_heartbeat(
+            user_id, data.get('room_id'), ip_address, user_agent, idle_timeout=idle_timeout
+        )
+        if not result['success']:
+            return {'status': 'error', 'message': result.get('error', 'Failed to record heartbeat')}, 500
+        return {
+            'status': 'success',
+            'session_id': result['session_id'],
+            'session_time': result['session_time']
+        }, 200
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}, 500
@@ -0,0 +1,124 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed, wait
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingBusyError(Exception):
+    """Raised when too many password hashes are already waiting"""
+
+
+class PasswordHasher:
+    """Runs password hashing on a small bounded pool instead of request threads
+
+    hashlib's scrypt and PBKDF2 release the GIL, so the pool size caps how many
+    cores a login storm can take while the rest keep serving gameplay.
+    """
+
+    def __init__(self, method='scrypt:32768:8:1', salt_length=16, max_workers=2, max_queue=64, timeout=10.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {'completed': 0, 'rejected': 0, 'timed_out': 0, 'rehashed': 0, 'wait_seconds': 0.0, 'max_queue_seen': 0}
+        # Werkzeug expands bare method names, so learn the exact prefix new hashes get
+        self._prefix = generate_password_hash('', method=method, salt_length=1).split('$', 1)[0]
+
+    def generate(self, password):
+        """Hash a new password with the configured parameters"""
+        return self._run(generate_password_hash, password, method=self.method, salt_length=self.salt_length)
+
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash"""
+        if not password_hash:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Check if a stored hash was made with different parameters than configured"""
+        return bool(password_hash) and password_hash.split('$', 1)[0] != self._prefix
+
+    def record_rehash(self):
+        with self._lock:
+            self._stats['rehashed'] += 1
+
+    def stats(self):
+        """Get queue depth and throughput counters"""
+        with self._lock:
+            completed = self._stats['completed']
+            return {
+                'method': self._prefix,
+                'workers': self.max_workers,
+                'queue_depth': self._pending,
+                'max_queue': self.max_queue,
+                'max_queue_seen': self._stats['max_queue_seen'],
+                'completed': completed,
+                'rejected': self._stats['rejected'],
+                'timed_out': self._stats['timed_out'],
+                'rehashed': self._stats['rehashed'],
+                'avg_wait_ms': round(1000 * self._stats['wait_seconds'] / completed, 2) if completed else 0
+            }
+
+    def generate_many(self, passwords):
+        """Hash new passwords in order for bulk imports
+
+        At most one hash per worker is queued at a time, so logins arriving
+        during an import wait behind a few hashes rather than the whole batch.
+        """
+        hashes = [None] * len(passwords)
+        in_flight = {}
+        for index, password in enumerate(passwords):
+            if len(in_flight) >= self.max_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    hashes[in_flight.pop(future)] = future.result()
+            future = self._submit(
+                generate_password_hash, password, method=self.method, salt_length=self.salt_length, bounded=False
+            )
+            in_flight[future] = index
+        for future in as_completed(in_flight):
+            hashes[in_flight[future]] = future.result()
+        return hashes
+
+    def _run(self, fn, *args, **kwargs):
+        future = self._submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            # Give the slot back if the hash never started, a running one finishes on its own
+            future.cancel()
+            with self._lock:
+                self._stats['timed_out'] += 1
+            raise HashingBusyError('Password check is taking too long, please retry shortly')
+
+    def _submit(self, fn, *args, bounded=True, **kwargs):
+        with self._lock:
+            if bounded and self._pending >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise HashingBusyError('Too many logins in progress, please retry shortly')
+            self._pending += 1
+            self._stats['max_queue_seen'] = max(self._stats['max_queue_seen'], self._pending)
+
+        submitted = time.monotonic()
+
+        def timed():
+            waited = time.monotonic() - submitted
+            with self._lock:
+                self._stats['wait_seconds'] += waited
+            return fn(*args, **kwargs)
+
+        def finished(future):
+            # Counted when the hash actually finishes, even if the caller timed out
+            with self._lock:
+                self._pending -= 1
+                if not future.cancelled():
+                    self._stats['completed'] += 1
+
+        future = self._executor.submit(timed)
+        future.add_done_callback(finished)
+        return future
@@ -0,0 +1,83 @@
+import sqlite3
+import time
+
+
+# Growing tables, the column their age is judged by and the key used to delete in batches
+PURGE_TARGETS = {
+    'game_state': {'column': 'updated_at', 'key': ('rowid',)},
+    'user_sessions': {'column': 'session_start', 'key': ('rowid',)},
+    'report_history': {'column': 'created_at', 'key': ('rowid',)},
+    'activity_daily_users': {'column': 'day', 'key': ('day', 'room_number', 'user_key'), 'date_only': True},
+    'activity_sketches': {'column': 'day', 'key': ('day', 'room_number'), 'date_only': True},
+    'rollup_daily_sessions': {'column': 'day', 'key': ('day', 'session_id'), 'date_only': True}
+}
+
+
+class PurgeEngine:
+    """Deletes expired rows in small indexed batches, one short transaction each"""
+
+    def __init__(self, database_path, retention_days, batch_size=500, batch_pause=0.01,
+                 vacuum_pages_per_step=256, busy_timeout=5.0):
+        self.database_path = database_path
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.vacuum_pages_per_step = vacuum_pages_per_step
+        self.busy_timeout = busy_timeout
+
+    def purge(self, tables=None, vacuum=True):
+        """Purge expired rows from the given tables (default all configured) and reclaim space"""
+        conn = sqlite3.connect(self.database_path, timeout=self.busy_timeout, isolation_level=None)
+        try:
+            deleted = {}
+            for table in tables or self.retention_days:
+                days = self.retention_days.get(table)
+                if days is None or table not in PURGE_TARGETS:
+                    continue
+                deleted[table] = self.purge_table(conn, table, days)
+            pages_freed = self.incremental_vacuum(conn) if vacuum else 0
+            return {'deleted': deleted, 'total_deleted': sum(deleted.values()), 'pages_freed': pages_freed}
+        finally:
+            conn.close()
+
+    def purge_table(self, conn, table, days):
+        """Delete rows older than days from one table and return how many were removed"""
+        target = PURGE_TARGETS[table]
+        cutoff_fn = 'date' if target.get('date_only') else 'datetime'
+        cutoff = conn.execute(f"SELECT {cutoff_fn}('now', ?)", (f'-{int(days)} days',)).fetchone()[0]
+        key, column = ', '.join(target['key']), target['column']
+
+        # The LIMIT subquery walks the timestamp index, so each batch touches only what it deletes
+        sql = f'''
+            DELETE FROM {table} WHERE ({key}) IN (
+                SELECT {key} FROM {table} WHERE {column} < ? LIMIT ?
+            )
+        '''
+        total = 0
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                removed = conn.execute(sql, (cutoff, self.batch_size)).rowcount
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            total += removed
+            if removed < self.batch_size:
+                return total
+            # Let other writers in between batches
+            time.sleep(self.batch_pause)
+
+    def incremental_vacuum(self, conn):
+        """Return free pages to the filesystem a step at a time, returns pages freed"""
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        freed = 0
+        while True:
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not free_pages:
+                return freed
+            step = min(free_pages, self.vacuum_pages_per_step)
+            conn.execute(f'PRAGMA incremental_vacuum({step})').fetchall()
+            freed += step
+            time.sleep(self.batch_pause)
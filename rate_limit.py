@@ -0,0 +1,83 @@
+import math
+import threading
+import time
+import zlib
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by string, spread over lock stripes
+
+    Each key hashes to one stripe, so concurrent requests for different users
+    rarely wait on the same lock.
+    """
+
+    def __init__(self, stripes=64, max_keys_per_stripe=2048):
+        self.max_keys_per_stripe = max_keys_per_stripe
+        self._stripes = [(threading.Lock(), {}) for _ in range(stripes)]
+        self.rejected = 0
+
+    def allow(self, key, rate, burst, cost=1.0):
+        """Take cost tokens from key's bucket, returns (allowed, retry_after_seconds)
+
+        rate is tokens refilled per second and burst the bucket size.
+        """
+        return self.allow_all([(key, rate, burst)], cost)
+
+    def allow_all(self, buckets, cost=1.0):
+        """Take cost tokens from every (key, rate, burst) bucket, or from none of them
+
+        Returns (allowed, retry_after_seconds) for the most restrictive bucket.
+        """
+        stripes = sorted({zlib.crc32(key.encode('utf-8')) % len(self._stripes) for key, _, _ in buckets})
+        now = time.monotonic()
+        # Stripes are locked in index order so two multi-bucket checks cannot deadlock
+        for index in stripes:
+            self._stripes[index][0].acquire()
+        try:
+            levels = []
+            retry_after = 0
+            for key, rate, burst in buckets:
+                stripe = self._stripes[zlib.crc32(key.encode('utf-8')) % len(self._stripes)][1]
+                tokens, updated = stripe.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - updated) * rate)
+                if tokens < cost:
+                    retry_after = max(retry_after, (cost - tokens) / rate)
+                levels.append((stripe, key, tokens, rate, burst))
+            allowed = retry_after == 0
+            for stripe, key, tokens, rate, burst in levels:
+                stripe[key] = (tokens - cost if allowed else tokens, now)
+                if len(stripe) > self.max_keys_per_stripe:
+                    self._evict(stripe, now, rate, burst)
+            if not allowed:
+                self.rejected += 1
+        finally:
+            for index in stripes:
+                self._stripes[index][0].release()
+        return allowed, retry_after
+
+    def _evict(self, buckets, now, rate, burst):
+        # Buckets that have refilled completely hold no state worth keeping
+        for key, (tokens, updated) in list(buckets.items()):
+            if tokens + (now - updated) * rate >= burst:
+                del buckets[key]
+        # Still over the cap, forget the least recently used half
+        if len(buckets) > self.max_keys_per_stripe:
+            by_age = sorted(buckets, key=lambda key: buckets[key][1])
+            for key in by_age[:len(by_age) // 2]:
+                del buckets[key]
+
+    def check(self, name, limits, keys):
+        """Check every (scope, key) pair against limits[scope] = (rate, burst) for the limit called name
+
+        Buckets are kept per limit name so each endpoint has its own budget,
+        and a request rejected by one bucket takes no tokens from the others.
+        Returns (allowed, retry_after) for the most restrictive bucket.
+        """
+        buckets = [
+            (f'{name}:{scope}:{key}', *limits[scope])
+            for scope, key in keys if key is not None and scope in limits
+        ]
+        if not buckets:
+            return True, 0
+        allowed, retry_after = self.allow_all(buckets)
+        return allowed, math.ceil(retry_after)
@@ -0,0 +1,45 @@
+import hashlib
+import json
+
+
+class ReportCache:
+    """Index of rendered reports in the shared cache, valid only while the data watermark is unchanged
+
+    Entries hold the report store hash and response headers rather than the
+    report itself, so they stay small enough for every cache backend.
+    """
+
+    NAMESPACE = 'reports'
+
+    def __init__(self, cache, ttl=24 * 3600):
+        self.cache = cache
+        self.ttl = ttl
+
+    @staticmethod
+    def make_key(report_type, config):
+        """Build a cache key from the report type and a normalized config"""
+        normalized = json.dumps(config or {}, sort_keys=True, separators=(',', ':'), default=str)
+        return f"{report_type}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]}"
+
+    def get(self, key, watermark):
+        """Get a cached entry if it was rendered against the same watermark"""
+        entry = self.cache.get(self.NAMESPACE, key)
+        if entry is None or entry['watermark'] != list(watermark):
+            # Missing, or the underlying data changed since this report was rendered
+            return None
+        return entry
+
+    def put(self, key, watermark, size, **values):
+        """Cache a rendered report for every worker sharing the cache"""
+        self.cache.set(self.NAMESPACE, key, dict(values, watermark=list(watermark), size=size), ttl=self.ttl)
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when no key is given"""
+        if key is None:
+            self.cache.invalidate(self.NAMESPACE)
+        else:
+            self.cache.delete(self.NAMESPACE, key)
+
+    def stats(self):
+        """Get cache usage statistics for this worker"""
+        return self.cache.stats(self.NAMESPACE)
@@ -0,0 +1,100 @@
+from datetime import date, datetime, timedelta
+
+
+class ReportFilters:
+    """Filters from an admin report config (days, startDate/endDate, rooms, userType, userIds)"""
+
+    def __init__(self, start_day=None, end_day=None, rooms=None, user_type=None, user_ids=None):
+        self.start_day = start_day
+        self.end_day = end_day
+        self.rooms = rooms or []
+        self.user_type = user_type
+        self.user_ids = user_ids or []
+
+    @classmethod
+    def from_config(cls, config, default_days=None):
+        """Parse and validate filters from a report config dict"""
+        config = config or {}
+        today = datetime.utcnow().date()
+        start_day = end_day = None
+
+        if config.get('startDate') or config.get('endDate'):
+            start_day = cls._parse_day(config.get('startDate'))
+            end_day = cls._parse_day(config.get('endDate'))
+        elif config.get('days') or default_days:
+            days = int(config.get('days') or default_days)
+            start_day = today - timedelta(days=days)
+
+        user_type = config.get('userType')
+        if user_type not in ('admins', 'users'):
+            user_type = None
+
+        return cls(
+            start_day=start_day,
+            end_day=end_day,
+            rooms=[int(room) for room in config.get('rooms') or []],
+            user_type=user_type,
+            user_ids=[int(user_id) for user_id in config.get('userIds') or []]
+        )
+
+    @staticmethod
+    def _parse_day(value):
+        if not value:
+            return None
+        return date.fromisoformat(str(value)[:10])
+
+    @property
+    def has_cohort(self):
+        """Check if the filters narrow the set of users"""
+        return bool(self.user_type or self.user_ids)
+
+
+class ReportQuery:
+    """Builds indexed WHERE predicates for report queries from ReportFilters"""
+
+    def __init__(self, filters):
+        self.filters = filters
+        self.clauses = []
+        self.params = []
+
+    def date_range(self, column):
+        """Restrict a timestamp column to the filtered dates (end date inclusive)"""
+        if self.filters.start_day:
+            self.clauses.append(f'{column} >= ?')
+            self.params.append(self.filters.start_day.isoformat())
+        if self.filters.end_day:
+            self.clauses.append(f'{column} < ?')
+            self.params.append((self.filters.end_day + timedelta(days=1)).isoformat())
+        return self
+
+    def cohort(self, user_id_column):
+        """Restrict a user id column to the filtered user type and ids"""
+        if self.filters.user_ids:
+            self.clauses.append(f'{user_id_column} IN ({",".join("?" * len(self.filters.user_ids))})')
+            self.params.extend(self.filters.user_ids)
+        if self.filters.user_type:
+            self.clauses.append(f'{user_id_column} IN (SELECT id FROM users WHERE is_admin = ?)')
+            self.params.append(1 if self.filters.user_type == 'admins' else 0)
+        return self
+
+    def rooms(self, user_id_column, date_column='updated_at'):
+        """Restrict a user id column to users with progress in the filtered rooms"""
+        if self.filters.rooms:
+            # Served by idx_user_room_progress_room_updated
+            subquery = f'SELECT user_id FROM user_room_progress WHERE room_number IN ({",".join("?" * len(self.filters.rooms))})'
+            params = list(self.filters.rooms)
+            if self.filters.start_day:
+                subquery += f' AND {date_column} >= ?'
+                params.append(self.filters.start_day.isoformat())
+            if self.filters.end_day:
+                subquery += f' AND {date_column} < ?'
+                params.append((self.filters.end_day + timedelta(days=1)).isoformat())
+            self.clauses.append(f'{user_id_column} IN ({subquery})')
+            self.params.extend(params)
+        return self
+
+    def sql(self, keyword='WHERE'):
+        """Get the combined predicate, prefixed with keyword, and its parameters"""
+        if not self.clauses:
+            return '', []
+        return f'{keyword} ' + ' AND '.join(self.clauses), list(self.params)
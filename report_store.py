@@ -0,0 +1,162 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+class ReportStore:
+    """Content-addressed on-disk store for generated report files"""
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root_dir, max_reports=None, max_age_days=None, max_bytes=None):
+        self.root_dir = os.path.abspath(root_dir)
+        self.max_reports = max_reports
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+
+    def path_for(self, content_hash):
+        """Get the on-disk path for a content hash"""
+        return os.path.join(self.root_dir, content_hash[:2], content_hash)
+
+    def exists(self, content_hash):
+        """Check if a report file is present in the store"""
+        return bool(content_hash) and os.path.exists(self.path_for(content_hash))
+
+    def put_bytes(self, data):
+        """Store report bytes and return (content_hash, size)"""
+        content_hash = hashlib.sha256(data).hexdigest()
+        if not self.exists(content_hash):
+            fd, tmp_path = self._temp_file()
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            self._commit(tmp_path, content_hash)
+        return content_hash, len(data)
+
+    def put_chunks(self, chunks):
+        """Store report bytes arriving in chunks and return (content_hash, size)"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = self._temp_file()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        content_hash = digest.hexdigest()
+        if self.exists(content_hash):
+            os.remove(tmp_path)
+        else:
+            self._commit(tmp_path, content_hash)
+        return content_hash, size
+
+    def put_file(self, source_path):
+        """Move an already rendered file into the store and return (content_hash, size)"""
+        digest = hashlib.sha256()
+        size = 0
+        with open(source_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        content_hash = digest.hexdigest()
+
+        if self.exists(content_hash):
+            os.remove(source_path)
+        else:
+            fd, tmp_path = self._temp_file()
+            os.close(fd)
+            shutil.move(source_path, tmp_path)
+            self._commit(tmp_path, content_hash)
+        return content_hash, size
+
+    def _temp_file(self):
+        os.makedirs(self.root_dir, exist_ok=True)
+        return tempfile.mkstemp(dir=self.root_dir, prefix='.incoming-')
+
+    def _commit(self, tmp_path, content_hash):
+        # Rename within the same directory tree so readers never see partial files
+        target = self.path_for(content_hash)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+
+    def delete_if_unreferenced(self, conn, content_hash):
+        """Remove a stored file once no report_history row points at it"""
+        if not content_hash:
+            return False
+        in_use = conn.execute(
+            'SELECT 1 FROM report_history WHERE content_hash = ? LIMIT 1', (content_hash,)
+        ).fetchone()
+        if in_use:
+            return False
+        try:
+            os.remove(self.path_for(content_hash))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def remove_orphans(self, conn):
+        """Delete stored files that are no longer referenced by report_history"""
+        if not os.path.isdir(self.root_dir):
+            return 0
+        referenced = {
+            row[0] for row in conn.execute(
+                'SELECT DISTINCT content_hash FROM report_history WHERE content_hash IS NOT NULL'
+            )
+        }
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            for name in filenames:
+                if name.startswith('.incoming-') or name in referenced:
+                    continue
+                os.remove(os.path.join(dirpath, name))
+                removed += 1
+        return removed
+
+    def enforce_retention(self, conn):
+        """Apply count, age and total size limits to report history"""
+        expired = []
+
+        if self.max_age_days is not None:
+            expired += [row[0] for row in conn.execute(
+                "SELECT id FROM report_history WHERE created_at < datetime('now', ?)",
+                (f'-{int(self.max_age_days)} days',)
+            )]
+
+        if self.max_reports is not None:
+            expired += [row[0] for row in conn.execute(
+                'SELECT id FROM report_history ORDER BY created_at DESC LIMIT -1 OFFSET ?',
+                (int(self.max_reports),)
+            )]
+
+        if self.max_bytes is not None:
+            # Walk newest to oldest and count each stored file once
+            seen_hashes = set()
+            total_bytes = 0
+            for row in conn.execute(
+                'SELECT id, content_hash, size FROM report_history ORDER BY created_at DESC'
+            ):
+                if row[1] is None or row[1] not in seen_hashes:
+                    seen_hashes.add(row[1])
+                    total_bytes += row[2] or 0
+                if total_bytes > self.max_bytes:
+                    expired.append(row[0])
+
+        expired = list(dict.fromkeys(expired))
+        if not expired:
+            return {'reports_removed': 0, 'files_removed': 0}
+
+        placeholders = ','.join('?' * len(expired))
+        hashes = {
+            row[0] for row in conn.execute(
+                f'SELECT DISTINCT content_hash FROM report_history WHERE id IN ({placeholders})', expired
+            )
+        }
+        conn.execute(f'DELETE FROM report_history WHERE id IN ({placeholders})', expired)
+        conn.commit()
+
+        files_removed = sum(1 for content_hash in hashes if self.delete_if_unreferenced(conn, content_hash))
+        return {'reports_removed': len(expired), 'files_removed': files_removed}
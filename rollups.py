@@ -0,0 +1,254 @@
+"""Daily rollup tables for engagement and effectiveness reports
+
+Triggers on game_state and user_room_progress keep the rollups current in the
+same transaction as each write, so reports never need to scan game_state.
+"""
+
+ROLLUP_TABLES = {
+    'rollup_daily_sessions': '''
+        CREATE TABLE IF NOT EXISTS rollup_daily_sessions (
+            day TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            actions INTEGER NOT NULL DEFAULT 0,
+            user_id INTEGER,
+            PRIMARY KEY (day, session_id)
+        ) WITHOUT ROWID
+    ''',
+    'rollup_daily_activity': '''
+        CREATE TABLE IF NOT EXISTS rollup_daily_activity (
+            day TEXT PRIMARY KEY,
+            active_sessions INTEGER NOT NULL DEFAULT 0,
+            total_actions INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+    'rollup_level_distribution': '''
+        CREATE TABLE IF NOT EXISTS rollup_level_distribution (
+            level INTEGER PRIMARY KEY,
+            sessions INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+    'rollup_daily_room_completions': '''
+        CREATE TABLE IF NOT EXISTS rollup_daily_room_completions (
+            day TEXT NOT NULL,
+            room_number INTEGER NOT NULL,
+            completions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, room_number)
+        ) WITHOUT ROWID
+    '''
+}
+
+ROLLUP_TRIGGERS = {
+    # Every game_state write counts as one action for its session on that day
+    'trg_rollup_game_state_insert': '''
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_game_state_insert AFTER INSERT ON game_state
+        BEGIN
+            INSERT INTO rollup_daily_sessions (day, session_id, actions, user_id)
+            VALUES (DATE(NEW.updated_at), NEW.session_id, 1, NEW.user_id)
+            ON CONFLICT (day, session_id) DO UPDATE SET actions = actions + 1, user_id = COALESCE(NEW.user_id, user_id);
+            INSERT INTO rollup_level_distribution (level, sessions)
+            VALUES (NEW.current_level, 1)
+            ON CONFLICT (level) DO UPDATE SET sessions = sessions + 1;
+        END
+    ''',
+    'trg_rollup_game_state_update': '''
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_game_state_update
+        AFTER UPDATE OF current_level, progress, updated_at ON game_state
+        BEGIN
+            INSERT INTO rollup_daily_sessions (day, session_id, actions, user_id)
+            VALUES (DATE(NEW.updated_at), NEW.session_id, 1, NEW.user_id)
+            ON CONFLICT (day, session_id) DO UPDATE SET actions = actions + 1, user_id = COALESCE(NEW.user_id, user_id);
+            UPDATE rollup_level_distribution SET sessions = sessions - 1
+            WHERE level = OLD.current_level;
+            INSERT INTO rollup_level_distribution (level, sessions)
+            VALUES (NEW.current_level, 1)
+            ON CONFLICT (level) DO UPDATE SET sessions = sessions + 1;
+        END
+    ''',
+    # Deleting old sessions changes the current level distribution but not past activity
+    'trg_rollup_game_state_delete': '''
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_game_state_delete AFTER DELETE ON game_state
+        BEGIN
+            UPDATE rollup_level_distribution SET sessions = sessions - 1
+            WHERE level = OLD.current_level;
+        END
+    ''',
+    'trg_rollup_daily_sessions_insert': '''
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_daily_sessions_insert AFTER INSERT ON rollup_daily_sessions
+        BEGIN
+            INSERT INTO rollup_daily_activity (day, active_sessions, total_actions)
+            VALUES (NEW.day, 1, NEW.actions)
+            ON CONFLICT (day) DO UPDATE SET
+                active_sessions = active_sessions + 1,
+                total_actions = total_actions + NEW.actions;
+        END
+    ''',
+    'trg_rollup_daily_sessions_update': '''
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_daily_sessions_update AFTER UPDATE OF actions ON rollup_daily_sessions
+        BEGIN
+            UPDATE rollup_daily_activity SET total_actions = total_actions + NEW.actions - OLD.actions
+            WHERE day = NEW.day;
+        END
+    ''',
+    'trg_rollup_room_completion_insert': '''
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_room_completion_insert AFTER INSERT ON user_room_progress
+        WHEN NEW.completion_status = 'completed' AND NEW.completed_at IS NOT NULL
+        BEGIN
+            INSERT INTO rollup_daily_room_completions (day, room_number, completions)
+            VALUES (DATE(NEW.completed_at), NEW.room_number, 1)
+            ON CONFLICT (day, room_number) DO UPDATE SET completions = completions + 1;
+        END
+    ''',
+    'trg_rollup_room_completion_update': '''
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_room_completion_update AFTER UPDATE OF completed_at ON user_room_progress
+        WHEN NEW.completion_status = 'completed' AND NEW.completed_at IS NOT NULL
+        BEGIN
+            INSERT INTO rollup_daily_room_completions (day, room_number, completions)
+            VALUES (DATE(NEW.completed_at), NEW.room_number, 1)
+            ON CONFLICT (day, room_number) DO UPDATE SET completions = completions + 1;
+        END
+    '''
+}
+
+
+# Session triggers that write user_id, recreated when upgrading rollups from before it existed
+USER_ID_TRIGGERS = ('trg_rollup_game_state_insert', 'trg_rollup_game_state_update')
+
+
+def ensure_rollups(conn):
+    """Create rollup tables and triggers, backfilling from existing rows on first run"""
+    existing = {
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger', 'index') AND name LIKE '%rollup%'"
+        )
+    }
+    created = [name for name in list(ROLLUP_TABLES) + list(ROLLUP_TRIGGERS) if name not in existing]
+
+    if 'rollup_daily_sessions' in existing:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(rollup_daily_sessions)')]
+        if 'user_id' not in columns:
+            # Filtered engagement trends need each session's user
+            conn.execute('ALTER TABLE rollup_daily_sessions ADD COLUMN user_id INTEGER')
+            conn.execute('''
+                UPDATE rollup_daily_sessions SET user_id = (
+                    SELECT user_id FROM game_state WHERE game_state.session_id = rollup_daily_sessions.session_id
+                )
+            ''')
+            for trigger in USER_ID_TRIGGERS:
+                conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+                existing.discard(trigger)
+            created.append('rollup_daily_sessions.user_id')
+    if 'idx_rollup_daily_sessions_user_day' not in existing:
+        created.append('idx_rollup_daily_sessions_user_day')
+    if not created:
+        return created
+
+    for ddl in ROLLUP_TABLES.values():
+        conn.execute(ddl)
+
+    if 'rollup_daily_sessions' not in existing:
+        rebuild_rollups(conn)
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_rollup_daily_sessions_user_day ON rollup_daily_sessions (user_id, day)')
+    for ddl in ROLLUP_TRIGGERS.values():
+        conn.execute(ddl)
+    return created
+
+
+def rebuild_rollups(conn):
+    """Recompute all rollups from the base tables
+
+    game_state only keeps the latest write per session, so history before the
+    rollups existed is approximated with one action per session on its last day.
+    """
+    for table in ROLLUP_TABLES:
+        conn.execute(f'DELETE FROM {table}')
+
+    conn.execute('''
+        INSERT INTO rollup_daily_sessions (day, session_id, actions, user_id)
+        SELECT DATE(updated_at), session_id, 1, user_id
+        FROM game_state
+        WHERE updated_at IS NOT NULL AND session_id IS NOT NULL
+    ''')
+    # Replace whatever the daily_sessions trigger accumulated with exact totals
+    conn.execute('DELETE FROM rollup_daily_activity')
+    conn.execute('''
+        INSERT INTO rollup_daily_activity (day, active_sessions, total_actions)
+        SELECT day, COUNT(*), SUM(actions)
+        FROM rollup_daily_sessions
+        GROUP BY day
+    ''')
+    conn.execute('''
+        INSERT INTO rollup_level_distribution (level, sessions)
+        SELECT current_level, COUNT(*)
+        FROM game_state
+        GROUP BY current_level
+    ''')
+    conn.execute('''
+        INSERT INTO rollup_daily_room_completions (day, room_number, completions)
+        SELECT DATE(completed_at), room_number, COUNT(*)
+        FROM user_room_progress
+        WHERE completion_status = 'completed' AND completed_at IS NOT NULL
+        GROUP BY DATE(completed_at), room_number
+    ''')
+
+
+def get_engagement_trends(conn, start_day=None, end_day=None):
+    """Get a cursor over active sessions and actions per day between two days"""
+    where, params = _day_range(start_day, end_day)
+    return conn.execute(f'''
+        SELECT day as date, active_sessions, total_actions
+        FROM rollup_daily_activity
+        {where}
+        ORDER BY day DESC
+    ''', params)
+
+
+def get_session_engagement_trends(conn, predicate='', params=()):
+    """Get a cursor over active sessions and actions per day for the sessions matching predicate
+
+    Counts the same actions as get_engagement_trends, so filtered and unfiltered
+    reports can be compared. predicate is a WHERE clause over rollup_daily_sessions.
+    """
+    return conn.execute(f'''
+        SELECT day as date, COUNT(*) as active_sessions, SUM(actions) as total_actions
+        FROM rollup_daily_sessions
+        {predicate}
+        GROUP BY day
+        ORDER BY day DESC
+    ''', list(params))
+
+
+def get_level_distribution(conn):
+    """Get the number of sessions currently at each level"""
+    return conn.execute('''
+        SELECT level as current_level, sessions as user_count
+        FROM rollup_level_distribution
+        WHERE sessions > 0
+        ORDER BY level
+    ''').fetchall()
+
+
+def get_room_completions(conn, start_day=None, end_day=None, rooms=None):
+    """Get room completions per room between two days"""
+    where, params = _day_range(start_day, end_day)
+    if rooms:
+        where += (' AND ' if where else 'WHERE ') + f'room_number IN ({",".join("?" * len(rooms))})'
+        params += list(rooms)
+    return conn.execute(f'''
+        SELECT room_number, SUM(completions) as completions
+        FROM rollup_daily_room_completions
+        {where}
+        GROUP BY room_number
+        ORDER BY room_number
+    ''', params).fetchall()
+
+
+def _day_range(start_day, end_day):
+    clauses, params = [], []
+    if start_day:
+        clauses.append('day >= ?')
+        params.append(str(start_day))
+    if end_day:
+        clauses.append('day <= ?')
+        params.append(str(end_day))
+    return ('WHERE ' + ' AND '.join(clauses) if clauses else ''), params
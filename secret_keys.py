@@ -0,0 +1,142 @@
+"""Persisted secret keys shared by every worker process
+
+The key file holds the newest key first followed by older keys that are still
+accepted. Sessions are signed with the newest key whose signing_from time has
+passed and verified against all of them through Flask's SECRET_KEY_FALLBACKS.
+A rotation adds the new key with signing_from a couple of refresh intervals
+ahead: every worker accepts it before any worker signs with it, so cookies
+from any worker stay valid on all the others and nobody is logged out.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask_login.utils import decode_cookie
+
+
+class SecretKeyRing:
+    """Loads, creates and rotates the shared secret key file"""
+
+    def __init__(self, path, max_keys=3, check_interval=30):
+        self.path = os.path.abspath(path)
+        self.max_keys = max_keys
+        self.check_interval = check_interval
+        self.keys = []
+        self.signing_key = None
+        self._activates_at = None
+        self._mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the key file, creating it with a fresh key if it does not exist"""
+        if not os.path.exists(self.path):
+            self._create()
+        mtime = os.path.getmtime(self.path)
+        with open(self.path) as f:
+            entries = json.load(f)['keys']
+        now = datetime.now()
+        signing = [entry for entry in entries if self._signing_from(entry) <= now]
+        pending = [self._signing_from(entry) for entry in entries if self._signing_from(entry) > now]
+        self.keys = [entry['key'] for entry in entries]
+        # Before any key is due (a fresh file is always due) the oldest one signs
+        self.signing_key = (signing[0] if signing else entries[-1])['key']
+        self._activates_at = min(pending) if pending else None
+        self._mtime = mtime
+        return self.keys
+
+    def rotate(self, delay=None):
+        """Add a new key, accepted at once and signing only after delay seconds
+
+        delay defaults to two check intervals, so every running worker has
+        picked the key up on refresh() before any of them signs with it.
+        Returns the new key's signing_from time.
+        """
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                entries = json.load(f)['keys']
+        delay = 2 * self.check_interval if delay is None else delay
+        entry = self._new_entry(datetime.now() + timedelta(seconds=delay))
+        entries.insert(0, entry)
+        # Never drop the key currently signing, however often keys are rotated
+        now = datetime.now()
+        signing_index = next(
+            (i for i, e in enumerate(entries) if self._signing_from(e) <= now), len(entries) - 1
+        )
+        entries = entries[:max(self.max_keys, signing_index + 1)]
+        self._write(entries)
+        return self._signing_from(entry)
+
+    def apply(self, app):
+        """Sign with the current key and accept all the others"""
+        app.config['SECRET_KEY'] = self.signing_key
+        app.config['SECRET_KEY_FALLBACKS'] = [key for key in self.keys if key != self.signing_key]
+
+    def refresh(self, app):
+        """Pick up a rotation made by another process, or a key becoming due for signing
+
+        Checks at most every check_interval.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                due = self._activates_at is not None and datetime.now() >= self._activates_at
+                if due or os.path.getmtime(self.path) != self._mtime:
+                    self.load()
+                    self.apply(app)
+            except (OSError, ValueError, KeyError):
+                pass  # Keep the keys we have if the file is mid-replace or unreadable
+
+    def decode_remember_cookie(self, cookie):
+        """Get the user id from a remember cookie signed with a key other than the signing key"""
+        for key in self.keys:
+            if key == self.signing_key:
+                continue
+            user_id = decode_cookie(cookie, key=key)
+            if user_id:
+                return user_id
+        return None
+
+    def _create(self):
+        tmp_path = self._write_temp([self._new_entry()])
+        try:
+            # link() fails if the file exists, so workers starting together agree on the first key written
+            os.link(tmp_path, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+
+    def _write(self, entries):
+        os.replace(self._write_temp(entries), self.path)
+
+    def _write_temp(self, entries):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'keys': entries}, f, indent=2)
+        return tmp_path
+
+    @staticmethod
+    def _new_entry(signing_from=None):
+        now = datetime.now()
+        return {
+            'key': secrets.token_hex(32),
+            'created_at': now.isoformat(),
+            'signing_from': (signing_from or now).isoformat()
+        }
+
+    @staticmethod
+    def _signing_from(entry):
+        # Keys written before two-phase rotation sign straight away
+        return datetime.fromisoformat(entry.get('signing_from') or entry['created_at'])
@@ -0,0 +1,245 @@
+"""Pre-forking production server
+
+    python server.py --workers 4 --threads 8
+
+The master opens the listening socket, runs database migrations once in a
+short-lived child, then forks workers that share the socket. Workers import
+the app themselves, so SIGHUP starts a fresh set of workers with the current
+code and retires the old ones once their in-flight requests finish.
+SIGTERM or SIGINT shuts everything down gracefully.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer
+
+from config import config
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handling requests on a fixed-size thread pool"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd):
+        # Created first because the base class closes its own socket via server_close()
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        self._serving = False
+        super().__init__(host, port, app, fd=fd)
+
+    def serve_forever(self, poll_interval=0.5):
+        self._serving = True
+        super().serve_forever(poll_interval)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        if self._serving:
+            # Let in-flight requests finish before the worker exits
+            self.pool.shutdown(wait=True)
+        super().server_close()
+
+
+def run_worker(listener, config_name, threads, start_scheduler):
+    """Serve requests on the shared socket until told to stop"""
+    from app import create_app
+
+    app = create_app(config_name, init_database=False, start_scheduler=start_scheduler)
+    host, port = listener.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, threads, listener.fileno())
+
+    def stop(signum, frame):
+        # End open event streams, otherwise they hold their threads until the graceful timeout
+        app.extensions['ascended']['dashboard_events'].close()
+        # shutdown() waits for serve_forever, so it cannot run on this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class Master:
+    """Keeps a fixed number of workers running on one listening socket"""
+
+    def __init__(self, listener, config_name, workers, threads, graceful_timeout, run_scheduler):
+        self.listener = listener
+        self.config_name = config_name
+        self.worker_count = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.run_scheduler = run_scheduler
+        self.workers = {}  # pid -> slot
+        self.retiring = {}  # pid -> time asked to stop
+        self.reload_requested = False
+        self.stop_requested = False
+
+    def migrate(self):
+        """Run migrations in a child so the master never imports the app"""
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                from app import create_app
+                create_app(self.config_name, init_database=True, start_scheduler=False)
+                code = 0
+            except Exception:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        if os.waitstatus_to_exitcode(status) != 0:
+            raise SystemExit('Database migration failed, not starting workers')
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                # Only the first slot runs background backups so they happen once per box
+                run_worker(self.listener, self.config_name, self.threads, self.run_scheduler and slot == 0)
+                code = 0
+            except Exception:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        self.workers[pid] = slot
+        print(f"✓ Worker {slot} started (pid {pid})")
+
+    def run(self):
+        self.migrate()
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_reload)
+
+        for slot in range(self.worker_count):
+            self.spawn(slot)
+
+        while True:
+            self._reap()
+            if self.stop_requested:
+                break
+            if self.reload_requested:
+                self.reload_requested = False
+                self._reload()
+            self._kill_stuck()
+            time.sleep(0.5)
+
+        self._stop_all()
+
+    def _request_stop(self, signum, frame):
+        self.stop_requested = True
+
+    def _request_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def _reload(self):
+        print('Reloading workers...')
+        old = list(self.workers)
+        for slot in range(self.worker_count):
+            self.spawn(slot)
+        for pid in old:
+            self._retire(pid)
+
+    def _retire(self, pid):
+        slot = self.workers.pop(pid, None)
+        if slot is None:
+            return
+        self.retiring[pid] = time.monotonic()
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.retiring.pop(pid, None)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.retiring.pop(pid, None)
+            slot = self.workers.pop(pid, None)
+            if slot is not None and not self.stop_requested:
+                print(f"✗ Worker {slot} (pid {pid}) exited with {os.waitstatus_to_exitcode(status)}, restarting")
+                time.sleep(1)  # Avoid a tight crash loop
+                self.spawn(slot)
+
+    def _kill_stuck(self):
+        now = time.monotonic()
+        for pid, since in list(self.retiring.items()):
+            if now - since > self.graceful_timeout:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self.retiring.pop(pid, None)
+
+    def _stop_all(self):
+        print('Shutting down workers...')
+        for pid in list(self.workers):
+            self._retire(pid)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.retiring and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.2)
+        for pid in list(self.retiring):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+def main(argv=None):
+    # Keep log lines in order across the master and forked workers
+    sys.stdout.reconfigure(line_buffering=True)
+    config_name = os.environ.get('FLASK_CONFIG', 'production')
+    config_obj = config[config_name]
+
+    parser = argparse.ArgumentParser(description='Run Ascended with pre-forked workers')
+    parser.add_argument('--host', default=getattr(config_obj, 'HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=getattr(config_obj, 'PORT', 5000))
+    parser.add_argument('--workers', type=int, default=config_obj.SERVER_WORKERS or os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=config_obj.SERVER_THREADS)
+    parser.add_argument('--graceful-timeout', type=float, default=config_obj.SERVER_GRACEFUL_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(1024)
+    # Workers race for accept(); the losers get EAGAIN instead of blocking
+    listener.setblocking(False)
+    listener.set_inheritable(True)
+
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers x {args.threads} threads")
+    Master(
+        listener, config_name, args.workers, args.threads, args.graceful_timeout,
+        run_scheduler=config_obj.BACKUP_SCHEDULE_ENABLED
+    ).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""HyperLogLog sketches for approximate active-user counts
+
+Each (day, room) keeps a compressed sketch that can be merged across any date
+range. An exact per-day membership table backs the sketches for audits and
+means a sketch is only rewritten the first time a user is seen that day.
+"""
+import hashlib
+import math
+import zlib
+
+ALL_ROOMS = 0
+
+
+class HyperLogLog:
+    """Mergeable distinct-count estimator with about 1.6% standard error at p=12"""
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    def add(self, value):
+        """Add a value and return True if the sketch changed"""
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> (64 - self.precision)
+        remaining = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """Merge another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches with different precision')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Estimate the number of distinct values added"""
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        """Serialize the sketch into a compact blob"""
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a sketch serialized with to_bytes"""
+        return cls(precision=data[0], registers=zlib.decompress(data[1:]))
+
+
+def ensure_activity_sketches(conn):
+    """Create sketch and membership tables, returns True if they were created"""
+    exists = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='activity_sketches'"
+    ).fetchone()
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_sketches (
+            day TEXT NOT NULL,
+            room_number INTEGER NOT NULL,
+            sketch BLOB NOT NULL,
+            PRIMARY KEY (day, room_number)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_daily_users (
+            day TEXT NOT NULL,
+            room_number INTEGER NOT NULL,
+            user_key TEXT NOT NULL,
+            PRIMARY KEY (day, room_number, user_key)
+        ) WITHOUT ROWID
+    ''')
+    return not exists
+
+
+def user_key_for_session(session_id):
+    """Map a game_state session id (user_<id>_<name>) to the user it belongs to"""
+    parts = str(session_id).split('_')
+    if len(parts) >= 3 and parts[0] == 'user' and parts[1].isdigit():
+        return parts[1]
+    return f'session:{session_id}'
+
+
+def record_activity(conn, user_key, room_number=None):
+    """Record a user as active today overall and, if given, in one room"""
+    day = conn.execute("SELECT DATE('now')").fetchone()[0]
+    rooms = [ALL_ROOMS] if not room_number else [ALL_ROOMS, int(room_number)]
+
+    for room in rooms:
+        inserted = conn.execute(
+            'INSERT OR IGNORE INTO activity_daily_users (day, room_number, user_key) VALUES (?, ?, ?)',
+            (day, room, str(user_key))
+        ).rowcount
+        if not inserted:
+            continue  # Already counted today, the sketch cannot change
+
+        row = conn.execute(
+            'SELECT sketch FROM activity_sketches WHERE day = ? AND room_number = ?', (day, room)
+        ).fetchone()
+        sketch = HyperLogLog.from_bytes(row[0]) if row else HyperLogLog()
+        if sketch.add(str(user_key)) or not row:
+            conn.execute(
+                'INSERT OR REPLACE INTO activity_sketches (day, room_number, sketch) VALUES (?, ?, ?)',
+                (day, room, sketch.to_bytes())
+            )
+
+
+def count_active_users(conn, start_day, end_day=None, rooms=None, exact=False, cohort=None):
+    """Count distinct users active between two days, estimated unless exact is set
+
+    rooms defaults to all rooms. cohort is an optional (sql, params) predicate
+    on user_key; sketches cannot be filtered by user so it implies exact.
+    """
+    rooms = list(rooms or [ALL_ROOMS])
+    room_placeholders = ','.join('?' * len(rooms))
+    where = f'room_number IN ({room_placeholders}) AND day >= ?'
+    params = rooms + [str(start_day)]
+    if end_day:
+        where += ' AND day <= ?'
+        params.append(str(end_day))
+
+    if exact or cohort:
+        if cohort:
+            where += f' AND {cohort[0]}'
+            params += list(cohort[1])
+        return conn.execute(
+            f'SELECT COUNT(DISTINCT user_key) FROM activity_daily_users WHERE {where}', params
+        ).fetchone()[0]
+
+    # Sketches for different days and rooms merge into one distinct count
+    merged = None
+    for (blob,) in conn.execute(f'SELECT sketch FROM activity_sketches WHERE {where}', params):
+        sketch = HyperLogLog.from_bytes(blob)
+        merged = sketch if merged is None else merged.merge(sketch)
+    return merged.count() if merged else 0
+
+
+def active_user_metrics(conn, room_number=ALL_ROOMS, exact=False):
+    """Get daily, weekly and monthly active users"""
+    metrics = {}
+    for name, days in (('dau', 1), ('wau', 7), ('mau', 30)):
+        start_day = conn.execute("SELECT DATE('now', ?)", (f'-{days - 1} days',)).fetchone()[0]
+        metrics[name] = count_active_users(conn, start_day, rooms=[room_number], exact=exact)
+    metrics['exact'] = exact
+    return metrics
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TestingConfig, config  # noqa: E402
+from database import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    """A fresh database in a temporary directory"""
+    manager = DatabaseManager(database_path=str(tmp_path / 'test.db'), database_dir=str(tmp_path))
+    assert manager.init_database() is True
+    return manager
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build the app against files in a temporary directory, with optional config overrides"""
+    from app import create_app
+
+    def make(init_database=True, **overrides):
+        settings = {
+            'DATABASE': str(tmp_path / 'test.db'),
+            'DATABASE_DIR': str(tmp_path),
+            'REPORT_STORE_DIR': str(tmp_path / 'reports'),
+            'BACKUP_DIR': str(tmp_path / 'backups'),
+            'ARCHIVE_DIR': str(tmp_path / 'archive'),
+            'SECRET_KEY_FILE': str(tmp_path / 'secret_keys.json'),
+            'WORKLOAD_ENABLED': False
+        }
+        settings.update(overrides)
+        monkeypatch.setitem(config, 'pytest', type('PytestConfig', (TestingConfig,), settings))
+        return create_app('pytest', init_database=init_database, start_scheduler=False)
+
+    return make
@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from asgi import GameplayApp
+
+
+def asgi_get(gameplay_app, path, cookie):
+    """Send one GET through the ASGI app and return the status and JSON body"""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': b'',
+        'headers': [(b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 50000)
+    }
+    asyncio.run(gameplay_app(scope, receive, send))
+    body = b''.join(message.get('body', b'') for message in messages if message['type'] == 'http.response.body')
+    return messages[0]['status'], json.loads(body)
+
+
+def test_session_of_deleted_user_is_rejected(make_app):
+    app = make_app()
+    db_manager = app.extensions['ascended']['db_manager']
+    assert db_manager.register_user('player', 'player@example.com', 'Player-Passw0rd')['success']
+    user = db_manager.verify_password('player', 'Player-Passw0rd')
+    gameplay_app = GameplayApp(app)
+
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie = f"{app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'_user_id': str(user.id), '_fresh': True})}"
+    status, _ = asgi_get(gameplay_app, '/api/user/progress', cookie)
+    assert status == 200
+
+    db_manager.delete_users([user.id])
+
+    status, payload = asgi_get(gameplay_app, '/api/user/progress', cookie)
+    assert status == 401
+    assert payload['message'] == 'Authentication required'
+    gameplay_app.db.close()
@@ -0,0 +1,48 @@
+import sqlite3
+import threading
+import time
+
+from backup import BackupManager
+
+
+def test_backup_finishes_while_another_thread_keeps_writing(db_manager, tmp_path):
+    conn = sqlite3.connect(db_manager.database_path)
+    conn.executemany(
+        'INSERT INTO user_progress (username, level_completed, completion_time) VALUES (?, ?, ?)',
+        [(f'player{i}' + 'x' * 200, i % 10, i) for i in range(20000)]
+    )
+    conn.commit()
+    conn.close()
+
+    stop = threading.Event()
+    writes = [0]
+
+    def writer():
+        conn = sqlite3.connect(db_manager.database_path, timeout=30)
+        while not stop.is_set():
+            conn.execute("INSERT INTO user_progress (username, level_completed) VALUES ('writer', 1)")
+            conn.commit()
+            writes[0] += 1
+            time.sleep(0.001)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        time.sleep(0.05)
+        job = BackupManager(db_manager.database_path, str(tmp_path / 'backups')).start_backup()
+        assert job.done.wait(10), 'backup did not finish while writes continued'
+    finally:
+        stop.set()
+        thread.join()
+
+    assert job.status == 'completed', job.error
+    assert job.verified
+    assert writes[0] > 0
+    restored = tmp_path / 'restored.db'
+    BackupManager.decompress_to(job.path, str(restored))
+    conn = sqlite3.connect(restored)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM user_progress WHERE username != 'writer'").fetchone()[0] == 20000
+    finally:
+        conn.close()
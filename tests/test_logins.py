@@ -0,0 +1,47 @@
+import sqlite3
+
+from werkzeug.security import generate_password_hash
+
+
+def index_names(db_manager):
+    conn = sqlite3.connect(db_manager.database_path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        conn.close()
+
+
+def test_case_duplicate_users_can_still_log_in_after_migration(db_manager):
+    # A database from before the unique indexes, holding accounts that only differ by case
+    conn = sqlite3.connect(db_manager.database_path)
+    conn.execute('DROP INDEX idx_users_username_nocase')
+    conn.execute('DROP INDEX idx_users_email_nocase')
+    accounts = [('Sam', 'Sam@example.com', 'first-Passw0rd'), ('sam', 'sam@example.com', 'second-Passw0rd')]
+    for username, email, password in accounts:
+        conn.execute(
+            'INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+            (username, email, generate_password_hash(password))
+        )
+    conn.commit()
+    conn.close()
+
+    db_manager.migrate_schema()
+
+    for username, email, password in accounts:
+        for identifier in (username, email):
+            user = db_manager.verify_password(identifier, password)
+            assert user and user.username == username and user.email == email
+    assert 'idx_users_username_nocase' not in index_names(db_manager)
+    assert 'idx_users_username_lower' in index_names(db_manager)
+
+    # Once an admin resolves the collision the next migration adds the unique indexes
+    conn = sqlite3.connect(db_manager.database_path)
+    conn.execute("UPDATE users SET username = 'sam2', email = 'sam2@example.com' WHERE username = 'sam'")
+    conn.commit()
+    conn.close()
+
+    db_manager.migrate_schema()
+
+    assert {'idx_users_username_nocase', 'idx_users_email_nocase'} <= index_names(db_manager)
+    assert 'idx_users_username_lower' not in index_names(db_manager)
+    assert db_manager.register_user('SAM', 'new@example.com', 'third-Passw0rd')['success'] is False
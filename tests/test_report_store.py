@@ -0,0 +1,43 @@
+import sqlite3
+
+
+def test_legacy_report_blobs_move_into_the_store(db_manager, make_app):
+    blob = b'type,total\nlegacy,1\n' * 5000
+    conn = sqlite3.connect(db_manager.database_path)
+    conn.execute(
+        "INSERT INTO report_history (id, type, format, file_data, size) VALUES ('legacy', 'user-performance', 'csv', ?, ?)",
+        (blob, len(blob))
+    )
+    conn.commit()
+    conn.close()
+
+    app = make_app()
+    store = app.extensions['ascended']['report_store']
+
+    conn = sqlite3.connect(db_manager.database_path)
+    file_data, content_hash, size = conn.execute(
+        "SELECT file_data, content_hash, size FROM report_history WHERE id = 'legacy'"
+    ).fetchone()
+    freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.close()
+    assert file_data is None
+    assert size == len(blob)
+    assert freelist == 0
+    with open(store.path_for(content_hash), 'rb') as f:
+        assert f.read() == blob
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id(db_manager))
+        session['_fresh'] = True
+    response = client.get('/api/admin/reports/history/legacy/download')
+    assert response.status_code == 200
+    assert response.data == blob
+
+
+def admin_id(db_manager):
+    conn = sqlite3.connect(db_manager.database_path)
+    try:
+        return conn.execute('SELECT id FROM users WHERE is_admin = 1').fetchone()[0]
+    finally:
+        conn.close()
@@ -0,0 +1,74 @@
+import pytest
+
+from datetime import date, timedelta
+
+from app import generate_report_data, open_report_cursor
+
+
+@pytest.fixture
+def players(db_manager):
+    """Two players with several saves each, so sessions have more than one action"""
+    user_ids = []
+    for name in ('ada', 'grace'):
+        assert db_manager.register_user(name, f'{name}@example.com', 'Passw0rd!23')['success']
+        conn = db_manager.get_connection()
+        user_ids.append(conn.execute('SELECT id FROM users WHERE username = ?', (name,)).fetchone()[0])
+        conn.close()
+    for user_id in user_ids:
+        for level in (1, 2, 3):
+            db_manager.save_progress(f'user_{user_id}_main', level, {'score': level * 10})
+        db_manager.save_progress(f'user_{user_id}_side', 1, {'score': 5})
+        assert db_manager.save_user_room_progress(user_id, 1, {'status': 'completed', 'score': 50})['success']
+    return user_ids
+
+
+def report_rows(db_manager, report_type, config):
+    conn = db_manager.get_connection()
+    try:
+        return [tuple(row) for row in open_report_cursor(conn, report_type, config)]
+    finally:
+        conn.close()
+
+
+def test_engagement_trends_filter_matching_everything_gives_same_totals(db_manager, players):
+    unfiltered = report_rows(db_manager, 'engagement-trends', {})
+    filtered = report_rows(db_manager, 'engagement-trends', {'userIds': players})
+
+    assert unfiltered == filtered
+    # Every save is an action, not just the latest write per session
+    assert sum(row[2] for row in unfiltered) == 8
+    assert sum(row[1] for row in unfiltered) == 4
+
+
+def matching_everything(user_ids):
+    """Filter configs that push predicates down but still match every row"""
+    today = date.today()
+    return [
+        {'userIds': user_ids},
+        {'userType': 'users'},
+        {'rooms': [1]},
+        {'startDate': (today - timedelta(days=29)).isoformat(), 'endDate': today.isoformat(), 'userIds': user_ids}
+    ]
+
+
+@pytest.mark.parametrize('report_type', ['user-performance', 'challenge-completion', 'engagement-trends'])
+def test_filtered_reports_match_unfiltered_values(db_manager, players, report_type):
+    unfiltered = report_rows(db_manager, report_type, {})
+    assert unfiltered
+    for config in matching_everything(players):
+        assert report_rows(db_manager, report_type, config) == unfiltered, config
+
+
+def test_filtered_system_effectiveness_matches_unfiltered(db_manager, players, make_app):
+    app = make_app()
+    with app.app_context():
+        unfiltered = generate_report_data('system-effectiveness', {'exact_counts': True})
+        assert unfiltered['summary']['active_users'] == 2
+        # The app adds the default admin, which a filter matching everything must include
+        user_ids = [row[0] for row in db_manager.get_connection().execute('SELECT id FROM users')]
+        for config in matching_everything(user_ids):
+            if config.get('userType'):
+                continue
+            filtered = generate_report_data('system-effectiveness', dict(config, exact_counts=True))
+            assert filtered['summary'] == unfiltered['summary'], config
+            assert filtered['room_completions'] == unfiltered['room_completions'], config
@@ -0,0 +1,63 @@
+import time
+
+from flask import Flask, session
+
+from secret_keys import SecretKeyRing
+
+
+def make_worker(path, check_interval):
+    """A minimal app that signs a session cookie and reads it back, like one worker process"""
+    app = Flask(__name__)
+    key_ring = SecretKeyRing(path, check_interval=check_interval)
+    key_ring.load()
+    key_ring.apply(app)
+
+    @app.before_request
+    def refresh():
+        key_ring.refresh(app)
+
+    @app.route('/set')
+    def set_value():
+        session['user'] = 'player'
+        return ''
+
+    @app.route('/get')
+    def get_value():
+        return session.get('user', '')
+
+    return app, key_ring
+
+
+def session_cookie(worker):
+    client = worker.test_client()
+    client.get('/set')
+    return client.get_cookie('session').value
+
+
+def read_session(worker, cookie):
+    client = worker.test_client()
+    client.set_cookie('session', cookie)
+    return client.get('/get').get_data(as_text=True)
+
+
+def test_rotated_key_is_accepted_before_anyone_signs_with_it(tmp_path):
+    path = tmp_path / 'secret_keys.json'
+    fresh, fresh_ring = make_worker(path, check_interval=0)
+    # A worker that has not looked at the key file since before the rotation
+    lagging, lagging_ring = make_worker(path, check_interval=3600)
+    old_key = fresh_ring.signing_key
+
+    SecretKeyRing(path, check_interval=0.5).rotate()
+    cookie = session_cookie(fresh)
+    assert fresh_ring.signing_key == old_key
+    assert len(fresh.config['SECRET_KEY_FALLBACKS']) == 1
+    assert read_session(lagging, cookie) == 'player'
+
+    lagging_ring._checked_at = 0  # its next check, within the interval the rotation waited for
+    assert read_session(lagging, cookie) == 'player'
+
+    time.sleep(1.1)
+    cookie = session_cookie(fresh)
+    assert fresh_ring.signing_key != old_key
+    assert read_session(lagging, cookie) == 'player'
+    assert read_session(fresh, cookie) == 'player'
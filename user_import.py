@@ -0,0 +1,128 @@
+"""Bulk user provisioning from CSV or XLSX files
+
+Passwords are hashed on the shared password hashing pool and all new users
+are inserted with one executemany in a single transaction.
+"""
+import csv
+import io
+import os
+import secrets
+
+
+def read_user_rows(filename, stream):
+    """Read user rows from an uploaded .csv or .xlsx file as dicts keyed by lower-cased header"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+            return [
+                {key: '' if value is None else str(value).strip() for key, value in zip(header, row)}
+                for row in rows if any(value is not None for value in row)
+            ]
+        finally:
+            workbook.close()
+    if extension == '.csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        reader = csv.DictReader(text)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        return [
+            {key: (value or '').strip() for key, value in row.items() if key}
+            for row in reader if any((value or '').strip() for value in row.values() if isinstance(value, str))
+        ]
+    raise ValueError('Unsupported file type, upload a .csv or .xlsx file')
+
+
+def import_users(db_manager, rows, dry_run=False):
+    """Validate, hash and insert user rows, returns a per-row report and totals
+
+    Rows without a password get a generated one, returned in the report so
+    it can be handed out.
+    """
+    report = []
+    pending = []
+    seen = set()
+    for index, row in enumerate(rows, start=2):  # Row 1 is the header
+        username = row.get('username', '')
+        email = row.get('email', '')
+        entry = {'row': index, 'username': username, 'email': email}
+        report.append(entry)
+
+        if not username or not email:
+            entry.update(status='error', message='Missing username or email')
+            continue
+        if '@' not in email:
+            entry.update(status='error', message='Invalid email')
+            continue
+        if username.lower() in seen or email.lower() in seen:
+            entry.update(status='error', message='Duplicate username or email in file')
+            continue
+        seen.update((username.lower(), email.lower()))
+
+        password = row.get('password', '')
+        if not password:
+            password = secrets.token_urlsafe(9)
+            entry['generated_password'] = password
+        pending.append((entry, password))
+
+    conn = db_manager.get_connection()
+    conn.isolation_level = None
+    try:
+        # Drop rows that clash with existing users before spending time on hashing
+        pending = _without_existing(conn, pending)
+        if dry_run:
+            hashes = [None] * len(pending)
+        else:
+            hashes = db_manager.hash_passwords([password for _, password in pending])
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Check again under the write lock in case someone registered meanwhile
+            ready = _without_existing(conn, list(zip((entry for entry, _ in pending), hashes)))
+            if not dry_run:
+                conn.executemany(
+                    'INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+                    [(entry['username'], entry['email'], password_hash) for entry, password_hash in ready]
+                )
+            conn.execute('ROLLBACK' if dry_run else 'COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+
+    for entry, _ in ready:
+        entry.update(status='validated' if dry_run else 'created')
+
+    totals = {}
+    for entry in report:
+        totals[entry['status']] = totals.get(entry['status'], 0) + 1
+    return {'rows': report, 'totals': totals, 'dry_run': dry_run}
+
+
+def _without_existing(conn, pending):
+    """Mark entries whose username or email is taken and return the rest"""
+    if not pending:
+        return pending
+    taken = set()
+    values = [value.lower() for entry, _ in pending for value in (entry['username'], entry['email'])]
+    for start in range(0, len(values), 400):
+        chunk = values[start:start + 400]
+        placeholders = ','.join('?' * len(chunk))
+        for username, email in conn.execute(
+            f'SELECT username, email FROM users WHERE LOWER(username) IN ({placeholders}) '
+            f'OR LOWER(email) IN ({placeholders})',
+            chunk + chunk
+        ):
+            taken.update(((username or '').lower(), (email or '').lower()))
+
+    remaining = []
+    for entry, value in pending:
+        if entry['username'].lower() in taken or entry['email'].lower() in taken:
+            entry.update(status='skipped', message='Username or email already exists')
+            entry.pop('generated_password', None)
+        else:
+            remaining.append((entry, value))
+    return remaining
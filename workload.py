@@ -0,0 +1,108 @@
+"""Admission control per class of request
+
+Gameplay, dashboard and heavy admin requests each get their own concurrency
+limit and wait queue, so a burst of one class can only tie up its own share
+of the request threads. Requests beyond a full queue are turned away at once
+instead of piling up behind slow work.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class WorkloadBusyError(Exception):
+    """Raised when a workload class has no room for another request"""
+
+    def __init__(self, workload, retry_after=1):
+        super().__init__(f'Too many {workload} requests in progress, please retry shortly')
+        self.workload = workload
+        self.retry_after = retry_after
+
+
+class WorkloadClass:
+    """A bounded set of slots with a bounded queue in front of it"""
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._stats = {
+            'admitted': 0, 'rejected': 0, 'timed_out': 0,
+            'wait_seconds': 0.0, 'max_wait_seconds': 0.0, 'busy_seconds': 0.0
+        }
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot for the duration of the block, raises WorkloadBusyError if none frees up"""
+        with self._lock:
+            if self._waiting >= self.max_queue and self._active >= self.max_concurrent:
+                self._stats['rejected'] += 1
+                raise WorkloadBusyError(self.name, retry_after=max(1, round(self.queue_timeout)))
+            self._waiting += 1
+
+        queued = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        started = time.monotonic()
+        waited = started - queued
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._stats['timed_out'] += 1
+            else:
+                self._active += 1
+                self._stats['admitted'] += 1
+                self._stats['wait_seconds'] += waited
+                self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+        if not acquired:
+            raise WorkloadBusyError(self.name, retry_after=max(1, round(self.queue_timeout)))
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._stats['busy_seconds'] += time.monotonic() - started
+            self._slots.release()
+
+    def stats(self):
+        """Get current occupancy and queue-time counters"""
+        with self._lock:
+            admitted = self._stats['admitted']
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'active': self._active,
+                'queued': self._waiting,
+                'admitted': admitted,
+                'rejected': self._stats['rejected'],
+                'timed_out': self._stats['timed_out'],
+                'avg_wait_ms': round(1000 * self._stats['wait_seconds'] / admitted, 2) if admitted else 0,
+                'max_wait_ms': round(1000 * self._stats['max_wait_seconds'], 2),
+                'avg_busy_ms': round(1000 * self._stats['busy_seconds'] / admitted, 2) if admitted else 0
+            }
+
+
+class WorkloadManager:
+    """The configured workload classes, looked up by name"""
+
+    def __init__(self, classes):
+        self.classes = {
+            name: WorkloadClass(
+                name,
+                max_concurrent=limits['max_concurrent'],
+                max_queue=limits['max_queue'],
+                queue_timeout=limits.get('queue_timeout', 5)
+            )
+            for name, limits in classes.items()
+        }
+
+    def admit(self, name):
+        return self.classes[name].admit()
+
+    def stats(self):
+        return {name: workload.stats() for name, workload in self.classes.items()}